@@ -18,13 +18,16 @@ from appathy.application import Application
 from appathy.controller import Controller, action, extends
 from appathy.exceptions import *
 from appathy.response import ResponseObject
+from appathy.schema import result_schema, request_schema
 from appathy.types import serializers, deserializers, register_types
 
 __all__ = [
     'Application',
     'Controller', 'action', 'extends', 'serializers', 'deserializers',
     'ResponseObject',
+    'result_schema', 'request_schema',
     'register_types',
     'AppathyException', 'IncompleteController', 'DuplicateResource',
-    'NoSuchResource',
+    'NoSuchResource', 'NoSuchRouter', 'FrozenController',
+    'IncompatibleCache',
 ]
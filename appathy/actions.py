@@ -14,14 +14,79 @@
 # along with this program.  If not, see
 # <http://www.gnu.org/licenses/>.
 
+import datetime
 import inspect
 
 import webob
+import webob.etag
 import webob.exc
 
+from appathy import cache
 from appathy import exceptions
 from appathy import response
+from appathy import schema
 from appathy import types
+from appathy import utils
+
+
+# Sentinel for detecting cache misses
+_unset = object()
+
+
+def _method_name(method):
+    """
+    Return a name identifying an action method, including its class.
+    """
+
+    cls = getattr(method, 'im_class', None)
+    name = getattr(method, '__name__', None) or repr(method)
+    if cls is None:
+        return name
+    return '%s:%s.%s' % (cls.__module__, cls.__name__, name)
+
+
+def _extension_translator(translators, content_type, defaults):
+    """
+    Select the translator of an extension for the given content type.
+    Raises KeyError if the extension has no translator for the content
+    type, or has only the default translator it inherits from
+    Controller, which must not be attached to the translator of the
+    resource.
+    """
+
+    type_name = types.media_types.get(content_type)
+    default = defaults.get(type_name, _unset)
+    if translators.translators.get(type_name) is default:
+        raise KeyError(content_type)
+
+    return translators(content_type)
+
+
+def _key_value(value):
+    """
+    Normalize a route parameter for use in a cache key.  Routers
+    differ in whether they return byte strings or unicode for the
+    same value, so byte strings are converted to unicode.
+    """
+
+    if isinstance(value, str):
+        return value.decode('utf-8', 'replace')
+    return value
+
+
+def _refresh_request(req):
+    """
+    Copy the request `req` for refreshing a cached response.  The
+    conditional and Range headers are removed from the copy, so that
+    the full response is generated.
+    """
+
+    refresh_req = req.copy()
+    for header in ('HTTP_RANGE', 'HTTP_IF_RANGE', 'HTTP_IF_NONE_MATCH',
+                   'HTTP_IF_MODIFIED_SINCE'):
+        refresh_req.environ.pop(header, None)
+
+    return refresh_req
 
 
 class ActionMethod(object):
@@ -37,7 +102,8 @@ class ActionMethod(object):
         Initializes an ActionMethod object for the given method.  The
         lists of serializers and deserializers are converted into
         Translators for ease of use later.  Also caches some useful
-        information, such as the isgenerator attribute.
+        information, such as the isgenerator attribute, and computes
+        the sets of keyword arguments accepted by the method.
         """
 
         self.method = method
@@ -47,6 +113,17 @@ class ActionMethod(object):
         self.argspec = inspect.getargspec(method)
         self.argidx = int(inspect.ismethod(method))
 
+        # Compute the names of the keyword arguments accepted by the
+        # method, indexed by the number of positional arguments
+        # passed; if the method accepts arbitrary keyword arguments,
+        # no filtering is necessary
+        if self.argspec.keywords:
+            self.argnames = None
+        else:
+            args = self.argspec.args[self.argidx:]
+            self.argnames = tuple(frozenset(args[i:])
+                                  for i in range(len(args) + 1))
+
     def __getattr__(self, attr):
         """
         Allow access to the attributes of the method by accessing the
@@ -62,10 +139,16 @@ class ActionMethod(object):
         """
 
         # Trim kwargs down if we need to...
-        if not self.argspec.keywords:
-            argnames = self.argspec.args[self.argidx + len(args):]
-            kwargs = dict((arg, kwargs[arg]) for arg in argnames
-                          if arg in kwargs)
+        if self.argnames is not None:
+            try:
+                argnames = self.argnames[len(args)]
+            except IndexError:
+                argnames = frozenset()
+
+            # Only build a new dictionary if there's something to omit
+            if not argnames.issuperset(kwargs):
+                kwargs = dict((arg, value) for arg, value in kwargs.items()
+                              if arg in argnames)
 
         # Call the method
         return self.method(*args, **kwargs)
@@ -76,18 +159,119 @@ class ActionDescriptor(object):
     Describes an action on a controller.  Binds together the method
     which performs the action, along with all the registered
     extensions and the desired ResponseObject type.
+
+    The request processing pipeline is selected when the descriptor
+    is created, and is available as the process() method.  Actions
+    without extensions, or with only regular extensions, use a
+    simplified pipeline.
+
+    The content types the action can be serialized to are computed
+    when the descriptor is created, and the content type selected for
+    each distinct HTTP `Accept` header is cached; the number of
+    headers cached is given by the `accept_cache_size` attribute.
+    Lookups in that cache take no lock.  A serializer or deserializer
+    which has a `reusable` attribute set to True is assumed to be
+    thread-safe, and is only constructed and attached to the
+    translators of the extensions once for each content type; the
+    prepare() method constructs them ahead of time.
+
+    If the action method declares its result schema (see
+    appathy.schema.result_schema()), it is merged with the schemas
+    declared by the extensions, and passed to the compile() method of
+    each reusable serializer which has one, after attaching the
+    extension serializers.
     """
 
-    def __init__(self, method, extensions, resp_type):
+    accept_cache_size = 64
+
+    def __init__(self, method, extensions, resp_type, invalidators=None):
         """
         Initialize an ActionDescriptor from the method, extensions,
-        and ResponseObject subclass specified by `resp_type`.
+        and ResponseObject subclass specified by `resp_type`.  If
+        specified, `invalidators` is a list of functions to call with
+        the request parameters after the action succeeds, to
+        invalidate cached responses.
         """
 
         self.method = ActionMethod(method)
         self.extensions = [ActionMethod(ext) for ext in extensions]
         self.resp_type = resp_type
 
+        # Cache the content types we can serialize to, the content
+        # types selected for recent Accept headers, and reusable
+        # serializers
+        self.content_types = self.method.serializers.get_types()
+        self.accept_cache = utils.ReadMostlyCache(self.accept_cache_size)
+        self.serializer_cache = {}
+
+        # Merge the result schemas, for compiling serializers
+        self.result_schema = schema.schema_for([self.method] +
+                                               self.extensions)
+
+        # Cache reusable deserializers, too
+        self.deserializer_cache = {}
+
+        # Compile the merged request schemas into a validator
+        spec = schema.schema_for([self.method] + self.extensions,
+                                 '_wsgi_request_schema')
+        if spec is None:
+            self.validator = None
+        else:
+            self.validator = schema.ValidatorCompiler().compile(spec)
+
+        # Determine if we have any deserializers at all
+        self.deserializable = bool(self.method.deserializers.translators)
+
+        # Select the request processing pipeline
+        if not self.extensions:
+            self.process = self._process_bare
+        elif not any(ext.isgenerator for ext in self.extensions):
+            # Regular extensions are called in reverse order
+            self.post_list = list(reversed(self.extensions))
+            self.process = self._process_regular
+        else:
+            self.process = self._process_full
+
+        # Actions which invalidate cached responses do so after the
+        # pipeline succeeds
+        self.invalidators = invalidators or []
+        if self.invalidators:
+            self.process_write = self.process
+            self.process = self._process_invalidating
+
+        # Actions which coalesce identical concurrent requests run the
+        # pipeline once for all of them
+        self.coalescer = getattr(method, '_wsgi_coalesce', None)
+        if self.coalescer is not None and self.coalescer is not False:
+            if self.coalescer is True:
+                self.coalescer = cache.Coalescer()
+            elif not isinstance(self.coalescer, cache.Coalescer):
+                # A number is the timeout
+                self.coalescer = cache.Coalescer(timeout=self.coalescer)
+            self.cache_name = _method_name(method)
+            self.process_single = self.process
+            self.process = self._process_coalesced
+        else:
+            self.coalescer = None
+
+        # Cached actions look up the response before running the
+        # pipeline
+        self.cache = getattr(method, '_wsgi_cache', None)
+        if self.cache is not None:
+            if not isinstance(self.cache, cache.ResponseCache):
+                # A number is the TTL
+                self.cache = cache.ResponseCache(ttl=self.cache)
+            self.cache_name = _method_name(method)
+            self.process_uncached = self.process
+            self.process = self._process_cached
+
+        # Actions with a validator answer conditional requests before
+        # consulting the cache or running the pipeline
+        self.conditional = getattr(method, '_wsgi_validator', None)
+        if self.conditional is not None:
+            self.process_action = self.process
+            self.process = self._process_conditional
+
     def __call__(self, req, params):
         """
         Call the actual action method.  Wraps the return value in a
@@ -96,21 +280,136 @@ class ActionDescriptor(object):
 
         return self.wrap(req, self.method(req, **params))
 
+    def _process_bare(self, req, params):
+        """
+        Process a request for an action with no extensions.  Returns
+        the serialized response.
+        """
+
+        # Deserialize the body...
+        body = self.deserialize_request(req)
+        if body is not None:
+            params['body'] = body
+
+        # Call the action method and serialize the response
+        return self(req, params)._serialize()
+
+    def _process_regular(self, req, params):
+        """
+        Process a request for an action having only regular
+        extensions.  Returns the serialized response.
+        """
+
+        # Deserialize the body...
+        body = self.deserialize_request(req)
+        if body is not None:
+            params['body'] = body
+
+        # Call the action method...
+        resp = self(req, params)
+
+        # Call the extensions; if one returns a value, use that for
+        # subsequent processing
+        for ext in self.post_list:
+            result = ext(req, resp, **params)
+            if result:
+                resp = self.wrap(req, result)
+
+        # And finally, serialize and return the response
+        return resp._serialize()
+
+    def _process_full(self, req, params):
+        """
+        Process a request for an action with generator extensions.
+        Returns the serialized response.
+        """
+
+        # Now we need to deserialize the body...
+        body = self.deserialize_request(req)
+        if body is not None:
+            params['body'] = body
+
+        # Process the extensions...
+        resp, post_list = self.pre_process(req, params)
+
+        # Call the actual action method...
+        if not resp:
+            resp = self(req, params)
+
+        # Perform post-processing...
+        resp = self.post_process(post_list, req, resp, params)
+
+        # And finally, serialize and return the response
+        return resp._serialize()
+
     def deserialize_request(self, req):
         """
         Uses the deserializers declared on the action method and its
         extensions to deserialize the request.  Returns the result of
         the deserialization.  Raises `webob.HTTPUnsupportedMediaType`
-        if the media type of the request is unsupported.
+        if the media type of the request is unsupported.  Streaming
+        deserializers are passed the request body file, rather than
+        the body itself.
+
+        If the action or its extensions declare a request schema (see
+        appathy.schema.request_schema()), the result is validated
+        against it, and `webob.exc.HTTPBadRequest` is raised if it
+        does not match.  A missing body is validated as None.
+        """
+
+        body = self._deserialize(req)
+
+        # Validate the body
+        if self.validator is not None:
+            try:
+                self.validator(body)
+            except ValueError as exc:
+                raise webob.exc.HTTPBadRequest(detail=str(exc))
+
+        return body
+
+    def _deserialize(self, req):
+        """
+        Deserialize the request body.  Returns None if the request has
+        no body.
         """
 
         # See if we have a body
-        if req.content_length == 0:
+        if req.content_length == 0 or not req.is_body_readable:
             return None
 
+        # If we have no deserializers, don't bother looking
+        if not self.deserializable:
+            raise webob.exc.HTTPUnsupportedMediaType()
+
+        # Use a cached deserializer, if we have one
+        content_type = req.content_type
+        deserializer = self.deserializer_cache.get(content_type)
+        if deserializer is None:
+            deserializer = self._build_deserializer(content_type)
+
+            # Save reusable deserializers; if another thread beat us
+            # to it, use the one it saved
+            if getattr(deserializer, 'reusable', False):
+                deserializer = self.deserializer_cache.setdefault(
+                    content_type, deserializer)
+
+        # A deserializer is simply a callable, so call it; streaming
+        # deserializers read the body themselves
+        if getattr(deserializer, 'streaming', False):
+            return deserializer(req.body_file)
+        return deserializer(req.body)
+
+    def _build_deserializer(self, content_type):
+        """
+        Construct the deserializer for the given content type,
+        attaching the deserializers for the extensions.  Raises
+        `HTTPUnsupportedMediaType` if no deserializer is available.
+        """
+
         # Get the primary deserializer
         try:
-            deserializer = self.method.deserializers(req.content_type)
+            deserializer = self.method.deserializers(content_type)
         except KeyError:
             raise webob.exc.HTTPUnsupportedMediaType()
 
@@ -119,12 +418,13 @@ class ActionDescriptor(object):
         if hasattr(deserializer, 'attach'):
             for ext in self.extensions:
                 try:
-                    deserializer.attach(ext.deserializers(req.content_type))
+                    deserializer.attach(_extension_translator(
+                        ext.deserializers, content_type,
+                        types.default_deserializers))
                 except KeyError:
                     pass
 
-        # A deserializer is simply a callable, so call it
-        return deserializer(req.body)
+        return deserializer
 
     def serializer(self, req):
         """
@@ -137,12 +437,37 @@ class ActionDescriptor(object):
         the content type and the serializer.
         """
 
-        # Select the best match serializer
-        content_types = self.method.serializers.get_types()
-        content_type = req.accept.best_match(content_types)
+        # Select the best match content type, consulting the cache
+        # first
+        accept = req.environ.get('HTTP_ACCEPT')
+        content_type = self.accept_cache.get(accept, _unset)
+        if content_type is _unset:
+            content_type = req.accept.best_match(self.content_types)
+            self.accept_cache.set(accept, content_type)
         if content_type is None:
             raise webob.exc.HTTPNotAcceptable()
 
+        # Use a cached serializer, if we have one
+        serializer = self.serializer_cache.get(content_type)
+        if serializer is None:
+            serializer = self._build_serializer(content_type)
+
+            # Save reusable serializers; if another thread beat us to
+            # it, use the one it saved
+            if getattr(serializer, 'reusable', False):
+                serializer = self.serializer_cache.setdefault(content_type,
+                                                              serializer)
+
+        # Return content type and serializer
+        return content_type, serializer
+
+    def _build_serializer(self, content_type):
+        """
+        Construct the serializer for the given content type, attaching
+        the serializers for the extensions.  Raises
+        `HTTPNotAcceptable` if no serializer is available.
+        """
+
         # Select the serializer to use
         try:
             serializer = self.method.serializers(content_type)
@@ -154,12 +479,237 @@ class ActionDescriptor(object):
         if hasattr(serializer, 'attach'):
             for ext in reversed(self.extensions):
                 try:
-                    serializer.attach(ext.serializers(content_type))
+                    serializer.attach(_extension_translator(
+                        ext.serializers, content_type,
+                        types.default_serializers))
                 except KeyError:
                     pass
 
-        # Return content type and serializer
-        return content_type, serializer
+        # If we know the shape of the result, let the serializer
+        # specialize itself; only reusable serializers are compiled,
+        # since others are built for every response
+        if (self.result_schema is not None and
+                getattr(serializer, 'reusable', False) and
+                hasattr(serializer, 'compile')):
+            serializer.compile(self.result_schema)
+
+        return serializer
+
+    def prepare(self):
+        """
+        Construct the reusable serializers and deserializers for all
+        the content types the action supports, so that they need not
+        be built on the request path.  Translators which are not
+        reusable are still built for each request.
+        """
+
+        # Build the reusable serializers
+        for content_type in self.content_types:
+            if content_type in self.serializer_cache:
+                continue
+            try:
+                serializer = self._build_serializer(content_type)
+            except webob.exc.HTTPException:
+                continue
+            if getattr(serializer, 'reusable', False):
+                self.serializer_cache.setdefault(content_type, serializer)
+
+        # Build the reusable deserializers
+        for content_type in self.method.deserializers.get_types():
+            if content_type in self.deserializer_cache:
+                continue
+            try:
+                deserializer = self._build_deserializer(content_type)
+            except webob.exc.HTTPException:
+                continue
+            if getattr(deserializer, 'reusable', False):
+                self.deserializer_cache.setdefault(content_type,
+                                                   deserializer)
+
+    def _process_cached(self, req, params):
+        """
+        Process a request for a cached action.  GET and HEAD requests
+        without a query string or body are answered from the cache,
+        keyed by the route parameters and the negotiated content type;
+        on a miss, the request is processed by the pipeline selected
+        for the action, and the response is cached.  A stale response
+        served during the grace period of the cache is refreshed by
+        processing a copy of the request in the background.  Returns
+        the response.
+        """
+
+        # Only cache requests which depend only on the route
+        key = self._shared_key(req, params)
+        if key is None:
+            return self.process_uncached(req, params)
+
+        resp, refresh = self.cache.lookup(key, req)
+        if resp is None:
+            resp = self.process_uncached(req, params)
+            self.cache.set(key, resp)
+        elif refresh:
+            # Serve the stale response, refreshing it in the background
+            # with a copy of the request
+            refresh_req = _refresh_request(req)
+            refresh_params = dict(params)
+            self.cache.refresh(key, lambda: self.process_uncached(
+                refresh_req, refresh_params))
+
+        return resp
+
+    def _shared_key(self, req, params):
+        """
+        Compute the key under which the response to a request may be
+        shared with other requests.  Returns None for requests which
+        depend on more than the route parameters and the negotiated
+        content type: those which are not GET or HEAD requests, or
+        which have a query string or body.
+        """
+
+        if (req.method not in ('GET', 'HEAD') or req.query_string or
+                req.content_length):
+            return None
+
+        # Negotiate the content type; results which aren't serialized
+        # don't need one
+        try:
+            content_type = self.serializer(req)[0]
+        except webob.exc.HTTPNotAcceptable:
+            content_type = None
+
+        return self.cache_key(content_type, params)
+
+    def cache_key(self, content_type, params):
+        """
+        Compute the cache key for a response of the given content type
+        to a request with the given route parameters.  Byte string
+        parameters give the same key as their unicode equivalents.
+        """
+
+        return repr((self.cache_name, content_type,
+                     sorted((_key_value(key), _key_value(value))
+                            for key, value in params.items())))
+
+    def uncache(self, params):
+        """
+        Invalidate the cached responses, of all content types, to
+        requests with the given route parameters.
+        """
+
+        if self.cache is None:
+            return
+
+        for content_type in list(self.content_types) + [None]:
+            self.cache.delete(self.cache_key(content_type, params))
+
+    def _process_coalesced(self, req, params):
+        """
+        Process a request for an action which coalesces identical
+        concurrent requests.  GET and HEAD requests without a query
+        string, body, or Range header, which arrive while an identical
+        request (having the same route parameters and negotiated
+        content type) is being processed, receive a copy of its
+        response; others are processed by the pipeline selected for
+        the action.  Returns the response.
+        """
+
+        # Range requests would share a partial response
+        key = None
+        if 'HTTP_RANGE' not in req.environ:
+            key = self._shared_key(req, params)
+        if key is None:
+            return self.process_single(req, params)
+
+        return self.coalescer.run(key, req,
+                                  lambda: self.process_single(req, params))
+
+    def _process_invalidating(self, req, params):
+        """
+        Process a request for an action which invalidates cached
+        responses.  The request is processed by the pipeline selected
+        for the action; if the response indicates success, the
+        invalidators are called with the request parameters.  Returns
+        the response.  Responses passed upstream by raising
+        `webob.exc.HTTPException` or AppathyResponse are treated the
+        same way, and the exception is re-raised.
+        """
+
+        try:
+            resp = self.process_write(req, params)
+        except webob.exc.HTTPException as exc:
+            self._invalidate(exc.status_int, params)
+            raise
+        except exceptions.AppathyResponse as exc:
+            self._invalidate(exc.response.status_int, params)
+            raise
+
+        self._invalidate(resp.status_int, params)
+        return resp
+
+    def _invalidate(self, status, params):
+        """
+        Call the invalidators with the request parameters, if the
+        response status code indicates success.
+        """
+
+        if status < 400:
+            for invalidator in self.invalidators:
+                invalidator(params)
+
+    def _process_conditional(self, req, params):
+        """
+        Process a request for an action having a validator.  For GET
+        and HEAD requests, the validator is called to compute the
+        version stamp of the resource, which is used to answer
+        If-None-Match and If-Modified-Since with a "304 Not Modified"
+        response without calling the action, its extensions, or the
+        serializer.  Otherwise, the request is processed by the
+        pipeline selected for the action, and the version stamp is
+        added to the response.  Returns the response.
+        """
+
+        # Only safe requests are answered from the version stamp
+        if req.method not in ('GET', 'HEAD'):
+            return self.process_action(req, params)
+
+        stamp = self.conditional(req, params)
+        if stamp is None:
+            return self.process_action(req, params)
+
+        # The stamp is either a last modification time or an ETag
+        validators = webob.Response(status=304)
+        validators.headerlist = []
+        if isinstance(stamp, datetime.datetime):
+            validators.last_modified = stamp
+        else:
+            validators.etag = stamp
+
+        # If-None-Match takes precedence over If-Modified-Since; "*"
+        # matches any stamp
+        if req.if_none_match is not webob.etag.NoETag:
+            if (req.if_none_match is webob.etag.AnyETag or
+                    (validators.etag is not None and
+                     validators.etag in req.if_none_match)):
+                return validators
+        elif req.if_modified_since and validators.last_modified:
+            if validators.last_modified <= req.if_modified_since:
+                return validators
+
+        # Resolve If-Range against the stamp, since the response will
+        # not have the validators until after serialization
+        if req.range and req.headers.get('If-Range'):
+            if validators in req.if_range:
+                req.if_range = None
+            else:
+                req.range = None
+
+        # Process the request and add the validators to the response
+        resp = self.process_action(req, params)
+        if resp.status_int in (200, 206):
+            for header, value in validators.headerlist:
+                resp.headers.setdefault(header, value)
+
+        return resp
 
     def pre_process(self, req, params):
         """
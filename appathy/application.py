@@ -16,14 +16,16 @@
 
 import logging
 
+from paste.deploy import converters
 import routes
-from routes import middleware
 import webob
 import webob.dec
 import webob.descriptors
 import webob.exc
 
+from appathy import batch
 from appathy import exceptions
+from appathy import routing
 from appathy import utils
 
 
@@ -40,7 +42,7 @@ class Request(webob.Request):
     context = webob.descriptors.environ_getter('appathy.context', None)
 
 
-class Application(middleware.RoutesMiddleware):
+class Application(object):
     """
     Provides a PasteDeploy-compatible application class.  Resources
     and extensions are computed from the configuration; keys beginning
@@ -50,15 +52,75 @@ class Application(middleware.RoutesMiddleware):
     resource being created or extended.  The values identify instances
     of class Controller, which define the actual resource or an
     extension.
+
+    The 'router' key selects the route matcher.  The default,
+    'routes', uses a ``routes.Mapper``, which tries each route in
+    turn; 'trie' selects the Appathy router, which organizes the
+    routes into a trie keyed by path segment.  In either case, routes
+    without any path variables are matched by a simple dictionary
+    lookup before falling back to the route matcher.
+
+    The 'match_cache' key may be set to a number of entries to enable
+    a cache of the results of the route matcher, keyed by request
+    method and path.  The cache is bounded, discarding the least
+    recently used results; its statistics are available from the
+    `match_cache` attribute.
+
+    If the 'eager_descriptors' key is set to a true value, the
+    descriptors for every action of every resource are built once all
+    extensions have been applied, and each resource is then frozen.
+    This moves the cost of building the descriptors from the first
+    request for each action to application startup, and ensures that
+    the request path never modifies the descriptor cache.
+
+    If the 'batch' key is set to a path, POST requests to that path
+    are batch requests: their bodies list sub-requests, which are
+    routed and dispatched in-process, and their responses combine the
+    responses to the sub-requests (see `appathy.batch`).  The
+    'batch_limit' key sets the maximum number of sub-requests in a
+    batch; the default is 50.  If the 'batch_workers' key is set to a
+    number of threads, sub-requests are run concurrently on a thread
+    pool of that size, with at most 'batch_concurrency' (by default,
+    'batch_workers') sub-requests of one batch running at a time.  The
+    batch handler is available from the `batch` attribute.
+
+    Routing is performed by the Application itself, rather than by
+    the Routes middleware.  Only the work needed by dispatch() is
+    performed: the request is matched, the match dictionary is stored
+    in the ``wsgiorg.routing_args`` environment key, and the request
+    is dispatched to the controller.  In particular, the Routes
+    "_method" override, redirect routes, and PATH_INFO rewriting are
+    not supported.
     """
 
+    routers = dict(
+        routes=lambda: routes.Mapper(register=False),
+        trie=lambda: routing.Router(),
+    )
+
+    # The batch request handler, if batching is enabled
+    batch = None
+
     def __init__(self, global_config, **local_conf):
         """
         Initialize the Application.
         """
 
         # Let's get a mapper
-        mapper = routes.Mapper(register=False)
+        router = local_conf.get('router', 'routes')
+        if router not in self.routers:
+            raise exceptions.NoSuchRouter(router)
+        mapper = self.routers[router]()
+
+        # Set up the match cache, if requested
+        self.match_cache = None
+        cache_size = int(local_conf.get('match_cache', 0))
+        if cache_size > 0:
+            mapper = routing.CachingMapper(mapper, cache_size)
+            self.match_cache = mapper.cache
+
+        # Static routes are matched before consulting the mapper
+        mapper = routing.StaticMapper(mapper)
 
         # Now, set up our primary controllers
         self.resources = {}
@@ -102,14 +164,49 @@ class Application(middleware.RoutesMiddleware):
                 # Register the extension
                 res.wsgi_extend(ext())
 
-        # Now, with all routes set up, initialize the middleware
-        super(Application, self).__init__(self.dispatch, mapper,
-                                          singleton=False)
+        # Build all the descriptors up front, if requested
+        if converters.asbool(local_conf.get('eager_descriptors', False)):
+            for res in self.resources.values():
+                res.wsgi_freeze()
+
+        # Now, with all routes set up, save the mapper
+        self.mapper = mapper
+
+        # Set up the batch request handler, if requested
+        if local_conf.get('batch'):
+            self.batch = batch.Batch(
+                self, utils.norm_path(local_conf['batch']),
+                int(local_conf.get('batch_limit', 50)),
+                int(local_conf.get('batch_workers', 0)),
+                int(local_conf.get('batch_concurrency', 0)) or None)
+
+    def __call__(self, environ, start_response):
+        """
+        Route a request and dispatch it to the appropriate controller.
+        Returns a 404 if no route matches the request.  Batch requests
+        are passed to the batch handler; batch requests may not be
+        nested.
+        """
+
+        # Handle batch requests
+        if (self.batch is not None and
+                environ.get('PATH_INFO') == self.batch.path and
+                'appathy.batch' not in environ):
+            return self.batch(environ, start_response)
+
+        # Match the request
+        result = self.mapper.routematch(environ=environ)
+        if not result:
+            return webob.exc.HTTPNotFound()(environ, start_response)
+
+        # Save the match dictionary and dispatch the request
+        environ['wsgiorg.routing_args'] = ((), result[0])
+        return self.dispatch(environ, start_response)
 
     @webob.dec.wsgify(RequestClass=Request)
     def dispatch(self, req):
         """
-        Called by the Routes middleware to dispatch the request to the
+        Called by __call__() to dispatch the request to the
         appropriate controller.  If a webob exception is raised, it is
         returned; if some other exception is raised, the webob
         `HTTPInternalServerError` exception is raised.  Otherwise, the
@@ -0,0 +1,285 @@
+# Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""
+Support for batch requests, which carry many sub-requests in a
+single HTTP request.  The body of a batch request is a JSON list of
+objects with the keys "method" (default "GET"), "path" (which may
+include a query string), and optionally "headers" (an object) and
+"body" (any JSON value, which is sent as a JSON request body).  Each
+sub-request is routed and dispatched by the Application in-process,
+and the response is a JSON list of objects with the keys "status"
+(the integer status code), "headers" (a list of name and value
+pairs), and "body".  JSON response bodies are included as-is; other
+bodies, including those labeled as JSON which are not valid JSON, are
+included as strings, base64-encoded (in which case the "encoding" key
+is set to "base64") if they are not valid UTF-8.
+
+Sub-requests inherit the environment of the batch request, including
+its headers (such as Accept and Authorization), except for its
+content, conditional, and Range headers.  Each sub-request receives a
+copy of the ``appathy.context`` of the batch request.
+
+Sub-requests are run one after another unless a number of worker
+threads is given, in which case they are run concurrently on a
+thread pool shared by all batches; this requires the
+``concurrent.futures`` module (the "futures" package on Python 2).
+"""
+
+import base64
+import copy
+import cStringIO
+import itertools
+import logging
+import urllib
+
+import webob
+import webob.dec
+import webob.exc
+
+from appathy import types
+
+try:
+    from concurrent import futures
+except ImportError:
+    futures = None
+
+
+LOG = logging.getLogger('appathy')
+
+
+# Headers of the batch request which sub-requests don't inherit
+_skip_headers = set(['CONTENT_TYPE', 'CONTENT_LENGTH', 'HTTP_RANGE',
+                     'HTTP_IF_RANGE', 'HTTP_IF_MATCH', 'HTTP_IF_NONE_MATCH',
+                     'HTTP_IF_MODIFIED_SINCE', 'HTTP_IF_UNMODIFIED_SINCE'])
+
+
+def _is_json(content_type):
+    """
+    Determine if a content type is JSON.
+    """
+
+    content_type = content_type.split(';', 1)[0].strip()
+    return content_type == 'application/json' or content_type.endswith(
+        '+json')
+
+
+def _valid_json(body):
+    """
+    Determine if a body labeled as JSON really is, so that it may be
+    included in the batch response as-is.
+    """
+
+    try:
+        types.json_loads(body)
+    except ValueError:
+        return False
+    return True
+
+
+class Batch(object):
+    """
+    Handles batch requests to `path` for the WSGI application `app`,
+    which must route requests itself.  At most `limit` sub-requests
+    are allowed in a batch.
+
+    If `workers` is non-zero, sub-requests are run on a pool of that
+    many threads, with at most `concurrency` (by default, `workers`)
+    sub-requests of any one batch running at a time.  The results are
+    always in the order of the sub-requests.
+    """
+
+    def __init__(self, app, path, limit=50, workers=0, concurrency=None):
+        """
+        Initialize a Batch.
+        """
+
+        self.app = app
+        self.path = path
+        self.limit = limit
+        self.concurrency = concurrency or workers
+
+        # Set up the thread pool
+        self.pool = None
+        if workers and futures is None:
+            LOG.warning("concurrent.futures is not available; batched "
+                        "requests will be run sequentially")
+        elif workers:
+            self.pool = futures.ThreadPoolExecutor(max_workers=workers)
+
+    @webob.dec.wsgify
+    def __call__(self, req):
+        """
+        Process a batch request.  Returns the combined response.
+        """
+
+        if req.method != 'POST':
+            raise webob.exc.HTTPMethodNotAllowed(allow=['POST'])
+
+        # Parse the sub-requests
+        try:
+            subreqs = types.json_loads(req.body)
+        except ValueError:
+            raise webob.exc.HTTPBadRequest(detail='Invalid JSON body')
+        if not isinstance(subreqs, list):
+            raise webob.exc.HTTPBadRequest(
+                detail='Batch body must be a list of requests')
+        elif len(subreqs) > self.limit:
+            raise webob.exc.HTTPBadRequest(
+                detail='At most %d requests may be batched' % self.limit)
+
+        # Build the sub-request environments before running any
+        environs = [self.environ(req.environ, subreq) for subreq in subreqs]
+
+        return webob.Response(
+            content_type='application/json', charset=None,
+            body='[%s]' % ','.join(self.run(environs)))
+
+    def environ(self, base, subreq):
+        """
+        Build the WSGI environment for a sub-request, described by the
+        dictionary `subreq`, from the environment `base` of the batch
+        request.  Raises `webob.exc.HTTPBadRequest` if the description
+        is invalid.
+        """
+
+        if (not isinstance(subreq, dict) or
+                not isinstance(subreq.get('path'), basestring) or
+                not isinstance(subreq.get('method', 'GET'), basestring) or
+                not isinstance(subreq.get('headers', {}), dict)):
+            raise webob.exc.HTTPBadRequest(
+                detail='Batched requests must be objects with a "path"')
+
+        # Inherit the server and request environment, but not the
+        # state left by WebOb or routing
+        environ = dict((key, value) for key, value in base.items()
+                       if key not in _skip_headers and
+                       not key.startswith('webob.') and
+                       key != 'wsgiorg.routing_args')
+
+        # PATH_INFO is URL-decoded, as servers provide it; the query
+        # string is not
+        path, _sep, query = subreq['path'].encode('utf-8').partition('?')
+        environ.update({
+            'REQUEST_METHOD': subreq.get('method', 'GET').upper(),
+            'PATH_INFO': urllib.unquote(path),
+            'QUERY_STRING': query,
+            'appathy.batch': True,
+        })
+
+        # Give the sub-request its own context
+        if base.get('appathy.context') is not None:
+            environ['appathy.context'] = self.copy_context(
+                base['appathy.context'])
+
+        # Set up the body
+        body = ''
+        if subreq.get('body') is not None:
+            body = types.json_dumps(subreq['body'])
+            environ['CONTENT_TYPE'] = 'application/json'
+        environ['CONTENT_LENGTH'] = str(len(body))
+        environ['wsgi.input'] = cStringIO.StringIO(body)
+
+        # Add the sub-request's headers
+        for name, value in subreq.get('headers', {}).items():
+            key = name.upper().replace('-', '_').encode('utf-8')
+            if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                key = 'HTTP_' + key
+            environ[key] = unicode(value).encode('utf-8')
+
+        return environ
+
+    def copy_context(self, context):
+        """
+        Copy the ``appathy.context`` of the batch request for a
+        sub-request.  The default makes a shallow copy; subclasses may
+        override this for contexts which need more care.
+        """
+
+        return copy.copy(context)
+
+    def run(self, environs):
+        """
+        Run the sub-requests with the given environments.  Returns a
+        list of the encoded results, in the same order.
+        """
+
+        if self.pool is None or len(environs) < 2:
+            return [self.call(environ) for environ in environs]
+
+        results = [None] * len(environs)
+        pending = {}
+        queue = enumerate(environs)
+
+        def submit(count):
+            for idx, environ in itertools.islice(queue, count):
+                pending[self.pool.submit(self.call, environ)] = idx
+
+        # Keep at most `concurrency` sub-requests in flight
+        submit(self.concurrency)
+        while pending:
+            done, _not_done = futures.wait(
+                pending, return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                results[pending.pop(future)] = future.result()
+            submit(len(done))
+
+        return results
+
+    def call(self, environ):
+        """
+        Run a single sub-request through the application.  Returns
+        the JSON encoding of its result.
+        """
+
+        captured = []
+
+        def start_response(status, headers, exc_info=None):
+            captured[:] = [status, headers]
+            return lambda data: chunks.append(data)
+
+        chunks = []
+        app_iter = self.app(environ, start_response)
+        try:
+            chunks.extend(app_iter)
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+
+        status, headers = captured
+        body = ''.join(chunks)
+        result = [
+            '{"status":%d' % int(status.split(' ', 1)[0]),
+            ',"headers":%s' % types.json_dumps(headers),
+        ]
+
+        # Encode the body
+        content_type = dict((name.lower(), value)
+                            for name, value in headers).get('content-type')
+        if not body:
+            result.append(',"body":null')
+        elif content_type and _is_json(content_type) and _valid_json(body):
+            result.append(',"body":%s' % body)
+        else:
+            try:
+                result.append(',"body":%s' %
+                              types.json_dumps(body.decode('utf-8')))
+            except UnicodeDecodeError:
+                result.append(',"body":"%s","encoding":"base64"' %
+                              base64.b64encode(body))
+
+        result.append('}')
+        return ''.join(result)
@@ -0,0 +1,514 @@
+# Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+import collections
+import itertools
+import logging
+import threading
+import time
+
+import webob
+
+from appathy import utils
+
+
+LOG = logging.getLogger('appathy')
+
+# A cached response
+Entry = collections.namedtuple('Entry',
+                               ['expires', 'status', 'headerlist', 'body'])
+
+
+class _Resumed(object):
+    """
+    An app_iter which yields the chunks already read from another
+    app_iter, followed by the rest of its chunks.  Closing it closes
+    the original app_iter.
+    """
+
+    def __init__(self, chunks, rest, app_iter):
+        """
+        Initialize a _Resumed.
+        """
+
+        self.chunks = chunks
+        self.rest = rest
+        self.app_iter = app_iter
+
+    def __iter__(self):
+        """
+        Iterate over the chunks.
+        """
+
+        return itertools.chain(self.chunks, self.rest)
+
+    def close(self):
+        """
+        Close the original app_iter.
+        """
+
+        if hasattr(self.app_iter, 'close'):
+            self.app_iter.close()
+
+
+def _buffer(resp, max_size):
+    """
+    Read the streamed body of the `webob.Response` `resp`, replacing
+    its app_iter with the body.  Returns the body, or None if the body
+    is larger than `max_size` bytes; in that case, the response is left
+    to stream the body as before.
+    """
+
+    app_iter = resp.app_iter
+    rest = iter(app_iter)
+    chunks = []
+    size = 0
+    for chunk in rest:
+        chunks.append(chunk)
+        size += len(chunk)
+        if size > max_size:
+            resp.app_iter = _Resumed(chunks, rest, app_iter)
+            return None
+
+    if hasattr(app_iter, 'close'):
+        app_iter.close()
+
+    body = ''.join(chunks)
+    resp.app_iter = [body]
+    resp.content_length = len(body)
+    return body
+
+
+def _snapshot(resp, expires=None, max_size=0):
+    """
+    Capture the `webob.Response` `resp` as an Entry, so that it may be
+    replayed to other requests.  Streamed bodies of up to `max_size`
+    bytes are read into memory first.  Returns None if the response
+    cannot be shared: if its body is streamed and too large, or if it
+    sets cookies.
+    """
+
+    if 'Set-Cookie' in resp.headers:
+        return None
+
+    if isinstance(resp.app_iter, (list, tuple)):
+        body = ''.join(resp.app_iter)
+    elif max_size > 0:
+        body = _buffer(resp, max_size)
+        if body is None:
+            return None
+    else:
+        return None
+
+    return Entry(expires, resp.status, tuple(resp.headerlist), body)
+
+
+def _replay(entry, req):
+    """
+    Build a new `webob.Response` for the request `req` from the
+    Entry `entry`.  The response is conditional, so Range and
+    If-None-Match are honored.
+    """
+
+    return webob.Response(request=req, status=entry.status,
+                          headerlist=list(entry.headerlist),
+                          app_iter=[entry.body],
+                          conditional_response=True)
+
+
+class Backend(object):
+    """
+    The interface for the storage used by a ResponseCache.  Keys are
+    strings, and values are Entry tuples.  Backends must be
+    thread-safe.
+    """
+
+    def get(self, key):
+        """
+        Retrieve the entry stored for `key`.  Returns None if the key
+        is not stored.
+        """
+
+        raise NotImplementedError()
+
+    def set(self, key, entry, ttl):
+        """
+        Store `entry` for `key`.  The entry will not be used after
+        `ttl` seconds, so the backend may discard it then.
+        """
+
+        raise NotImplementedError()
+
+    def delete(self, key):
+        """
+        Remove the entry stored for `key`, if any.
+        """
+
+        raise NotImplementedError()
+
+    def clear(self):
+        """
+        Remove all entries.
+        """
+
+        raise NotImplementedError()
+
+    def stats(self):
+        """
+        Return a dictionary of statistics describing the backend.
+        """
+
+        return {}
+
+
+class MemoryBackend(Backend):
+    """
+    A Backend which stores entries in memory, in a size-bounded LRU
+    cache.
+    """
+
+    def __init__(self, size=1024):
+        """
+        Initialize a MemoryBackend holding at most `size` entries.
+        """
+
+        self.cache = utils.LRUCache(size)
+
+    def get(self, key):
+        """
+        Retrieve the entry stored for `key`.  Returns None if the key
+        is not stored.
+        """
+
+        return self.cache.get(key)
+
+    def set(self, key, entry, ttl):
+        """
+        Store `entry` for `key`.  Expired entries are left to be
+        evicted.
+        """
+
+        self.cache.set(key, entry)
+
+    def delete(self, key):
+        """
+        Remove the entry stored for `key`, if any.
+        """
+
+        self.cache.delete(key)
+
+    def clear(self):
+        """
+        Remove all entries.
+        """
+
+        self.cache.clear()
+
+    def stats(self):
+        """
+        Return the size, length, and eviction count of the LRU cache.
+        """
+
+        stats = self.cache.stats()
+        return dict(size=stats['size'], length=stats['length'],
+                    evictions=stats['evictions'])
+
+
+class ResponseCache(object):
+    """
+    Caches serialized responses for `ttl` seconds.  Entries are
+    stored in `backend`, which defaults to a MemoryBackend holding
+    `size` entries.  Only responses with a 200 status code are
+    stored; responses which set cookies are not.  Streamed responses,
+    such as large lists, are read into memory and stored if their
+    bodies are no larger than `max_size` bytes; larger bodies continue
+    to be streamed, and are not stored.  Counts hits, misses
+    (including expired entries), and stores.
+
+    If `grace` is given, expired entries continue to be served by
+    lookup() for up to `grace` seconds, while a single refresh of each
+    entry is run in a background thread by refresh().  The number of
+    stale responses served, the largest age (past expiration) of a
+    stale response, and the number of refreshes completed, failed,
+    and in progress are also counted.
+    """
+
+    def __init__(self, ttl=60, size=1024, backend=None, grace=0,
+                 max_size=1024 * 1024):
+        """
+        Initialize a ResponseCache.
+        """
+
+        self.ttl = ttl
+        self.grace = grace
+        self.max_size = max_size
+        self.backend = backend if backend is not None else \
+            MemoryBackend(size)
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.stale_hits = 0
+        self.max_stale_age = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def get(self, key, req):
+        """
+        Retrieve the response cached for `key`.  Returns a new
+        `webob.Response` for the request `req`, or None if no
+        unexpired response is cached.  The response is conditional,
+        so Range and If-None-Match are honored.
+        """
+
+        return self._lookup(key, req, 0)[0]
+
+    def lookup(self, key, req):
+        """
+        Retrieve the response cached for `key`, allowing for the grace
+        period.  Returns a tuple of a new `webob.Response` for the
+        request `req` (or None if no usable response is cached) and a
+        flag which is True if the response is stale and the caller is
+        responsible for calling refresh() for `key`.  Only one caller
+        at a time is made responsible for refreshing an entry.
+        """
+
+        return self._lookup(key, req, self.grace)
+
+    def _lookup(self, key, req, grace):
+        """
+        Retrieve the response cached for `key`, serving expired
+        entries for up to `grace` seconds.  Implements get() and
+        lookup().
+        """
+
+        entry = self.backend.get(key)
+        now = time.time()
+        refresh = False
+
+        with self._lock:
+            if entry is None or entry.expires + grace <= now:
+                self.misses += 1
+                return None, False
+            elif entry.expires > now:
+                self.hits += 1
+            else:
+                # Stale; claim the refresh if nobody else has
+                self.stale_hits += 1
+                self.max_stale_age = max(self.max_stale_age,
+                                         now - entry.expires)
+                if key not in self._refreshing:
+                    self._refreshing.add(key)
+                    refresh = True
+
+        return _replay(entry, req), refresh
+
+    def refresh(self, key, func):
+        """
+        Refresh the response cached for `key` in a background thread.
+        The thread calls `func` with no arguments to compute the new
+        response, which is cached; if it cannot be cached, the stale
+        entry is removed.  The caller must have been made responsible
+        for the refresh by lookup().
+        """
+
+        thread = threading.Thread(target=self._refresh, args=(key, func))
+        thread.daemon = True
+        thread.start()
+
+    def _refresh(self, key, func):
+        """
+        Perform the refresh of the response cached for `key`.  Runs in
+        the thread started by refresh().
+        """
+
+        try:
+            resp = func()
+            if not self.set(key, resp):
+                # Nobody will send the response, so release its body
+                self.delete(key)
+                if hasattr(resp.app_iter, 'close'):
+                    resp.app_iter.close()
+        except Exception:
+            LOG.exception("Failed to refresh cached response %r" % key)
+            with self._lock:
+                self.refresh_errors += 1
+        else:
+            with self._lock:
+                self.refreshes += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def set(self, key, resp):
+        """
+        Cache the `webob.Response` `resp` for `key`, if it may be
+        cached.  Returns True if the response was cached.
+        """
+
+        # Only cache complete, successful, anonymous responses
+        if resp.status_int != 200:
+            return False
+        entry = _snapshot(resp, time.time() + self.ttl, self.max_size)
+        if entry is None:
+            return False
+
+        self.backend.set(key, entry, self.ttl + self.grace)
+
+        with self._lock:
+            self.stores += 1
+
+        return True
+
+    def delete(self, key):
+        """
+        Remove the response cached for `key`, if any.
+        """
+
+        self.backend.delete(key)
+
+    def clear(self):
+        """
+        Remove all cached responses.
+        """
+
+        self.backend.clear()
+
+    def stats(self):
+        """
+        Return a dictionary of the hit, miss, store, and refresh
+        counters, along with the statistics of the backend.
+        """
+
+        stats = self.backend.stats()
+        with self._lock:
+            stats.update(ttl=self.ttl, hits=self.hits, misses=self.misses,
+                         stores=self.stores)
+            if self.grace:
+                stats.update(grace=self.grace, stale_hits=self.stale_hits,
+                             max_stale_age=self.max_stale_age,
+                             refreshes=self.refreshes,
+                             refresh_errors=self.refresh_errors,
+                             refreshing=len(self._refreshing))
+        return stats
+
+
+class _Flight(object):
+    """
+    Tracks a request being processed on behalf of a Coalescer.  The
+    `entry` attribute is set to the captured response (or left None,
+    if the response could not be shared or processing failed) before
+    the `done` event is set.
+    """
+
+    def __init__(self):
+        """
+        Initialize a _Flight.
+        """
+
+        self.entry = None
+        self.done = threading.Event()
+
+
+class Coalescer(object):
+    """
+    Coalesces concurrent identical requests.  The first request for a
+    key (the leader) is processed; requests for the same key which
+    arrive while it is in flight (the followers) wait for up to
+    `timeout` seconds and then receive a copy of the leader's
+    response.  Nothing is retained once the leader finishes.
+
+    Streamed responses, such as large lists, are read into memory
+    and shared if their bodies are no larger than `max_size` bytes.
+    A follower processes its request itself if the wait times out,
+    if the leader raised an exception, or if the leader's response
+    could not be shared (because it is a larger streamed response or
+    sets cookies); these are counted as fallbacks.  Followers are
+    released as soon as the leader's response has been captured, or
+    found not to be shareable, rather than when it has been sent.
+    Leaders and followers are also counted.
+    """
+
+    def __init__(self, timeout=10, max_size=1024 * 1024):
+        """
+        Initialize a Coalescer.
+        """
+
+        self.timeout = timeout
+        self.max_size = max_size
+
+        self.leaders = 0
+        self.followers = 0
+        self.timeouts = 0
+        self.fallbacks = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def run(self, key, req, func):
+        """
+        Process the request `req`, identified by `key`, by calling
+        `func` with no arguments, unless an identical request is
+        already in flight.  Returns a `webob.Response`.
+        """
+
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                self.leaders += 1
+                leader = True
+            else:
+                self.followers += 1
+                leader = False
+
+        if leader:
+            try:
+                resp = func()
+                flight.entry = _snapshot(resp, max_size=self.max_size)
+                return resp
+            finally:
+                # Release the followers, even on failure
+                with self._lock:
+                    del self._flights[key]
+                flight.done.set()
+
+        # Wait for the leader to finish
+        if not flight.done.wait(self.timeout):
+            with self._lock:
+                self.timeouts += 1
+                self.fallbacks += 1
+            return func()
+        elif flight.entry is None:
+            with self._lock:
+                self.fallbacks += 1
+            return func()
+
+        return _replay(flight.entry, req)
+
+    def stats(self):
+        """
+        Return a dictionary of the leader, follower, timeout, and
+        fallback counters, along with the number of requests in
+        flight.
+        """
+
+        with self._lock:
+            return dict(timeout=self.timeout, leaders=self.leaders,
+                        followers=self.followers, timeouts=self.timeouts,
+                        fallbacks=self.fallbacks,
+                        in_flight=len(self._flights))
@@ -0,0 +1,456 @@
+# Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""
+A pure-Python implementation of the Concise Binary Object
+Representation (CBOR), as described by RFC 8949.  The dumps() and
+loads() functions mirror those of the ``json`` module: integers
+(including big integers), floats, strings, lists, tuples,
+dictionaries, True, False, and None may be encoded, and any iterator
+(such as a generator) is encoded as an indefinite-length array.
+Byte strings which are valid UTF-8 are encoded as text strings, and
+all text strings are decoded to unicode; other byte strings, along
+with bytearray and buffer objects, are encoded as byte strings, which
+decode to byte strings.
+
+When decoding, tags 2 and 3 (big integers) are interpreted; all other
+tags are ignored, and the tagged value is returned.  Malformed input,
+or input nested more deeply than MAX_DEPTH, causes a ValueError to be
+raised.
+"""
+
+import codecs
+import collections
+import math
+import struct
+
+
+# Precompiled structures for packing and unpacking
+_uint16 = struct.Struct('>H')
+_uint32 = struct.Struct('>I')
+_uint64 = struct.Struct('>Q')
+_float32 = struct.Struct('>f')
+_float64 = struct.Struct('>d')
+
+# The UTF-8 codec functions, bypassing the codec registry
+_utf8_decode = codecs.utf_8_decode
+_utf8_encode = codecs.utf_8_encode
+
+# Initial bytes for items with small arguments, by major type
+_heads = [[chr((major << 5) | i) for i in range(24)] for major in range(8)]
+
+# Special values
+BREAK = '\xff'
+INDEFINITE_ARRAY = '\x9f'
+_FALSE = '\xf4'
+_TRUE = '\xf5'
+_NULL = '\xf6'
+
+# The deepest nesting of arrays, maps, and tags which will be decoded
+MAX_DEPTH = 256
+
+
+def header(major, length):
+    """
+    Encode the initial byte and argument of a data item with the
+    given major type and length (or value).
+    """
+
+    if length < 24:
+        return _heads[major][length]
+
+    major <<= 5
+    if length < 0x100:
+        return chr(major | 24) + chr(length)
+    elif length < 0x10000:
+        return chr(major | 25) + _uint16.pack(length)
+    elif length < 0x100000000:
+        return chr(major | 26) + _uint32.pack(length)
+    return chr(major | 27) + _uint64.pack(length)
+
+
+def _encode_int(value, out):
+    """
+    Encode an integer.  Integers which do not fit in 64 bits are
+    encoded as big integers.
+    """
+
+    if 0 <= value < 0x10000000000000000:
+        out.append(header(0, value))
+    elif -0x10000000000000000 <= value < 0:
+        out.append(header(1, -1 - value))
+    else:
+        # Big integer; tag 2 for positive, tag 3 for negative
+        if value < 0:
+            tag, value = '\xc3', -1 - value
+        else:
+            tag = '\xc2'
+        digits = '%x' % value
+        if len(digits) % 2:
+            digits = '0' + digits
+        data = digits.decode('hex')
+        out.append(tag + header(2, len(data)) + data)
+
+
+def _encode_float(value, out):
+    """
+    Encode a float.
+    """
+
+    out.append('\xfb' + _float64.pack(value))
+
+
+def _encode_str(value, out):
+    """
+    Encode a byte string.  If it is valid UTF-8, it is encoded as a
+    text string.
+    """
+
+    try:
+        _utf8_decode(value, 'strict', True)
+    except UnicodeDecodeError:
+        out.append(header(2, len(value)) + value)
+    else:
+        out.append(header(3, len(value)) + value)
+
+
+def _encode_unicode(value, out):
+    """
+    Encode a text string.
+    """
+
+    value = _utf8_encode(value)[0]
+    out.append(header(3, len(value)) + value)
+
+
+def _encode_bytes(value, out):
+    """
+    Encode a bytearray or buffer as a byte string.
+    """
+
+    value = str(value)
+    out.append(header(2, len(value)) + value)
+
+
+def _encode_bool(value, out):
+    """
+    Encode True or False.
+    """
+
+    out.append(_TRUE if value else _FALSE)
+
+
+def _encode_none(value, out):
+    """
+    Encode None.
+    """
+
+    out.append(_NULL)
+
+
+def _encode_list(value, out):
+    """
+    Encode a list or tuple.
+    """
+
+    out.append(header(4, len(value)))
+    for item in value:
+        (_encoders.get(type(item)) or _find_encoder(item))(item, out)
+
+
+def _encode_dict(value, out):
+    """
+    Encode a dictionary.
+    """
+
+    out.append(header(5, len(value)))
+    for key, item in value.iteritems():
+        (_encoders.get(type(key)) or _find_encoder(key))(key, out)
+        (_encoders.get(type(item)) or _find_encoder(item))(item, out)
+
+
+def _encode_iter(value, out):
+    """
+    Encode an iterator as an indefinite-length array.
+    """
+
+    out.append(INDEFINITE_ARRAY)
+    for item in value:
+        _encode(item, out)
+    out.append(BREAK)
+
+
+# Map exact types to their encoders
+_encoders = {
+    int: _encode_int,
+    long: _encode_int,
+    float: _encode_float,
+    str: _encode_str,
+    unicode: _encode_unicode,
+    bytearray: _encode_bytes,
+    buffer: _encode_bytes,
+    bool: _encode_bool,
+    type(None): _encode_none,
+    list: _encode_list,
+    tuple: _encode_list,
+    dict: _encode_dict,
+}
+
+
+def _find_encoder(value):
+    """
+    Find the encoder for an instance of a type not listed in
+    `_encoders`, such as a subclass of one of those types.
+    """
+
+    # Order matters: bool is a subclass of int
+    for cls, encoder in [(bool, _encode_bool),
+                         ((int, long), _encode_int),
+                         (float, _encode_float),
+                         (unicode, _encode_unicode),
+                         (str, _encode_str),
+                         ((bytearray, buffer), _encode_bytes),
+                         ((list, tuple), _encode_list),
+                         (collections.Mapping, _encode_dict),
+                         (collections.Iterator, _encode_iter)]:
+        if isinstance(value, cls):
+            return encoder
+
+    raise TypeError('%r is not CBOR serializable' % (value,))
+
+
+def _encode(value, out):
+    """
+    Encode a value, appending the encoded strings to the list `out`.
+    """
+
+    encoder = _encoders.get(type(value))
+    if encoder is None:
+        encoder = _find_encoder(value)
+    encoder(value, out)
+
+
+def dumps(value):
+    """
+    Encode a value as CBOR.  Returns a string.
+    """
+
+    out = []
+    _encode(value, out)
+    return ''.join(out)
+
+
+def _read_argument(data, pos, info):
+    """
+    Read the argument of a data item, given the additional
+    information from its initial byte.  Returns a tuple of the
+    argument and the new position.
+    """
+
+    if info < 24:
+        return info, pos
+    elif info == 24:
+        return ord(data[pos]), pos + 1
+    elif info == 25:
+        return _uint16.unpack_from(data, pos)[0], pos + 2
+    elif info == 26:
+        return _uint32.unpack_from(data, pos)[0], pos + 4
+    elif info == 27:
+        return _uint64.unpack_from(data, pos)[0], pos + 8
+
+    raise ValueError('Invalid additional information %d at offset %d' %
+                     (info, pos - 1))
+
+
+def _read_string(data, pos, length):
+    """
+    Read a string of the given length.  Returns a tuple of the string
+    and the new position.
+    """
+
+    end = pos + length
+    if end > len(data):
+        raise ValueError('Truncated string at offset %d' % pos)
+    return data[pos:end], end
+
+
+def _decode_indefinite_string(data, pos, major):
+    """
+    Decode an indefinite-length byte or text string, which consists
+    of definite-length chunks of the same major type.
+    """
+
+    chunks = []
+    while data[pos] != BREAK:
+        initial = ord(data[pos])
+        if initial >> 5 != major or initial & 0x1f == 31:
+            raise ValueError('Invalid string chunk at offset %d' % pos)
+
+        length, pos = _read_argument(data, pos + 1, initial & 0x1f)
+        chunk, pos = _read_string(data, pos, length)
+        chunks.append(chunk)
+
+    return ''.join(chunks), pos + 1
+
+
+def _decode_half(value):
+    """
+    Convert the bits of a half-precision float to a float.
+    """
+
+    exponent = (value >> 10) & 0x1f
+    mantissa = value & 0x3ff
+    if exponent == 0:
+        result = math.ldexp(mantissa, -24)
+    elif exponent != 31:
+        result = math.ldexp(mantissa + 1024, exponent - 25)
+    elif mantissa == 0:
+        result = float('inf')
+    else:
+        result = float('nan')
+
+    return -result if value & 0x8000 else result
+
+
+def _decode_simple(data, pos, info):
+    """
+    Decode a simple value or float.
+    """
+
+    if info == 20:
+        return False, pos
+    elif info == 21:
+        return True, pos
+    elif info == 22 or info == 23:
+        # null and undefined
+        return None, pos
+    elif info == 25:
+        return _decode_half(_uint16.unpack_from(data, pos)[0]), pos + 2
+    elif info == 26:
+        return _float32.unpack_from(data, pos)[0], pos + 4
+    elif info == 27:
+        return _float64.unpack_from(data, pos)[0], pos + 8
+
+    raise ValueError('Unsupported simple value at offset %d' % (pos - 1))
+
+
+def _decode(data, pos, depth=0):
+    """
+    Decode the data item beginning at `pos`, which is nested within
+    `depth` arrays, maps, or tags.  Returns a tuple of the value and
+    the position of the next data item.
+    """
+
+    if depth > MAX_DEPTH:
+        raise ValueError('CBOR data nested too deeply at offset %d' % pos)
+
+    initial = ord(data[pos])
+    major = initial >> 5
+    info = initial & 0x1f
+    pos += 1
+
+    # Simple values and floats
+    if major == 7:
+        return _decode_simple(data, pos, info)
+
+    # Indefinite-length items
+    if info == 31:
+        if major == 2:
+            return _decode_indefinite_string(data, pos, major)
+        elif major == 3:
+            value, pos = _decode_indefinite_string(data, pos, major)
+            return _utf8_decode(value, 'strict', True)[0], pos
+        elif major == 4:
+            value = []
+            while data[pos] != BREAK:
+                item, pos = _decode(data, pos, depth + 1)
+                value.append(item)
+            return value, pos + 1
+        elif major == 5:
+            value = {}
+            while data[pos] != BREAK:
+                key, pos = _decode(data, pos, depth + 1)
+                value[key], pos = _decode(data, pos, depth + 1)
+            return value, pos + 1
+
+        raise ValueError('Invalid indefinite length at offset %d' %
+                         (pos - 1))
+
+    if info < 24:
+        arg = info
+    else:
+        arg, pos = _read_argument(data, pos, info)
+
+    if major == 3:
+        # Text strings are the most common
+        end = pos + arg
+        if end > len(data):
+            raise ValueError('Truncated string at offset %d' % pos)
+        return _utf8_decode(data[pos:end], 'strict', True)[0], end
+    elif major == 0:
+        return arg, pos
+    elif major == 1:
+        return -1 - arg, pos
+    elif major == 2:
+        return _read_string(data, pos, arg)
+    elif major in (4, 5) and arg > len(data) - pos:
+        # Every item takes at least a byte
+        raise ValueError('Truncated array or map at offset %d' % pos)
+    elif major == 4:
+        value = []
+        for i in xrange(arg):
+            item, pos = _decode(data, pos, depth + 1)
+            value.append(item)
+        return value, pos
+    elif major == 5:
+        value = {}
+        for i in xrange(arg):
+            key, pos = _decode(data, pos, depth + 1)
+            value[key], pos = _decode(data, pos, depth + 1)
+        return value, pos
+
+    # Tagged item
+    value, pos = _decode(data, pos, depth + 1)
+    if arg in (2, 3) and isinstance(value, str):
+        value = int(value.encode('hex') or '0', 16)
+        if arg == 3:
+            value = -1 - value
+    return value, pos
+
+
+def loads(data):
+    """
+    Decode a CBOR data item from a string.  Raises ValueError if the
+    data is malformed.
+    """
+
+    data = str(data)
+
+    try:
+        value, pos = _decode(data, 0)
+    except IndexError:
+        raise ValueError('Truncated CBOR data')
+    except struct.error:
+        raise ValueError('Truncated CBOR data')
+    except UnicodeDecodeError:
+        raise ValueError('Invalid UTF-8 in CBOR text string')
+    except TypeError:
+        raise ValueError('Unhashable CBOR map key')
+
+    if pos != len(data):
+        raise ValueError('Extra data at offset %d' % pos)
+
+    return value
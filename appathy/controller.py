@@ -16,6 +16,7 @@
 
 import functools
 import logging
+import re
 
 import metatools
 import webob
@@ -24,11 +25,15 @@ import webob.exc
 from appathy import actions
 from appathy import exceptions
 from appathy import response
+from appathy import types
 from appathy import utils
 
 
 LOG = logging.getLogger('appathy')
 
+# Regular expression to identify the variables in a route path
+_route_var_re = re.compile(r'{(\w+)')
+
 
 class ControllerMeta(metatools.MetaClass):
     """
@@ -94,10 +99,13 @@ class ControllerMeta(metatools.MetaClass):
             mcs.inherit_dict(base, namespace, '_wsgi_serializers')
             mcs.inherit_dict(base, namespace, '_wsgi_deserializers')
             mcs.inherit_dict(base, namespace, 'wsgi_method_map')
+            mcs.inherit_dict(base, namespace, 'wsgi_invalidation_map')
 
         return super(ControllerMeta, mcs).__new__(mcs, name, bases, namespace)
 
 
+@types.serializers(**types.default_serializers)
+@types.deserializers(**types.default_deserializers)
 class Controller(object):
     """
     Identifies a resource.  All controllers must specify the attribute
@@ -132,6 +140,18 @@ class Controller(object):
     mapped to 2-tuples consisting of the path (with "%s" being
     replaced by the `wsgi_name` attribute value) and the method list;
     note that this second element MUST be a list.
+
+    Similarly, when the create(), update(), and delete() actions
+    succeed, they invalidate the cached responses (see the `cache`
+    argument of @action()) of the index() and show() actions, as
+    defined by the `wsgi_invalidation_map` attribute of the class,
+    which maps function names to lists of the names of the actions
+    they invalidate.  An action may override this with the
+    `invalidates` argument of @action().
+
+    All controllers have a JSON serializer and deserializer, which
+    may be overridden by the @serializers() and @deserializers()
+    decorators.
     """
 
     __metaclass__ = ControllerMeta
@@ -146,6 +166,12 @@ class Controller(object):
         delete=("/%s/{id}", ["DELETE"]),
     )
 
+    wsgi_invalidation_map = dict(
+        create=["index"],
+        update=["index", "show"],
+        delete=["index", "show"],
+    )
+
     def __new__(cls, mapper=None):
         """
         Prefilter controller class instantiation.  Prohibits
@@ -200,70 +226,115 @@ class Controller(object):
         if not descriptor:
             raise webob.exc.HTTPNotFound()
 
-        # Now we need to deserialize the body...
-        body = descriptor.deserialize_request(req)
-        if body is not None:
-            params['body'] = body
-
-        # Process the extensions...
-        resp, post_list = descriptor.pre_process(req, params)
-
-        # Call the actual action method...
-        if not resp:
-            resp = descriptor(req, params)
-
-        # Perform post-processing...
-        resp = descriptor.post_process(post_list, req, resp, params)
-
-        # And finally, serialize and return the response
-        return resp._serialize()
+        # Process the request
+        return descriptor.process(req, params)
 
     def _get_action(self, action):
         """
         Retrieve a descriptor for the named action.  Caches
-        descriptors for efficiency.
+        descriptors for efficiency.  Unless the controller has been
+        frozen, descriptors are built on first use.
         """
 
         # If we don't have an action named that, bail out
         if action not in self.wsgi_actions:
             return None
 
-        # Generate an ActionDescriptor if necessary
-        if action not in self.wsgi_descriptors:
-            self.wsgi_descriptors[action] = actions.ActionDescriptor(
-                self.wsgi_actions[action],
-                self.wsgi_extensions.get(action, []),
-                self.wsgi_resp_type)
+        # Use the cached ActionDescriptor, if there is one
+        descriptor = self.wsgi_descriptors.get(action)
+        if descriptor is None:
+            # Generate one; if another thread beats us to it, use the
+            # one it published
+            descriptor = self.wsgi_descriptors.setdefault(
+                action, self._build_action(action))
 
         # OK, return the method descriptor
-        return self.wsgi_descriptors[action]
+        return descriptor
 
-    def _route(self, action, method):
+    def _build_action(self, action):
         """
-        Given an action method, generates a route for it.
+        Construct a descriptor for the named action.
+        """
+
+        method = self.wsgi_actions[action]
+
+        # Determine which cached actions this action invalidates
+        targets = getattr(method, '_wsgi_invalidates', None)
+        if targets is None:
+            targets = self.wsgi_invalidation_map.get(action, [])
+        invalidators = [self._invalidator(target) for target in targets
+                        if getattr(self.wsgi_actions.get(target),
+                                   '_wsgi_cache', None) is not None]
+
+        return actions.ActionDescriptor(
+            method,
+            self.wsgi_extensions.get(action, []),
+            self.wsgi_resp_type,
+            invalidators)
+
+    def _invalidator(self, action):
+        """
+        Construct a function which, when passed the parameters of a
+        request for another action, invalidates the cached responses
+        of the named action having the same values for its route
+        variables.
+        """
+
+        method = self.wsgi_actions[action]
+        path = self._route_path(method)[0] or ''
+        route_vars = _route_var_re.findall(path)
+        keywords = getattr(method, '_wsgi_keywords', {})
+
+        def invalidator(params):
+            # Build the parameters the action would have been called
+            # with
+            target_params = dict((var, params[var]) for var in route_vars
+                                 if var in params)
+            target_params.update(keywords)
+
+            # Descriptors are looked up lazily, since actions may
+            # invalidate each other
+            self._get_action(action).uncache(target_params)
+
+        return invalidator
+
+    def _route_path(self, method):
+        """
+        Determine the path of an action method, including any
+        `wsgi_path_prefix`, along with the list of HTTP methods given
+        by `wsgi_method_map`.  Returns a tuple of the path and the
+        methods; the path is None if the action method has no path.
         """
 
-        # First thing, determine the path for the method
         path = method._wsgi_path
         methods = None
         if path is None:
             map_rule = self.wsgi_method_map.get(method.__name__)
             if map_rule is None:
-                # Can't connect this method
-                LOG.warning("No path specified for action method %s() of "
-                            "resource %s" % (method.__name__, self.wsgi_name))
-                return
+                return None, None
 
             # Compute the path and the method list
             path = utils.norm_path(map_rule[0] % self.wsgi_name)
             methods = map_rule[1]
 
+        return getattr(self, 'wsgi_path_prefix', '') + path, methods
+
+    def _route(self, action, method):
+        """
+        Given an action method, generates a route for it.
+        """
+
+        # First thing, determine the path for the method
+        path, methods = self._route_path(method)
+        if path is None:
+            # Can't connect this method
+            LOG.warning("No path specified for action method %s() of "
+                        "resource %s" % (method.__name__, self.wsgi_name))
+            return
+
         # Compute route name
         name = '%s_%s' % (self.wsgi_name, action)
 
-        # Set up path
-        path = getattr(self, 'wsgi_path_prefix', '') + path
-
         # Build up the conditions
         conditions = {}
         if hasattr(method, '_wsgi_methods'):
@@ -285,9 +356,14 @@ class Controller(object):
         controller have routes generated for them (only if none
         already exist) and are made actions of this controller; all
         extensions defined on the extension controller are added to
-        the extensions registered on this controller.
+        the extensions registered on this controller.  A frozen
+        controller may not be extended.
         """
 
+        # Can't change the descriptors once they're frozen
+        if isinstance(self.wsgi_descriptors, utils.FrozenDict):
+            raise exceptions.FrozenController(self.wsgi_name)
+
         # Add/override actions
         for key, action in controller.wsgi_actions.items():
             # If it's a new action, we'll need to route
@@ -314,6 +390,24 @@ class Controller(object):
             # Clear existing action descriptors
             self.wsgi_descriptors.pop(key, None)
 
+    def wsgi_freeze(self):
+        """
+        Builds the descriptors for all actions and replaces the
+        descriptor cache with an immutable mapping.  The reusable
+        serializers and deserializers of each descriptor are built,
+        too.  Should be called only after all extensions have been
+        applied; once frozen, descriptors are never built on the
+        request path, and the controller may not be extended.
+        """
+
+        self.wsgi_descriptors = utils.FrozenDict(
+            (action, self._build_action(action))
+            for action in self.wsgi_actions)
+
+        # Build the reusable translators ahead of the first request
+        for descriptor in self.wsgi_descriptors.values():
+            descriptor.prepare()
+
 
 def action(*methods, **kwargs):
     """
@@ -334,6 +428,48 @@ def action(*methods, **kwargs):
         action method may always return a ResponseObject instance with
         an alternate code, if desired.
 
+    * validator
+        Identifies a function which will be passed the request and a
+        dictionary of the route parameters, and should cheaply compute
+        a version stamp for the resource: either an ETag string or a
+        `datetime.datetime` giving the last modification time, or None
+        if the version cannot be determined.  The stamp is used to
+        answer GET and HEAD requests having If-None-Match or
+        If-Modified-Since headers with "304 Not Modified", without
+        calling the action method, its extensions, or the serializer.
+        Otherwise, the stamp is sent as the ETag or Last-Modified
+        header of a successful response.
+
+    * cache
+        Caches the serialized responses to GET and HEAD requests
+        without query strings, keyed by the route parameters and the
+        negotiated content type.  May be a number of seconds for which
+        responses are cached, or an instance of
+        `appathy.cache.ResponseCache`, which allows the size of the
+        cache or its backend to be specified and which may be shared
+        between actions.
+
+    * coalesce
+        Coalesces identical GET and HEAD requests (having the same
+        route parameters and negotiated content type, and no query
+        string, body, or Range header) which arrive while one of them
+        is being processed: the others wait for it and receive a copy
+        of its response.  May be True, a number of seconds after which
+        waiting requests give up and are processed themselves, or an
+        instance of `appathy.cache.Coalescer`.  Requests are also
+        processed themselves if the response they waited for raised
+        an exception, is streamed and larger than the `max_size` of
+        the Coalescer, or sets cookies.
+
+    * invalidates
+        A list of the names of the cached actions of the same
+        controller whose cached responses are invalidated when this
+        action succeeds (i.e., returns a response with a status code
+        less than 400).  Only the responses whose route variables
+        (e.g., {id}) have the same values as this action's are
+        invalidated.  Overrides the controller's
+        `wsgi_invalidation_map`.
+
     All other keyword arguments will be statically passed to the
     action method when called.
     """
@@ -378,6 +514,25 @@ def action(*methods, **kwargs):
     if 'code' in kwargs:
         attrs['_wsgi_code'] = kwargs.pop('code')
 
+    # If we have a validator, save it
+    if 'validator' in kwargs:
+        attrs['_wsgi_validator'] = kwargs.pop('validator')
+
+    # If we have a cache, save it
+    if 'cache' in kwargs:
+        attrs['_wsgi_cache'] = kwargs.pop('cache')
+
+    # If we coalesce concurrent requests, save the coalescer
+    if 'coalesce' in kwargs:
+        attrs['_wsgi_coalesce'] = kwargs.pop('coalesce')
+
+    # If we invalidate cached actions, save their names
+    if 'invalidates' in kwargs:
+        invalidates = kwargs.pop('invalidates')
+        if isinstance(invalidates, basestring):
+            invalidates = [invalidates]
+        attrs['_wsgi_invalidates'] = list(invalidates)
+
     # Strip out action and controller arguments
     kwargs.pop('action', None)
     kwargs.pop('controller', None)
@@ -62,6 +62,18 @@ class AppathyException(Exception):
         super(AppathyException, self).__init__(message % kwargs)
 
 
+class FrozenController(AppathyException):
+    """Cannot extend frozen controller %(name)r"""
+
+    base_args = ['name']
+
+
+class IncompatibleCache(AppathyException):
+    """Shared cache file %(path)r has a different layout"""
+
+    base_args = ['path']
+
+
 class IncompleteController(AppathyException):
     """Cannot instantiate an incomplete controller"""
 
@@ -72,5 +84,11 @@ class NoSuchResource(AppathyException):
     base_args = ['name']
 
 
+class NoSuchRouter(AppathyException):
+    """No such router %(name)r"""
+
+    base_args = ['name']
+
+
 class UnboundResponse(AppathyException):
     """Response object must be bound before it can be serialized"""
@@ -15,18 +15,60 @@
 # <http://www.gnu.org/licenses/>.
 
 import collections
+import io
+import mmap
+import os
+import stat
 
 import webob
+import webob.exc
 
 from appathy import exceptions
 
 
+# Results which are sent as-is, rather than being serialized
+RAW_TYPES = (file, io.IOBase, mmap.mmap, buffer, bytearray, memoryview)
+
+# Raw results held in memory
+_BUFFER_TYPES = (buffer, bytearray, memoryview)
+
+
+def _is_raw(result):
+    """
+    Determine if a result is a raw result.  Text streams, such as
+    ``io.StringIO``, are not; their contents are unicode.
+    """
+
+    return (isinstance(result, RAW_TYPES) and
+            not isinstance(result, io.TextIOBase))
+
+
 class ResponseObject(collections.MutableMapping):
     """
     Represent a response object.
+
+    Results which are binary files, mmap objects, or in-memory buffers
+    (buffer, bytearray, or memoryview objects) are "raw" results: they
+    are sent without content negotiation or serialization, with the
+    content type given by the `raw_content_type` attribute unless the
+    Content-Type header has been set.  Files and mmap objects are
+    sent from their current position through the WSGI server's
+    `wsgi.file_wrapper`, if it provides one, allowing the server to
+    use sendfile(); buffers are sent in slices of `raw_block_size`
+    bytes.
+
+    Responses to GET and HEAD requests with a 200 status code honor
+    the Range and If-Range headers if the result is a raw result of
+    known length or is serialized to a string, sending only the
+    requested bytes with a 206 status code.  Unsatisfiable ranges are
+    rejected with a 416 status code.  Files are read starting at the
+    beginning of the range, rather than reading and discarding the
+    bytes before it.
     """
 
     response_class = webob.Response
+    raw_content_type = 'application/octet-stream'
+    raw_block_size = 64 * 1024
 
     def __init__(self, req, result=None, code=None, headers=None, **kwargs):
         """
@@ -56,6 +98,7 @@ class ResponseObject(collections.MutableMapping):
         self.content_type = None
         self.type_name = None
         self.serializer = None
+        self._descriptor = None
 
         # If a method was specified, bind it; this prepares for
         # serialization and updates the default code
@@ -129,13 +172,21 @@ class ResponseObject(collections.MutableMapping):
         # If the method has a default code, use it
         self._defcode = getattr(_descriptor.method, '_wsgi_code', 200)
 
-        # Set up content type and serializer
-        self.content_type, self.serializer = _descriptor.serializer(self.req)
+        # Set up content type and serializer; raw results don't need
+        # them, unless the result is replaced later
+        self._descriptor = _descriptor
+        if not _is_raw(self.result):
+            self.content_type, self.serializer = _descriptor.serializer(
+                self.req)
 
     def _serialize(self):
         """
         Serialize the ResponseObject.  Returns a webob `Response`
-        object.
+        object.  If the serializer returns a string, it becomes the
+        body of the response; otherwise, the serializer must return
+        an iterable of strings, which will be streamed to the client.
+        The Content-Length header is only set for streamed responses
+        if the serializer returns a list or tuple.
         """
 
         # Do something appropriate if the response object is unbound
@@ -147,13 +198,122 @@ class ResponseObject(collections.MutableMapping):
                                    headerlist=self._headers.items())
 
         # Do we have a body?
-        if self.result:
+        if _is_raw(self.result):
+            self._send_raw(resp)
+        elif self.result:
+            # Negotiate now if the result used to be raw
+            if self.serializer is None and self._descriptor is not None:
+                self.content_type, self.serializer = \
+                    self._descriptor.serializer(self.req)
+
             resp.content_type = self.content_type
-            resp.body = self.serializer(self.result)
+            body = self.serializer(self.result)
+
+            if isinstance(body, basestring):
+                # Send only the requested range, if any
+                resp.accept_ranges = 'bytes'
+                byte_range = self._byte_range(resp, len(body))
+                if byte_range is not None:
+                    body = body[byte_range[0]:byte_range[1]]
+                resp.body = body
+            else:
+                # Stream the chunks; we only know the length if we
+                # have all the chunks already
+                resp.app_iter = body
+                if isinstance(body, (list, tuple)):
+                    resp.content_length = sum(len(chunk) for chunk in body)
 
         # Return the response
         return resp
 
+    def _send_raw(self, resp):
+        """
+        Set up the webob `Response` object to send a raw result.
+        """
+
+        result = self.result
+        if 'content-type' not in self._headers:
+            # Raw results are bytes, so they have no charset
+            resp.content_type = self.raw_content_type
+            resp.charset = None
+
+        if isinstance(result, _BUFFER_TYPES):
+            view = result if isinstance(result, memoryview) else \
+                memoryview(result)
+
+            # Ranges are in bytes, so only apply to views of bytes
+            if view.itemsize == 1:
+                resp.accept_ranges = 'bytes'
+                byte_range = self._byte_range(resp, len(view))
+                if byte_range is not None:
+                    view = view[byte_range[0]:byte_range[1]]
+
+            # Send slices of the buffer, rather than copying it all
+            resp.app_iter = _iter_buffer(view, self.raw_block_size)
+            resp.content_length = len(view) * view.itemsize
+            return
+
+        # Determine how much of the file to send
+        length = _remaining(result)
+        byte_range = None
+        if length is not None:
+            resp.accept_ranges = 'bytes'
+            try:
+                byte_range = self._byte_range(resp, length)
+            except webob.exc.HTTPRequestRangeNotSatisfiable:
+                # The file won't be sent, so nothing else will close it
+                result.close()
+                raise
+            if byte_range is not None:
+                # Skip directly to the start of the range
+                start, stop = byte_range
+                result.seek(result.tell() + start)
+                if stop < length:
+                    length = stop - start
+                    resp.app_iter = _FileSlice(result, length,
+                                               self.raw_block_size)
+                    resp.content_length = length
+                    return
+                length -= start
+
+        # Let the server send files and mmaps, if it can
+        file_wrapper = self.req.environ.get('wsgi.file_wrapper')
+        if file_wrapper is not None:
+            resp.app_iter = file_wrapper(result, self.raw_block_size)
+        else:
+            resp.app_iter = _FileSlice(result, None, self.raw_block_size)
+        if length is not None:
+            resp.content_length = length
+
+    def _byte_range(self, resp, length):
+        """
+        Determine the range of bytes to send from a body of the given
+        length, using the Range and If-Range headers of the request.
+        Returns None if the whole body should be sent; otherwise,
+        updates the status and Content-Range header of the webob
+        `Response` object `resp` and returns a tuple of the start and
+        stop offsets.  Raises `webob.exc.HTTPRequestRangeNotSatisfiable`
+        if the range cannot be satisfied.
+        """
+
+        req = self.req
+        if (req.range is None or self.code != 200 or
+                req.method not in ('GET', 'HEAD')):
+            return None
+
+        # If-Range must match the response's ETag or Last-Modified
+        if resp not in req.if_range:
+            return None
+
+        content_range = req.range.content_range(length)
+        if content_range is None:
+            raise webob.exc.HTTPRequestRangeNotSatisfiable(
+                headers={'Content-Range': 'bytes */%d' % length})
+
+        resp.status = 206
+        resp.content_range = content_range
+        return content_range.start, content_range.stop
+
     @property
     def code(self):
         """
@@ -193,3 +353,75 @@ class ResponseObject(collections.MutableMapping):
         """
 
         return self._headers.copy()
+
+
+def _iter_buffer(value, block_size):
+    """
+    Iterate over slices of a memoryview, as strings.
+    """
+
+    for start in xrange(0, len(value), block_size):
+        yield value[start:start + block_size].tobytes()
+
+
+def _remaining(fileobj):
+    """
+    Determine the number of bytes remaining to be read from a file or
+    mmap object.  Returns None if the size cannot be determined, e.g.,
+    for a pipe.
+    """
+
+    try:
+        if isinstance(fileobj, mmap.mmap):
+            return len(fileobj) - fileobj.tell()
+
+        info = os.fstat(fileobj.fileno())
+        if not stat.S_ISREG(info.st_mode):
+            return None
+        return max(info.st_size - fileobj.tell(), 0)
+    except (AttributeError, EnvironmentError, ValueError):
+        return None
+
+
+class _FileSlice(object):
+    """
+    An iterable which reads a file or mmap object, from its current
+    position, in blocks.  Only the given number of bytes are read,
+    unless `length` is None, in which case the file is read to the
+    end.  The file is closed by close().
+    """
+
+    def __init__(self, fileobj, length, block_size):
+        """
+        Initialize a _FileSlice.
+        """
+
+        self.fileobj = fileobj
+        self.length = length
+        self.block_size = block_size
+
+    def __iter__(self):
+        """
+        Iterate over the blocks of the file.
+        """
+
+        remaining = self.length
+        block_size = self.block_size
+        while remaining is None or remaining > 0:
+            if remaining is not None:
+                block_size = min(block_size, remaining)
+
+            data = self.fileobj.read(block_size)
+            if not data:
+                break
+
+            if remaining is not None:
+                remaining -= len(data)
+            yield data
+
+    def close(self):
+        """
+        Close the file.
+        """
+
+        self.fileobj.close()
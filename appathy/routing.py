@@ -0,0 +1,513 @@
+# Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+import re
+
+from appathy import utils
+
+
+# Regular expression to identify variables in a route path.  Matches
+# the Routes forms "{name}", "{name:regex}", ":name", and "*name".
+_var_re = re.compile(r'\{(\w+)(?::((?:[^{}]|\{[^{}]*\})+))?\}'
+                     r'|([:*])([a-zA-Z_]\w*)')
+
+
+def _is_complex(match):
+    """
+    Determine if a variable matched by `_var_re` may match across path
+    segments.  Variables with an explicit regular expression and
+    "*name" wildcards are considered complex.
+    """
+
+    return bool(match.group(2)) or match.group(3) == '*'
+
+
+def _template_regex(template):
+    """
+    Convert a Routes-compatible path template into a compiled regular
+    expression which matches the entire template.  Variables become
+    named groups.  Variables without a regular expression get the same
+    non-greedy default as with ``routes.Mapper``, so that a variable
+    followed by a separator, as in "{name}.{fmt}", stops at the first
+    separator.
+    """
+
+    parts = []
+    pos = 0
+    for match in _var_re.finditer(template):
+        # Add the static text preceding the variable
+        parts.append(re.escape(template[pos:match.start()]))
+        pos = match.end()
+
+        # Determine the name and pattern for the variable
+        if match.group(1):
+            name = match.group(1)
+            regex = match.group(2) or '[^/]+?'
+        else:
+            name = match.group(4)
+            regex = '.+?' if match.group(3) == '*' else '[^/]+?'
+
+        parts.append('(?P<%s>%s)' % (name, regex))
+
+    # Add the trailing static text
+    parts.append(re.escape(template[pos:]))
+
+    return re.compile('^%s$' % ''.join(parts))
+
+
+class Route(object):
+    """
+    Describes a single route known to a Router.  Exposes the same
+    basic attributes as a ``routes.route.Route``, so that it may be
+    used in the ``routes.route`` environment key.
+
+    Routes are prioritized the same way ``routes.Mapper`` prioritizes
+    them: routes with a longer static prefix are preferred, and
+    routes with the same static prefix are tried in the order in
+    which they were connected.
+    """
+
+    # Routes that redirect are not supported
+    redirect = False
+
+    def __init__(self, index, name, routepath, conditions, defaults):
+        """
+        Initialize a Route.  The `index` is the order in which the
+        route was connected to the router, and is used to select
+        between routes which match the same path.
+        """
+
+        self.index = index
+        self.name = name
+        self.routepath = routepath
+        self.conditions = conditions or {}
+        self.defaults = defaults
+
+        # Compute the route priority from the static prefix
+        match = _var_re.search(routepath)
+        prefix = routepath[:match.start()] if match else routepath
+        self.priority = (-len(prefix.rstrip('/')), index)
+
+        # Cache the individual conditions
+        self.methods = self.conditions.get('method')
+        self.function = self.conditions.get('function')
+
+    def check(self, environ, values):
+        """
+        Check the route conditions against the request environment
+        and the values extracted from the path.  Returns the match
+        dictionary if the route matches, or None otherwise.
+        """
+
+        # Check the request method first; it's cheapest
+        if (self.methods and environ and
+                environ['REQUEST_METHOD'] not in self.methods):
+            return None
+
+        # Build the match dictionary; extracted values are converted
+        # to unicode, as Routes does
+        result = self.defaults.copy()
+        for key, value in values:
+            try:
+                result[key] = value.decode('utf-8')
+            except UnicodeDecodeError:
+                return None
+
+        # Finally, call the condition function
+        if self.function and not self.function(environ, result):
+            return None
+
+        return result
+
+
+class _Node(object):
+    """
+    A node in the routing trie.  Each node corresponds to one path
+    segment.
+    """
+
+    def __init__(self):
+        """
+        Initialize a trie node.
+        """
+
+        # Children keyed by static segment text
+        self.static = {}
+
+        # Children for segments containing variables, as a list of
+        # (template, name, regex, node) tuples.  The regex is None if
+        # the segment consists of a single simple variable.
+        self.dynamic = []
+
+        # Routes which consume the rest of the path with a regular
+        # expression, as a list of (regex, route) tuples
+        self.tails = []
+
+        # Routes which terminate at this node
+        self.routes = []
+
+    def child(self, segment):
+        """
+        Retrieve or create the child node for the given segment
+        template.
+        """
+
+        # Static segments are simple
+        if not _var_re.search(segment):
+            return self.static.setdefault(segment, _Node())
+
+        # Look for an existing dynamic child
+        for template, _name, _regex, node in self.dynamic:
+            if template == segment:
+                return node
+
+        # Determine if it's a simple variable; these can avoid the
+        # regular expression match entirely
+        match = _var_re.match(segment)
+        if match and match.end() == len(segment):
+            name = match.group(1) or match.group(4)
+            regex = None
+        else:
+            name = None
+            regex = _template_regex(segment)
+
+        node = _Node()
+        self.dynamic.append((segment, name, regex, node))
+        return node
+
+
+class Router(object):
+    """
+    A router which organizes routes into a trie keyed by path
+    segment.  Matching a request walks the trie, so the cost is
+    proportional to the length of the path, rather than the number of
+    routes.  Provides the subset of the ``routes.Mapper`` interface
+    used by Appathy, so it may be used in place of the mapper.
+
+    Where more than one route matches a path, the route with the
+    longest static prefix wins; among those, the route connected
+    first wins, just as with ``routes.Mapper``.
+    """
+
+    def __init__(self):
+        """
+        Initialize a Router.
+        """
+
+        self.root = _Node()
+        self.matchlist = []
+
+    def connect(self, name, path, **kwargs):
+        """
+        Connect a route.  The `conditions` keyword argument may
+        specify a list of HTTP methods (as the "method" key) and a
+        function (as the "function" key) which must also match.  All
+        other keyword arguments become defaults in the match
+        dictionary.
+        """
+
+        conditions = kwargs.pop('conditions', None)
+        route = Route(len(self.matchlist), name, path, conditions, kwargs)
+        self.matchlist.append(route)
+
+        # Split off the part of the path which may span segments
+        segments = path[1:].split('/')
+        tail = None
+        for match in _var_re.finditer(path):
+            if _is_complex(match):
+                cut = path.rfind('/', 0, match.start())
+                segments = path[1:cut].split('/') if cut > 0 else []
+                tail = path[cut + 1:]
+                break
+
+        # Walk down the trie, creating nodes as needed
+        node = self.root
+        for segment in segments:
+            node = node.child(segment)
+
+        # Add the route to the final node
+        if tail is None:
+            node.routes.append(route)
+        else:
+            node.tails.append((_template_regex(tail), route))
+
+        return route
+
+    def _walk(self, node, segments, idx, values, found):
+        """
+        Walk the trie, collecting all routes which match the path
+        described by `segments`.  Each match is added to the `found`
+        list as a tuple of the route and the extracted values.
+        """
+
+        if idx == len(segments):
+            # End of the path; all routes terminating here match
+            for route in node.routes:
+                found.append((route, values))
+            return
+
+        segment = segments[idx]
+
+        # Try the static child first
+        child = node.static.get(segment)
+        if child is not None:
+            self._walk(child, segments, idx + 1, values, found)
+
+        # Now try the dynamic children
+        for _template, name, regex, child in node.dynamic:
+            if regex is None:
+                if segment:
+                    self._walk(child, segments, idx + 1,
+                               values + ((name, segment),), found)
+            else:
+                match = regex.match(segment)
+                if match:
+                    self._walk(child, segments, idx + 1,
+                               values + tuple(match.groupdict().items()),
+                               found)
+
+        # Finally, try the routes consuming the rest of the path
+        if node.tails:
+            rest = '/'.join(segments[idx:])
+            for regex, route in node.tails:
+                match = regex.match(rest)
+                if match:
+                    found.append((route,
+                                  values + tuple(match.groupdict().items())))
+
+    def routematch(self, url=None, environ=None):
+        """
+        Match a URL against the routes.  If `url` is not given, the
+        ``PATH_INFO`` key of `environ` is used.  Returns None if no
+        route matches; otherwise, returns a tuple of the match
+        dictionary and the matching route.
+        """
+
+        if url is None:
+            url = environ['PATH_INFO']
+
+        # Only absolute paths can match
+        if not url.startswith('/'):
+            return None
+
+        # Collect the candidate routes
+        found = []
+        self._walk(self.root, url[1:].split('/'), 0, (), found)
+
+        # Select the highest priority route that satisfies its
+        # conditions
+        found.sort(key=lambda x: x[0].priority)
+        for route, values in found:
+            result = route.check(environ, values)
+            if result is not None:
+                return result, route
+
+        return None
+
+    def match(self, url=None, environ=None):
+        """
+        Match a URL against the routes.  Returns the match dictionary,
+        or None if no route matches.
+        """
+
+        result = self.routematch(url, environ)
+        return result[0] if result else None
+
+
+class StaticMapper(object):
+    """
+    Wraps a mapper--either a ``routes.Mapper`` or a Router--and keeps
+    a dictionary of the routes which contain no variables, keyed by
+    path.  Such routes are matched with a simple dictionary lookup,
+    avoiding the wrapped mapper entirely; all other requests are
+    passed on to the wrapped mapper.
+
+    A route is only entered into the dictionary if no previously
+    connected route which could also match its path (such as a route
+    with variables or a route with a condition function) would take
+    precedence over it.
+    """
+
+    def __init__(self, mapper):
+        """
+        Initialize a StaticMapper wrapping the given `mapper`.
+        """
+
+        self.mapper = mapper
+
+        # Maps a path to a list of (methods, defaults, route) tuples
+        self.static = {}
+
+        # A list of (regex, methods) tuples for the routes handled by
+        # the wrapped mapper
+        self.dynamic = []
+
+    def __getattr__(self, attr):
+        """
+        Allow access to the attributes of the wrapped mapper.
+        """
+
+        return getattr(self.mapper, attr)
+
+    def _shadowed(self, path, methods):
+        """
+        Determine if a route with the given path and list of methods
+        could be matched by a previously connected route handled by
+        the wrapped mapper.
+        """
+
+        for regex, route_methods in self.dynamic:
+            # Routes for different methods can't collide
+            if (methods and route_methods and
+                    not set(methods) & set(route_methods)):
+                continue
+
+            if regex.match(path):
+                return True
+
+        return False
+
+    def connect(self, name, path, **kwargs):
+        """
+        Connect a route.  The route is always connected to the wrapped
+        mapper; if it contains no variables or condition functions, it
+        is also added to the static route dictionary.
+        """
+
+        self.mapper.connect(name, path, **kwargs)
+        route = self.mapper.matchlist[-1]
+
+        # Figure out what the route matches on
+        conditions = dict(kwargs.get('conditions') or {})
+        methods = conditions.pop('method', None)
+
+        if (_var_re.search(path) or conditions or
+                self._shadowed(path, methods)):
+            # Keep track of it so we can detect shadowing
+            self.dynamic.append((_template_regex(path), methods))
+            return
+
+        # Compute the match dictionary defaults
+        defaults = kwargs.copy()
+        defaults.pop('conditions', None)
+
+        self.static.setdefault(path, []).append((methods, defaults, route))
+
+    def routematch(self, url=None, environ=None):
+        """
+        Match a URL against the routes.  If `url` is not given, the
+        ``PATH_INFO`` key of `environ` is used.  Returns None if no
+        route matches; otherwise, returns a tuple of the match
+        dictionary and the matching route.
+        """
+
+        if url is None:
+            url = environ['PATH_INFO']
+
+        # Look for a static route first
+        for methods, defaults, route in self.static.get(url, ()):
+            if (not methods or not environ or
+                    environ['REQUEST_METHOD'] in methods):
+                return defaults.copy(), route
+
+        return self.mapper.routematch(url, environ)
+
+    def match(self, url=None, environ=None):
+        """
+        Match a URL against the routes.  Returns the match dictionary,
+        or None if no route matches.
+        """
+
+        result = self.routematch(url, environ)
+        return result[0] if result else None
+
+
+class CachingMapper(object):
+    """
+    Wraps a mapper--either a ``routes.Mapper`` or a Router--and
+    caches the results of matching, keyed by request method and path.
+    The cache is bounded, discarding the least recently used results.
+
+    Paths which could be matched by a route with a condition function
+    are never cached, since the function may consider more of the
+    request than the path and method.
+    """
+
+    def __init__(self, mapper, size):
+        """
+        Initialize a CachingMapper wrapping the given `mapper`, and
+        caching at most `size` results.
+        """
+
+        self.mapper = mapper
+        self.cache = utils.LRUCache(size)
+
+        # Regular expressions for the routes with condition functions
+        self.conditional = []
+
+    def __getattr__(self, attr):
+        """
+        Allow access to the attributes of the wrapped mapper.
+        """
+
+        return getattr(self.mapper, attr)
+
+    def connect(self, name, path, **kwargs):
+        """
+        Connect a route to the wrapped mapper.
+        """
+
+        self.mapper.connect(name, path, **kwargs)
+
+        # Keep track of routes with condition functions
+        if 'function' in (kwargs.get('conditions') or {}):
+            self.conditional.append(_template_regex(path))
+
+    def routematch(self, url=None, environ=None):
+        """
+        Match a URL against the routes.  If `url` is not given, the
+        ``PATH_INFO`` key of `environ` is used.  Returns None if no
+        route matches; otherwise, returns a tuple of the match
+        dictionary and the matching route.
+        """
+
+        if url is None:
+            url = environ['PATH_INFO']
+        key = (environ['REQUEST_METHOD'] if environ else None, url)
+
+        # Check the cache first; note that the match dictionary is
+        # modified by the caller, so we must return a copy
+        result = self.cache.get(key)
+        if result is not None:
+            return result[0].copy(), result[1]
+
+        result = self.mapper.routematch(url, environ)
+
+        # Cache the result, if we can
+        if result and not any(regex.match(url)
+                              for regex in self.conditional):
+            self.cache.set(key, (result[0].copy(), result[1]))
+
+        return result
+
+    def match(self, url=None, environ=None):
+        """
+        Match a URL against the routes.  Returns the match dictionary,
+        or None if no route matches.
+        """
+
+        result = self.routematch(url, environ)
+        return result[0] if result else None
@@ -0,0 +1,670 @@
+# Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+import json
+import struct
+
+from appathy import cbor
+
+
+# The scalar types which may appear in a schema
+SCALARS = (int, long, float, bool, str, unicode, basestring, object)
+
+
+class Record(object):
+    """
+    Describes a dictionary with a fixed set of keys.  Each field is a
+    tuple of the key and the schema of the value; the order of the
+    fields is the order in which they are serialized.
+    """
+
+    def __init__(self, *fields):
+        """
+        Initialize a Record from its fields.
+        """
+
+        self.fields = []
+        for name, spec in fields:
+            self.fields.append((name, _check(spec)))
+
+    def __eq__(self, other):
+        """
+        Compare two Records.
+        """
+
+        return isinstance(other, Record) and self.fields == other.fields
+
+    def __ne__(self, other):
+        """
+        Compare two Records.
+        """
+
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        """
+        Return a representation of the Record.
+        """
+
+        return 'Record(%s)' % ', '.join(repr(f) for f in self.fields)
+
+
+class List(object):
+    """
+    Describes a list or tuple, each item of which has the same
+    schema.
+    """
+
+    def __init__(self, item):
+        """
+        Initialize a List from the schema of its items.
+        """
+
+        self.item = _check(item)
+
+    def __eq__(self, other):
+        """
+        Compare two Lists.
+        """
+
+        return isinstance(other, List) and self.item == other.item
+
+    def __ne__(self, other):
+        """
+        Compare two Lists.
+        """
+
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        """
+        Return a representation of the List.
+        """
+
+        return 'List(%r)' % (self.item,)
+
+
+class Nullable(object):
+    """
+    Describes a value which may also be None.
+    """
+
+    def __init__(self, spec):
+        """
+        Initialize a Nullable from the schema of the non-None value.
+        """
+
+        self.spec = _check(spec)
+
+    def __eq__(self, other):
+        """
+        Compare two Nullables.
+        """
+
+        return isinstance(other, Nullable) and self.spec == other.spec
+
+    def __ne__(self, other):
+        """
+        Compare two Nullables.
+        """
+
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        """
+        Return a representation of the Nullable.
+        """
+
+        return 'Nullable(%r)' % (self.spec,)
+
+
+def _check(spec):
+    """
+    Ensure that `spec` is a valid schema.  Returns the schema.
+    """
+
+    if spec not in SCALARS and not isinstance(spec, (Record, List,
+                                                     Nullable)):
+        raise TypeError('Invalid schema %r' % (spec,))
+
+    return spec
+
+
+def _make_spec(fields):
+    """
+    Build a schema from the arguments of result_schema() or
+    request_schema().
+    """
+
+    if len(fields) == 1 and not isinstance(fields[0], tuple):
+        return _check(fields[0])
+    return Record(*fields)
+
+
+def result_schema(*fields):
+    """
+    Decorator which declares the schema of the results of an action
+    or extension method.  If called with field tuples, as for
+    Record(), the result is a Record with those fields; otherwise,
+    the single argument is the schema, e.g., a List of Records.  The
+    schemas of an action and its extensions are merged when the
+    action is prepared, and serializers which have a compile() method
+    are passed the merged schema; see the JSON serializer.
+
+    Schemas are built from Record, List, and Nullable instances and
+    the scalar types int, long, float, bool, str, unicode,
+    basestring, and object; values described by `object` are
+    serialized generically.
+    """
+
+    spec = _make_spec(fields)
+
+    def decorator(func):
+        func._wsgi_result_schema = spec
+        return func
+    return decorator
+
+
+def request_schema(*fields):
+    """
+    Decorator which declares the schema of the deserialized request
+    body of an action or extension method.  The arguments are as for
+    result_schema().  The schemas of an action and its extensions are
+    merged and compiled into a validator when the action is prepared;
+    a request body which does not match the schema is rejected with a
+    400 error before the extensions or the action are called.
+
+    When validating, a Record must be a dictionary having all of the
+    declared keys and no others, although keys whose schema is a
+    Nullable may be omitted.  Strings may be str or unicode, a float
+    may be any number, and an int may be any integer other than a
+    bool; `object` matches anything.
+    """
+
+    spec = _make_spec(fields)
+
+    def decorator(func):
+        func._wsgi_request_schema = spec
+        return func
+    return decorator
+
+
+def merge(spec, other):
+    """
+    Merge two schemas.  The fields of Records are combined, with the
+    fields of `other` overriding those of `spec` having the same key,
+    and the items of Lists are merged.  Returns None if the schemas
+    cannot be merged.
+    """
+
+    if isinstance(spec, Record) and isinstance(other, Record):
+        names = set(name for name, _spec in other.fields)
+        result = Record()
+        result.fields = ([f for f in spec.fields if f[0] not in names] +
+                         other.fields)
+        return result
+    elif isinstance(spec, List) and isinstance(other, List):
+        item = merge(spec.item, other.item)
+        return None if item is None else List(item)
+    elif spec == other:
+        return spec
+
+    return None
+
+
+def schema_for(methods, attr='_wsgi_result_schema'):
+    """
+    Compute the merged schema for a list of methods--an action method
+    followed by its extensions.  By default, the result schemas are
+    merged; `attr` names the attribute containing the schemas to
+    merge.  Extensions which do not declare a schema are ignored.
+    Returns None if the action does not declare a schema or if the
+    schemas cannot be merged.
+    """
+
+    spec = getattr(methods[0], attr, None)
+    for meth in methods[1:]:
+        if spec is None:
+            break
+
+        other = getattr(meth, attr, None)
+        if other is not None:
+            spec = merge(spec, other)
+
+    return spec
+
+
+class Compiler(object):
+    """
+    Compiles a schema into a specialized encoder function.  The
+    encoder is generated as Python source consisting of a single
+    expression, in which each Record is encoded with one string
+    formatting operation and each List with one join over a list
+    comprehension.  The generated encoders raise an exception if a
+    scalar value is not of the declared type, if a value cannot be
+    encoded, or if a Record has keys beyond those declared, and the
+    caller should then fall back to a generic encoder.  Subclasses
+    provide the expressions for encoding each kind of value.
+    """
+
+    def __init__(self, generic):
+        """
+        Initialize a Compiler.  The `generic` argument is the function
+        used to encode values described by `object`.
+        """
+
+        self.namespace = dict(_generic=generic, _undeclared=_undeclared,
+                              _integers=frozenset([int, long]))
+        self.source = []
+        self.count = 0
+
+    def compile(self, spec):
+        """
+        Compile a schema.  Returns the encoder function.
+        """
+
+        self.source.extend([
+            'def _encode(value):',
+            '    return %s' % self.expr(spec, 'value'),
+        ])
+        exec '\n'.join(self.source) in self.namespace
+        return self.namespace['_encode']
+
+    def expr(self, spec, var):
+        """
+        Return an expression encoding the value named by `var`, which
+        has the given schema.
+        """
+
+        if isinstance(spec, Nullable):
+            return '(%r if %s is None else %s)' % (
+                self.null, var, self.expr(spec.spec, var))
+        elif isinstance(spec, List):
+            # Each comprehension needs its own variable
+            self.count += 1
+            item = '_item%d' % self.count
+            return self.list_expr(self.expr(spec.item, item), item, var)
+        elif isinstance(spec, Record):
+            # Records must not have any undeclared keys
+            template, args = self.record(spec, var)
+            return '(%r %% (%s) if len(%s) == %d else _undeclared())' % (
+                template, ''.join('%s, ' % a for a in args), var,
+                len(spec.fields))
+
+        return self.scalar(spec, var)
+
+
+def _undeclared():
+    """
+    Called by compiled encoders when a Record has keys which were not
+    declared.
+    """
+
+    raise ValueError('Undeclared keys')
+
+
+class JSONCompiler(Compiler):
+    """
+    Compile schemas into JSON encoders.
+    """
+
+    null = 'null'
+
+    # With the C accelerator, the generic encoder handles long lists
+    # faster than a list comprehension can
+    generic_lists = json.encoder.c_make_encoder is not None
+
+    def __init__(self, generic):
+        """
+        Initialize a JSONCompiler.
+        """
+
+        super(JSONCompiler, self).__init__(generic)
+        self.namespace.update(
+            _string=json.encoder.encode_basestring_ascii,
+            _repr=float.__repr__,
+        )
+
+        # Values of the wrong type, and infinities and NaNs, must be
+        # left to the generic encoder
+        self.source.extend([
+            'def _int(value):',
+            '    if type(value) not in _integers:',
+            '        raise TypeError("Not an integer")',
+            "    return '%d' % value",
+            '',
+            'def _bool(value):',
+            '    if value is True:',
+            "        return 'true'",
+            '    elif value is False:',
+            "        return 'false'",
+            '    raise TypeError("Not a boolean")',
+            '',
+            'def _float(value):',
+            '    result = _repr(value)',
+            "    if result[-1] in 'fn':",
+            '        raise ValueError("Non-finite float")',
+            '    return result',
+            '',
+        ])
+
+    def scalar(self, spec, var):
+        """
+        Return an expression encoding a scalar.
+        """
+
+        if spec in (int, long):
+            return '_int(%s)' % var
+        elif spec is float:
+            return '_float(%s)' % var
+        elif spec is bool:
+            return '_bool(%s)' % var
+        elif spec in (str, unicode, basestring):
+            return '_string(%s)' % var
+        return '_generic(%s)' % var
+
+    def compile(self, spec):
+        """
+        Compile a schema.  Returns the encoder function, which is the
+        generic encoder for a List if `generic_lists` is set.
+        """
+
+        if self.generic_lists and isinstance(spec, List):
+            return self.namespace['_generic']
+
+        return super(JSONCompiler, self).compile(spec)
+
+    def list_expr(self, item_expr, item, var):
+        """
+        Return an expression encoding the list named by `var`, given
+        the expression encoding each `item`.
+        """
+
+        return "'[' + ','.join([%s for %s in %s]) + ']'" % (
+            item_expr, item, var)
+
+    def record(self, spec, var):
+        """
+        Return the template and argument expressions to encode the
+        Record named by `var`.
+        """
+
+        template = []
+        args = []
+        for name, field in spec.fields:
+            key = json.encoder.encode_basestring_ascii(name)
+            template.append('%s:%%s' % key.replace('%', '%%'))
+            args.append(self.expr(field, '%s[%r]' % (var, name)))
+
+        return '{%s}' % ','.join(template), args
+
+
+class CBORCompiler(Compiler):
+    """
+    Compile schemas into CBOR encoders.
+    """
+
+    null = '\xf6'
+
+    def __init__(self, generic):
+        """
+        Initialize a CBORCompiler.
+        """
+
+        super(CBORCompiler, self).__init__(generic)
+        self.namespace.update(
+            _header=cbor.header,
+            _pack_float=struct.Struct('>d').pack,
+            _utf8=cbor._utf8_encode,
+            _utf8_decode=cbor._utf8_decode,
+        )
+
+        # Values of the wrong type, and byte strings which aren't
+        # UTF-8, must be left to the generic encoder
+        self.source.extend([
+            'def _int(value):',
+            '    if type(value) not in _integers:',
+            '        raise TypeError("Not an integer")',
+            '    elif value < 0:',
+            '        return _header(1, -1 - value)',
+            '    return _header(0, value)',
+            '',
+            'def _float(value):',
+            '    if type(value) is not float:',
+            '        raise TypeError("Not a float")',
+            "    return '\\xfb' + _pack_float(value)",
+            '',
+            'def _bool(value):',
+            '    if value is True:',
+            "        return '\\xf5'",
+            '    elif value is False:',
+            "        return '\\xf4'",
+            '    raise TypeError("Not a boolean")',
+            '',
+            'def _text(value):',
+            '    if type(value) is unicode:',
+            '        value = _utf8(value)[0]',
+            '    else:',
+            "        _utf8_decode(value, 'strict', True)",
+            '    return _header(3, len(value)) + value',
+            '',
+        ])
+
+    def scalar(self, spec, var):
+        """
+        Return an expression encoding a scalar.
+        """
+
+        if spec in (int, long):
+            return '_int(%s)' % var
+        elif spec is float:
+            return '_float(%s)' % var
+        elif spec is bool:
+            return '_bool(%s)' % var
+        elif spec in (str, unicode, basestring):
+            return '_text(%s)' % var
+        return '_generic(%s)' % var
+
+    def list_expr(self, item_expr, item, var):
+        """
+        Return an expression encoding the list named by `var`, given
+        the expression encoding each `item`.
+        """
+
+        return "_header(4, len(%s)) + ''.join([%s for %s in %s])" % (
+            var, item_expr, item, var)
+
+    def record(self, spec, var):
+        """
+        Return the template and argument expressions to encode the
+        Record named by `var`.
+        """
+
+        template = [cbor.header(5, len(spec.fields))]
+        args = []
+        for name, field in spec.fields:
+            template.append(cbor.dumps(name).replace('%', '%%') + '%s')
+            args.append(self.expr(field, '%s[%r]' % (var, name)))
+
+        return ''.join(template), args
+
+
+class ValidatorCompiler(object):
+    """
+    Compiles a schema into a validator function.  The validator is
+    generated as Python source, with the checks for each Record and
+    List unrolled inline; it returns None if the value matches the
+    schema, and raises a ValueError describing the first mismatch
+    otherwise.
+    """
+
+    def __init__(self, root='body'):
+        """
+        Initialize a ValidatorCompiler.  The `root` argument names the
+        value being validated in error messages.
+        """
+
+        self.root = root
+        self.namespace = dict(
+            _integers=frozenset([int, long]),
+            _numbers=frozenset([int, long, float]),
+            _missing=object(),
+            _undeclared=_undeclared_keys,
+        )
+        self.count = 0
+
+    def compile(self, spec):
+        """
+        Compile a schema.  Returns the validator function.
+        """
+
+        source = ['def _validate(value):']
+        source.extend('    %s' % line
+                      for line in self.check(spec, 'value', self.root))
+        source.append('    return None')
+
+        exec '\n'.join(source) in self.namespace
+        return self.namespace['_validate']
+
+    def _var(self):
+        """
+        Allocate a new variable name.
+        """
+
+        self.count += 1
+        return '_v%d' % self.count
+
+    def check(self, spec, var, path):
+        """
+        Return the lines checking that the value named by `var`
+        matches the given schema.  The `path` names the value in
+        error messages.
+        """
+
+        if isinstance(spec, Nullable):
+            lines = self.check(spec.spec, var, path)
+            if not lines:
+                return []
+            return (['if %s is not None:' % var] +
+                    ['    %s' % line for line in lines])
+        elif isinstance(spec, Record):
+            return self.check_record(spec, var, path)
+        elif isinstance(spec, List):
+            return self.check_list(spec, var, path)
+
+        return self.check_scalar(spec, var, path)
+
+    def _fail(self, path, message):
+        """
+        Return the line raising a ValueError for a mismatch.
+        """
+
+        return '    raise ValueError(%r)' % ('%s: %s' % (path, message))
+
+    def check_scalar(self, spec, var, path):
+        """
+        Return the lines checking a scalar value.
+        """
+
+        if spec in (int, long):
+            test, message = ('type(%s) not in _integers' % var,
+                             'expected an integer')
+        elif spec is float:
+            test, message = ('type(%s) not in _numbers' % var,
+                             'expected a number')
+        elif spec is bool:
+            test, message = ('%s is not True and %s is not False' %
+                             (var, var), 'expected a boolean')
+        elif spec in (str, unicode, basestring):
+            test, message = ('not isinstance(%s, basestring)' % var,
+                             'expected a string')
+        else:
+            # Anything matches object
+            return []
+
+        return ['if %s:' % test, self._fail(path, message)]
+
+    def check_list(self, spec, var, path):
+        """
+        Return the lines checking a list.
+        """
+
+        lines = [
+            'if not isinstance(%s, (list, tuple)):' % var,
+            self._fail(path, 'expected an array'),
+        ]
+
+        # Check each item, unless any item is allowed
+        item = self._var()
+        body = self.check(spec.item, item, '%s[]' % path)
+        if body:
+            lines.append('for %s in %s:' % (item, var))
+            lines.extend('    %s' % line for line in body)
+
+        return lines
+
+    def check_record(self, spec, var, path):
+        """
+        Return the lines checking a Record.
+        """
+
+        lines = [
+            'if not isinstance(%s, dict):' % var,
+            self._fail(path, 'expected an object'),
+        ]
+
+        # Count the declared keys which are present, to detect
+        # undeclared keys
+        count = self._var()
+        lines.append('%s = %d' % (count, sum(
+            1 for name, field in spec.fields
+            if not isinstance(field, Nullable))))
+
+        for name, field in spec.fields:
+            item = self._var()
+            item_path = '%s.%s' % (path, name)
+            body = self.check(field, item, item_path)
+            lines.append('%s = %s.get(%r, _missing)' % (item, var, name))
+
+            if isinstance(field, Nullable):
+                # Nullable fields may be omitted
+                lines.append('if %s is not _missing:' % item)
+                lines.append('    %s += 1' % count)
+                lines.extend('    %s' % line for line in body)
+            else:
+                lines.extend([
+                    'if %s is _missing:' % item,
+                    self._fail(item_path, 'required'),
+                ])
+                lines.extend(body)
+
+        lines.extend([
+            'if len(%s) != %s:' % (var, count),
+            '    _undeclared(%r, %s, %r)' % (
+                path, var, tuple(name for name, field in spec.fields)),
+        ])
+
+        return lines
+
+
+def _undeclared_keys(path, value, names):
+    """
+    Called by validators when a Record has keys which were not
+    declared.  Raises a ValueError naming the keys.
+    """
+
+    keys = sorted(repr(key) for key in value if key not in names)
+    raise ValueError('%s: undeclared keys %s' % (path, ', '.join(keys)))
@@ -0,0 +1,319 @@
+# Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""
+A response cache backend which stores entries in a memory-mapped
+file, so that the worker processes of a pre-forking server on the
+same host share a single cache.
+
+The file consists of a header followed by a fixed number of
+fixed-size slots.  The slots are grouped into buckets of `ways`
+slots; a key may only be stored in the bucket selected by its hash,
+and when the bucket is full, the least recently used entry in it is
+evicted.
+
+Writers lock the bucket they modify with an fcntl() record lock (and
+a thread lock, since record locks do not exclude threads of the same
+process).  Readers take no locks: each slot has a sequence number
+which is odd while the slot is being written, and a reader which
+sees the sequence number change while copying the slot retries.
+"""
+
+import contextlib
+import fcntl
+import hashlib
+import marshal
+import mmap
+import os
+import struct
+import threading
+import time
+
+from appathy import cache
+from appathy import exceptions
+
+
+# File header: magic, number of slots, slot size, and ways
+_header = struct.Struct('<8sIII')
+_MAGIC = 'APPSHM01'
+_HEADER_SIZE = 64
+
+# Slot header: sequence number, data length, key hash, expiration
+# time, and last use time
+_slot = struct.Struct('<IIQdd')
+_seq = struct.Struct('<I')
+_used = struct.Struct('<d')
+_USED_OFFSET = 24
+
+
+def _hash(key):
+    """
+    Compute the 64-bit hash of a key.  The hash is never 0, which
+    marks an empty slot.
+    """
+
+    return struct.unpack('<Q', hashlib.md5(key).digest()[:8])[0] or 1
+
+
+class SharedMemoryBackend(cache.Backend):
+    """
+    A Backend which stores entries in the memory-mapped file `path`,
+    which is created if it does not exist.  The file holds `slots`
+    entries of up to `slot_size` bytes each (including the key and
+    the headers), in buckets of `ways` slots.  Entries which are too
+    large are not stored.  Every process opening the file must use
+    the same layout.
+    """
+
+    # Number of times to retry reading a slot which is being written
+    read_retries = 16
+
+    def __init__(self, path, slots=1024, slot_size=64 * 1024, ways=4):
+        """
+        Initialize a SharedMemoryBackend.
+        """
+
+        if slots % ways:
+            raise ValueError('slots must be a multiple of ways')
+        if slot_size <= _slot.size:
+            raise ValueError('slot_size must be larger than %d' %
+                             _slot.size)
+
+        self.path = path
+        self.slots = slots
+        self.slot_size = slot_size
+        self.ways = ways
+        self.buckets = slots // ways
+
+        # These counters are local to the process
+        self.evictions = 0
+        self.oversize = 0
+        self.contention = 0
+        self._lock = threading.Lock()
+
+        # Open the file and initialize it if it's new
+        size = _HEADER_SIZE + slots * slot_size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0600)
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, _HEADER_SIZE, 0)
+            try:
+                self._init_file(size)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, _HEADER_SIZE, 0)
+
+            self._mmap = mmap.mmap(self._fd, size)
+        except Exception:
+            os.close(self._fd)
+            raise
+
+    def _init_file(self, size):
+        """
+        Write the header of a new file, or check the header of an
+        existing one.  Raises IncompatibleCache if the file has a
+        different layout.
+        """
+
+        header = os.read(self._fd, _header.size)
+        if not header:
+            os.ftruncate(self._fd, size)
+            os.write(self._fd, _header.pack(_MAGIC, self.slots,
+                                            self.slot_size, self.ways))
+        elif (header != _header.pack(_MAGIC, self.slots, self.slot_size,
+                                     self.ways) or
+              os.fstat(self._fd).st_size != size):
+            raise exceptions.IncompatibleCache(self.path)
+
+    def close(self):
+        """
+        Unmap and close the file.
+        """
+
+        self._mmap.close()
+        os.close(self._fd)
+
+    def _bucket(self, hashval):
+        """
+        Return the offset and length of the bucket for a hash.
+        """
+
+        length = self.ways * self.slot_size
+        return _HEADER_SIZE + (hashval % self.buckets) * length, length
+
+    @contextlib.contextmanager
+    def _locked(self, start=0, length=0):
+        """
+        Lock a region of the file for writing.  The default region is
+        the entire file.
+        """
+
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, length, start)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, length, start)
+
+    def _write(self, offset, data, hashval, expires, used):
+        """
+        Write a slot, bumping its sequence number around the write so
+        that readers can detect it.  The bucket must be locked.
+        """
+
+        mm = self._mmap
+        seq = _seq.unpack_from(mm, offset)[0]
+        _seq.pack_into(mm, offset, (seq + 1) & 0xffffffff)
+        if data:
+            start = offset + _slot.size
+            mm[start:start + len(data)] = data
+        _slot.pack_into(mm, offset, (seq + 1) & 0xffffffff, len(data),
+                        hashval, expires, used)
+        _seq.pack_into(mm, offset, (seq + 2) & 0xffffffff)
+
+    def _read(self, offset, hashval):
+        """
+        Read the data of a slot, if it holds the given hash.  Returns
+        a tuple of the data and the expiration time, or None.
+        """
+
+        mm = self._mmap
+        for i in range(self.read_retries):
+            seq, length, slot_hash, expires, used = \
+                _slot.unpack_from(mm, offset)
+            if seq & 1:
+                # Being written; let the writer run
+                time.sleep(0)
+                continue
+            elif slot_hash != hashval or not length:
+                return None
+
+            start = offset + _slot.size
+            data = mm[start:start + length]
+            if _seq.unpack_from(mm, offset)[0] == seq:
+                return data, expires
+
+        with self._lock:
+            self.contention += 1
+        return None
+
+    def get(self, key):
+        """
+        Retrieve the entry stored for `key`.  Returns None if the key
+        is not stored.
+        """
+
+        hashval = _hash(key)
+        start, length = self._bucket(hashval)
+        now = time.time()
+
+        for offset in xrange(start, start + length, self.slot_size):
+            result = self._read(offset, hashval)
+            if result is None:
+                continue
+
+            # Make sure it's our key and it hasn't expired
+            data, expires = result
+            slot_key, entry = marshal.loads(data)
+            if slot_key != key or expires <= now:
+                return None
+
+            # Record the use; races with other readers are harmless
+            _used.pack_into(self._mmap, offset + _USED_OFFSET, now)
+            return cache.Entry(*entry)
+
+        return None
+
+    def set(self, key, entry, ttl):
+        """
+        Store `entry` for `key`, for up to `ttl` seconds.  If the
+        bucket is full, the least recently used entry in it is
+        evicted.
+        """
+
+        data = marshal.dumps((key, tuple(entry)))
+        if len(data) > self.slot_size - _slot.size:
+            with self._lock:
+                self.oversize += 1
+            return
+
+        hashval = _hash(key)
+        start, length = self._bucket(hashval)
+        now = time.time()
+
+        with self._locked(start, length):
+            # Select a slot: ours, an empty or expired one, or the
+            # least recently used
+            victim = lru = None
+            for offset in xrange(start, start + length, self.slot_size):
+                seq, slot_len, slot_hash, expires, used = \
+                    _slot.unpack_from(self._mmap, offset)
+                if slot_hash == hashval:
+                    victim, lru = offset, None
+                    break
+                elif not slot_len or expires <= now:
+                    if victim is None or lru is not None:
+                        victim, lru = offset, None
+                elif victim is None or (lru is not None and used < lru):
+                    victim, lru = offset, used
+
+            if lru is not None:
+                self.evictions += 1
+
+            self._write(victim, data, hashval, now + ttl, now)
+
+    def delete(self, key):
+        """
+        Remove the entry stored for `key`, if any.
+        """
+
+        hashval = _hash(key)
+        start, length = self._bucket(hashval)
+
+        with self._locked(start, length):
+            for offset in xrange(start, start + length, self.slot_size):
+                if _slot.unpack_from(self._mmap, offset)[2] == hashval:
+                    self._write(offset, '', 0, 0.0, 0.0)
+
+    def clear(self):
+        """
+        Remove all entries.
+        """
+
+        with self._locked():
+            for offset in xrange(_HEADER_SIZE, _HEADER_SIZE +
+                                 self.slots * self.slot_size,
+                                 self.slot_size):
+                if _slot.unpack_from(self._mmap, offset)[1]:
+                    self._write(offset, '', 0, 0.0, 0.0)
+
+    def stats(self):
+        """
+        Return the number of slots and unexpired entries, along with
+        the eviction, oversize entry, and read contention counts of
+        this process.
+        """
+
+        now = time.time()
+        length = 0
+        for offset in xrange(_HEADER_SIZE, _HEADER_SIZE +
+                             self.slots * self.slot_size, self.slot_size):
+            seq, slot_len, slot_hash, expires, used = \
+                _slot.unpack_from(self._mmap, offset)
+            if slot_len and expires > now:
+                length += 1
+
+        return dict(size=self.slots, length=length,
+                    evictions=self.evictions, oversize=self.oversize,
+                    contention=self.contention)
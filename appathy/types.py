@@ -14,8 +14,31 @@
 # along with this program.  If not, see
 # <http://www.gnu.org/licenses/>.
 
+import collections
 import functools
 import inspect
+import itertools
+
+import webob.exc
+
+from appathy import cbor
+from appathy import schema
+
+# Select the fastest JSON implementation available.  Without ujson,
+# the standard library's (C-accelerated) encoder is at least as fast
+# as simplejson's, but simplejson's decoder is much faster
+try:
+    import ujson
+    json_dumps = ujson.dumps
+    json_loads = ujson.loads
+except ImportError:
+    import json
+    json_dumps = json.dumps
+    try:
+        import simplejson
+        json_loads = simplejson.loads
+    except ImportError:
+        json_loads = json.loads
 
 
 class Translators(object):
@@ -40,6 +63,9 @@ class Translators(object):
     def __call__(self, content_type):
         """
         Select the translator corresponding to the given content type.
+        If the translator is a function with the `reusable` or
+        `streaming` attributes set to True, the returned partial will
+        have the same attributes.
         """
 
         # Get the type name
@@ -52,8 +78,13 @@ class Translators(object):
         if inspect.isclass(xlator):
             return xlator(type_name, content_type)
 
-        # It's a function; partialize and return it
-        return functools.partial(xlator, type_name, content_type)
+        # It's a function; partialize it, preserving its flags
+        partial = functools.partial(xlator, type_name, content_type)
+        for flag in ('reusable', 'streaming'):
+            if getattr(xlator, flag, False):
+                setattr(partial, flag, True)
+
+        return partial
 
     def get_types(self):
         """
@@ -100,13 +131,20 @@ def serializers(**kwargs):
     If the callable is a class, it will be instantiated with two
     arguments: the short type name and the content type.  It must
     define a __call__() method taking one argument: the object to
-    serialize.  The class may also define an optional attach() method,
-    which allows serializers for extensions to be attached to the
-    primary serializer.
+    serialize, which may be a generator returned by the action.  The
+    serializer may return the serialized object as a string, or as an
+    iterable of strings, which will be streamed to the client without
+    joining them.  The class may also define an optional attach()
+    method, which allows serializers for extensions to be attached to
+    the primary serializer.  If instances of the class are thread-safe
+    and may be used for more than one response, the class should set
+    the `reusable` attribute to True; a single instance, with all
+    extension serializers attached, will then be used for each
+    action and content type.
 
     If the callable is a function, it will be called with three
     arguments: the short type name, the content type, and the object
-    to serialize.
+    to serialize.  Functions may also set the `reusable` attribute.
     """
 
     return _translators('_wsgi_serializers', kwargs)
@@ -124,11 +162,23 @@ def deserializers(**kwargs):
     define a __call__() method taking one argument: the string to
     deserialize.  The class may also define an optional attach()
     method, which allows deserializers for extensions to be attached
-    to the primary deserializer.
+    to the primary deserializer.  If instances of the class are
+    thread-safe and may be used for more than one request, the class
+    should set the `reusable` attribute to True; a single instance,
+    with all extension deserializers attached, will then be used for
+    each action and content type.
+
+    A deserializer class which sets the `streaming` attribute to True
+    will be passed a file-like object from which the request body may
+    be read incrementally, rather than the body as a string.  The
+    file is bounded by the Content-Length of the request, if it has
+    one; otherwise, it is the raw input stream, which the server is
+    responsible for de-chunking.
 
     If the callable is a function, it will be called with three
     arguments: the short type name, the content type, and the string
-    to deserialize.
+    (or file, if streaming) to deserialize.  Functions may also set
+    the `reusable` and `streaming` attributes.
     """
 
     return _translators('_wsgi_deserializers', kwargs)
@@ -152,3 +202,228 @@ def register_types(name, *types):
         # Save the mapping
         media_types[t] = name
         type_names[name].add(t)
+
+
+class TransformTranslator(object):
+    """
+    Base class for translators which support transforms.  Instances
+    are reusable.  Translators for extensions may be attached; those
+    which have a transform() method will be called, in the order they
+    were attached, to transform the object after the transform() method
+    of this translator.
+    """
+
+    reusable = True
+
+    def __init__(self, type_name, content_type):
+        """
+        Initialize a translator.
+        """
+
+        self.type_name = type_name
+        self.content_type = content_type
+        self.transforms = [self.transform]
+
+    def attach(self, xlator):
+        """
+        Attach the translator for an extension.  Only translators
+        with a transform() method are of interest.
+        """
+
+        if hasattr(xlator, 'transform'):
+            self.transforms.append(xlator.transform)
+
+    def transform(self, obj):
+        """
+        Transform an object.  For serializers, this is called before
+        encoding the object; for deserializers, it is called after
+        decoding the object.  Subclasses may override this method;
+        the default returns the object unchanged.
+        """
+
+        return obj
+
+    def _transform(self, obj):
+        """
+        Apply all the transforms to the object.
+        """
+
+        for transform in self.transforms:
+            obj = transform(obj)
+
+        return obj
+
+
+class StreamingSerializer(TransformTranslator):
+    """
+    Base class for serializers which stream large results.  Iterators
+    (such as generators) are always encoded incrementally, as are
+    lists and tuples containing more than `stream_threshold` items;
+    the result is then returned as an iterator of chunks, each of
+    which encodes up to `chunk_items` items of the sequence.
+    Subclasses must provide the encode() and _iterencode() methods.
+
+    If the result schema of the action is declared, it is passed to
+    compile(), which uses the `compiler` class to generate an encoder
+    specialized for that schema.  The specialized encoder is used for
+    results which are not streamed; if the result does not match the
+    schema, the generic encoder is used.
+    """
+
+    stream_threshold = 1000
+    chunk_items = 100
+    compiler = None
+    compiled = None
+
+    def compile(self, spec):
+        """
+        Compile a specialized encoder for results having the schema
+        `spec`.
+        """
+
+        if self.compiler is not None:
+            self.compiled = self.compiler(self.encode).compile(spec)
+
+    def __call__(self, obj):
+        """
+        Serialize an object.
+        """
+
+        obj = self._transform(obj)
+
+        # Stream large lists and iterators; dictionaries are by far
+        # the most common, so check for them first
+        if isinstance(obj, dict):
+            pass
+        elif isinstance(obj, (list, tuple)):
+            if len(obj) > self.stream_threshold:
+                return self._iterencode(obj)
+        elif isinstance(obj, collections.Iterator):
+            return self._iterencode(obj)
+
+        # Use the specialized encoder, if we have one
+        if self.compiled is not None:
+            try:
+                return self.compiled(obj)
+            except Exception:
+                # The result doesn't match the schema
+                pass
+
+        return self.encode(obj)
+
+    def _chunks(self, items):
+        """
+        Split a sequence of items into lists of at most `chunk_items`
+        items.
+        """
+
+        items = iter(items)
+        while True:
+            chunk = list(itertools.islice(items, self.chunk_items))
+            if not chunk:
+                break
+            yield chunk
+
+
+class JSONSerializer(StreamingSerializer):
+    """
+    Serialize objects to JSON.
+    """
+
+    encode = staticmethod(json_dumps)
+    compiler = schema.JSONCompiler
+
+    def _iterencode(self, items):
+        """
+        Encode a sequence of items as a JSON array, one chunk at a
+        time.
+        """
+
+        yield '['
+
+        sep = ''
+        for chunk in self._chunks(items):
+            # Encode the chunk as a list, then strip the brackets
+            yield sep + json_dumps(chunk)[1:-1]
+            sep = ','
+
+        yield ']'
+
+
+class JSONDeserializer(TransformTranslator):
+    """
+    Deserialize JSON request bodies.
+    """
+
+    def __call__(self, body):
+        """
+        Deserialize a request body.  Raises
+        `webob.exc.HTTPBadRequest` if the body is not valid JSON.
+        """
+
+        try:
+            value = json_loads(body)
+        except ValueError:
+            raise webob.exc.HTTPBadRequest(detail='Invalid JSON body')
+
+        return self._transform(value)
+
+
+class CBORSerializer(StreamingSerializer):
+    """
+    Serialize objects to CBOR.  Streamed lists and tuples are encoded
+    as definite-length arrays; other iterators are encoded as
+    indefinite-length arrays.
+    """
+
+    encode = staticmethod(cbor.dumps)
+    compiler = schema.CBORCompiler
+
+    def _iterencode(self, items):
+        """
+        Encode a sequence of items as a CBOR array, one chunk at a
+        time.
+        """
+
+        if isinstance(items, (list, tuple)):
+            yield cbor.header(4, len(items))
+            end = ''
+        else:
+            yield cbor.INDEFINITE_ARRAY
+            end = cbor.BREAK
+
+        for chunk in self._chunks(items):
+            yield ''.join(cbor.dumps(item) for item in chunk)
+
+        if end:
+            yield end
+
+
+class CBORDeserializer(TransformTranslator):
+    """
+    Deserialize CBOR request bodies.
+    """
+
+    def __call__(self, body):
+        """
+        Deserialize a request body.  Raises
+        `webob.exc.HTTPBadRequest` if the body is not valid CBOR.
+        """
+
+        try:
+            value = cbor.loads(body)
+        except (ValueError, RuntimeError):
+            # RuntimeError is raised if the recursion limit is hit
+            raise webob.exc.HTTPBadRequest(detail='Invalid CBOR body')
+
+        return self._transform(value)
+
+
+# The translators every Controller has by default
+default_serializers = dict(json=JSONSerializer)
+default_deserializers = dict(json=JSONDeserializer)
+
+
+# Register the default types
+register_types('json', 'application/json')
+register_types('cbor', 'application/cbor')
@@ -14,8 +14,10 @@
 # along with this program.  If not, see
 # <http://www.gnu.org/licenses/>.
 
+import collections
 import re
 import sys
+import threading
 
 import pkg_resources
 
@@ -91,3 +93,197 @@ def import_controller(string):
 
     # Load the controller
     return loader(controller)
+
+
+class FrozenDict(collections.Mapping):
+    """
+    An immutable mapping.  Once constructed, the contents of a
+    FrozenDict cannot be altered, so it may be safely shared between
+    threads without locking.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """
+        Initialize a FrozenDict.  Takes the same arguments as the
+        ``dict`` constructor.
+        """
+
+        self._dict = dict(*args, **kwargs)
+
+    def __getitem__(self, key):
+        """
+        Retrieve the value of `key`.
+        """
+
+        return self._dict[key]
+
+    def __iter__(self):
+        """
+        Iterate over the keys of the mapping.
+        """
+
+        return iter(self._dict)
+
+    def __len__(self):
+        """
+        Return the number of keys in the mapping.
+        """
+
+        return len(self._dict)
+
+    def __repr__(self):
+        """
+        Return a representation of the mapping.
+        """
+
+        return '%s(%r)' % (self.__class__.__name__, self._dict)
+
+
+class LRUCache(object):
+    """
+    A thread-safe, size-bounded cache which discards the least
+    recently used entries first.  Counts cache hits, misses, and
+    evictions, to assist in sizing the cache.
+    """
+
+    def __init__(self, size):
+        """
+        Initialize an LRUCache holding at most `size` entries.
+        """
+
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """
+        Return the number of entries in the cache.
+        """
+
+        return len(self._cache)
+
+    def get(self, key, default=None):
+        """
+        Retrieve the value cached for `key`, marking it as most
+        recently used.  Returns `default` if the key is not cached.
+        """
+
+        with self._lock:
+            try:
+                value = self._cache.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+
+            # Re-insert it to mark it as most recently used
+            self._cache[key] = value
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """
+        Cache `value` for `key`, evicting the least recently used
+        entries if the cache is full.
+        """
+
+        with self._lock:
+            self._cache.pop(key, None)
+            self._cache[key] = value
+
+            while len(self._cache) > self.size:
+                self._cache.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        """
+        Remove `key` from the cache, if present.
+        """
+
+        with self._lock:
+            self._cache.pop(key, None)
+
+    def clear(self):
+        """
+        Remove all entries from the cache.  The counters are not
+        reset.
+        """
+
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self):
+        """
+        Return a dictionary describing the size of the cache and the
+        values of the hit, miss, and eviction counters.
+        """
+
+        return dict(
+            size=self.size,
+            length=len(self._cache),
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+        )
+
+
+class ReadMostlyCache(object):
+    """
+    A size-bounded cache for values which are read far more often
+    than they are set.  Lookups take no lock; insertions are locked,
+    and once the cache is full, each new entry replaces an arbitrary
+    existing entry.  Counts evictions.
+    """
+
+    def __init__(self, size):
+        """
+        Initialize a ReadMostlyCache holding at most `size` entries.
+        """
+
+        self.size = size
+        self.evictions = 0
+
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """
+        Return the number of entries in the cache.
+        """
+
+        return len(self._cache)
+
+    def get(self, key, default=None):
+        """
+        Retrieve the value cached for `key`.  Returns `default` if the
+        key is not cached.
+        """
+
+        return self._cache.get(key, default)
+
+    def set(self, key, value):
+        """
+        Cache `value` for `key`, evicting an entry if the cache is
+        full.
+        """
+
+        with self._lock:
+            if key not in self._cache and len(self._cache) >= self.size:
+                self._cache.popitem()
+                self.evictions += 1
+            self._cache[key] = value
+
+    def stats(self):
+        """
+        Return a dictionary describing the size of the cache and the
+        value of the eviction counter.
+        """
+
+        return dict(
+            size=self.size,
+            length=len(self._cache),
+            evictions=self.evictions,
+        )
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""
+Compare Appathy's CBOR translators with its JSON translators: the
+size of the encoded payloads, and the time taken to serialize and
+deserialize them.
+"""
+
+import optparse
+import sys
+import timeit
+
+from appathy import types
+
+
+def make_payloads(items):
+    """
+    Build the payloads to translate: a single record, a listing of
+    `items` records, and a listing of `items` integers.
+    """
+
+    record = dict(id='b1946ac9-2d5f-4ee8-a8c4-4c3e8f3ab7d0', name='widget',
+                  size=42, price=19.95, tags=['a', 'b', 'c'],
+                  owner=dict(id=7, name='someone'), active=True)
+
+    return [
+        ('record', record),
+        ('listing', [dict(record, size=i) for i in range(items)]),
+        ('numbers', range(items)),
+    ]
+
+
+def encode(serializer, payload):
+    """
+    Serialize `payload`, collecting the chunks of a streamed result.
+    """
+
+    result = serializer(payload)
+    if not isinstance(result, basestring):
+        result = ''.join(result)
+    return result
+
+
+def bench(func, number):
+    """
+    Time `number` calls to `func`.  Returns the mean time per call,
+    in microseconds.
+    """
+
+    elapsed = min(timeit.repeat(func, repeat=5, number=number))
+    return elapsed / number * 1e6
+
+
+def main(argv=sys.argv[1:]):
+    parser = optparse.OptionParser()
+    parser.add_option('-i', '--items', type='int', default=2000,
+                      help='Number of items in the listing payloads')
+    parser.add_option('-n', '--number', type='int', default=20,
+                      help='Number of iterations to time')
+    opts, args = parser.parse_args(argv)
+
+    translators = [
+        ('json', types.JSONSerializer('json', 'application/json'),
+         types.JSONDeserializer('json', 'application/json')),
+        ('cbor', types.CBORSerializer('cbor', 'application/cbor'),
+         types.CBORDeserializer('cbor', 'application/cbor')),
+    ]
+
+    print("%-8s %-5s %10s %14s %14s" %
+          ('payload', 'type', 'bytes', 'serialize', 'deserialize'))
+
+    for name, payload in make_payloads(opts.items):
+        for type_name, ser, deser in translators:
+            body = encode(ser, payload)
+            ser_time = bench(lambda: encode(ser, payload), opts.number)
+            deser_time = bench(lambda: deser(body), opts.number)
+            print("%-8s %-5s %10d %11.1f us %11.1f us" %
+                  (name, type_name, len(body), ser_time, deser_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""
+Measure the per-request cost of routing and dispatching a request
+through an Appathy Application, compared with routing the same
+request through ``routes.middleware.RoutesMiddleware``.  The "routing"
+columns replace the dispatcher with a no-op, isolating the overhead
+of the routing layer; the "full" columns include dispatching to the
+controller.
+
+Appathy must be installed (e.g., "pip install -e .") so that the
+"call:" controller loader is available.
+"""
+
+import optparse
+import sys
+import timeit
+
+from routes import middleware
+
+import appathy
+
+
+appathy.register_types('text', 'text/plain')
+
+
+def text_serializer(type_name, content_type, obj):
+    return str(obj)
+
+
+def make_controller(name):
+    """
+    Build a controller class for a resource named `name`, and make
+    it importable from this module.
+    """
+
+    @appathy.action()
+    def index(self, req):
+        return 'index'
+
+    @appathy.action()
+    def show(self, req, id):
+        return id
+
+    @appathy.action()
+    def update(self, req, id):
+        return id
+
+    @appathy.action('/%s/{id}/status' % name, 'GET')
+    def status(self, req, id):
+        return 'status'
+
+    namespace = dict(wsgi_name=name, index=index, show=show,
+                     update=update, status=status)
+    cls = type('%sController' % name.title(), (appathy.Controller,),
+               namespace)
+    appathy.serializers(text=text_serializer)(cls)
+
+    globals()[cls.__name__] = cls
+    return 'call:%s:%s' % (__name__, cls.__name__)
+
+
+def make_app(resources, **conf):
+    """
+    Build an Application with the given number of resources.
+    """
+
+    for i in range(resources):
+        conf['resource.res%d' % i] = make_controller('res%d' % i)
+
+    return appathy.Application({}, **conf)
+
+
+def make_environ(method, path):
+    """
+    Build a minimal WSGI environment for a request.
+    """
+
+    return {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'SCRIPT_NAME': '',
+        'QUERY_STRING': '',
+        'CONTENT_LENGTH': '0',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_ACCEPT': 'text/plain',
+        'wsgi.url_scheme': 'http',
+    }
+
+
+def start_response(status, headers, exc_info=None):
+    pass
+
+
+def null_dispatch(environ, start_response):
+    return []
+
+
+def bench(app, requests, number):
+    """
+    Time `number` passes over the `requests` through `app`.  Returns
+    the mean time per request, in microseconds.
+    """
+
+    def run():
+        for method, path in requests:
+            # Routing modifies the environment, so start fresh
+            app(make_environ(method, path), start_response)
+
+    elapsed = min(timeit.repeat(run, repeat=5, number=number))
+    return elapsed / (number * len(requests)) * 1e6
+
+
+def main(argv=sys.argv[1:]):
+    parser = optparse.OptionParser()
+    parser.add_option('-r', '--resources', type='int', default=200,
+                      help='Number of resources to create')
+    parser.add_option('-n', '--number', type='int', default=200,
+                      help='Number of passes over the request list')
+    opts, args = parser.parse_args(argv)
+
+    # Select some requests spread across the resources
+    requests = []
+    for i in range(0, opts.resources, max(opts.resources // 10, 1)):
+        requests.extend([
+            ('GET', '/res%d' % i),
+            ('GET', '/res%d/1234' % i),
+            ('PUT', '/res%d/1234' % i),
+            ('GET', '/res%d/1234/status' % i),
+        ])
+
+    print("%d resources, %d distinct requests" %
+          (opts.resources, len(requests)))
+    print("%-8s %-8s %12s %12s %12s" %
+          ('router', 'layer', 'middleware', 'appathy', 'saved'))
+
+    for router in ('routes', 'trie'):
+        app = make_app(opts.resources, router=router)
+
+        for layer in ('routing', 'full'):
+            # Select the dispatcher to use
+            if layer == 'routing':
+                app.dispatch = null_dispatch
+            else:
+                del app.dispatch
+
+            routes_mw = middleware.RoutesMiddleware(app.dispatch, app.mapper,
+                                                    singleton=False)
+
+            mw_time = bench(routes_mw, requests, opts.number)
+            app_time = bench(app, requests, opts.number)
+            print("%-8s %-8s %9.1f us %9.1f us %9.1f us" %
+                  (router, layer, mw_time, app_time, mw_time - app_time))
+
+
+if __name__ == '__main__':
+    main()
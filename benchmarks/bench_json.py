@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""
+Compare Appathy's built-in JSON translators with the naive
+translator functions applications typically write, which wrap the
+standard library's ``json`` module.  The "translator" rows time the
+translators alone; the "request" rows time complete requests through
+an Appathy Application.
+
+Appathy must be installed (e.g., "pip install -e .") so that the
+"call:" controller loader is available.
+"""
+
+import json
+import optparse
+import StringIO
+import sys
+import timeit
+
+import appathy
+from appathy import types
+
+
+def naive_serializer(type_name, content_type, obj):
+    return json.dumps(obj)
+
+
+def naive_deserializer(type_name, content_type, body):
+    return json.loads(body)
+
+
+def make_payloads(items):
+    """
+    Build the payloads to translate: a single record and a listing
+    of `items` records.
+    """
+
+    record = dict(id='b1946ac9-2d5f-4ee8-a8c4-4c3e8f3ab7d0', name='widget',
+                  size=42, price=19.95, tags=['a', 'b', 'c'],
+                  owner=dict(id=7, name='someone'), active=True)
+    listing = [dict(record, size=i) for i in range(items)]
+
+    return [('record', record), ('listing', listing)]
+
+
+class NaiveController(appathy.Controller):
+    wsgi_name = 'naive'
+
+    @appathy.action()
+    @appathy.serializers(json=naive_serializer)
+    @appathy.deserializers(json=naive_deserializer)
+    def update(self, req, id, body):
+        return body
+
+
+class BuiltinController(appathy.Controller):
+    wsgi_name = 'builtin'
+
+    @appathy.action()
+    def update(self, req, id, body):
+        return body
+
+
+def make_environ(path, body):
+    """
+    Build a minimal WSGI environment for a PUT request.
+    """
+
+    return {
+        'REQUEST_METHOD': 'PUT',
+        'PATH_INFO': path,
+        'SCRIPT_NAME': '',
+        'QUERY_STRING': '',
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_ACCEPT': 'application/json',
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': StringIO.StringIO(body),
+    }
+
+
+def start_response(status, headers, exc_info=None):
+    pass
+
+
+def bench(func, number):
+    """
+    Time `number` calls to `func`.  Returns the mean time per call,
+    in microseconds.
+    """
+
+    elapsed = min(timeit.repeat(func, repeat=5, number=number))
+    return elapsed / number * 1e6
+
+
+def bench_translators(payload, number):
+    """
+    Time serializing and deserializing `payload` with the naive and
+    built-in translators.  Returns a list of (operation, naive,
+    builtin) tuples.
+    """
+
+    ser = types.JSONSerializer('json', 'application/json')
+    deser = types.JSONDeserializer('json', 'application/json')
+    body = json.dumps(payload)
+
+    def serialize():
+        # Collect the chunks of a streamed result
+        result = ser(payload)
+        if not isinstance(result, basestring):
+            result = ''.join(result)
+        return result
+
+    return [
+        ('serialize',
+         bench(lambda: naive_serializer('json', 'application/json',
+                                        payload), number),
+         bench(serialize, number)),
+        ('deserialize',
+         bench(lambda: naive_deserializer('json', 'application/json',
+                                          body), number),
+         bench(lambda: deser(body), number)),
+    ]
+
+
+def bench_requests(app, payload, number):
+    """
+    Time complete requests updating `payload`.  Returns a tuple of
+    the naive and built-in times.
+    """
+
+    body = json.dumps(payload)
+
+    def run(path):
+        def func():
+            for chunk in app(make_environ(path, body), start_response):
+                pass
+        return func
+
+    return (bench(run('/naive/1'), number),
+            bench(run('/builtin/1'), number))
+
+
+def main(argv=sys.argv[1:]):
+    parser = optparse.OptionParser()
+    parser.add_option('-i', '--items', type='int', default=2000,
+                      help='Number of records in the listing payload')
+    parser.add_option('-n', '--number', type='int', default=100,
+                      help='Number of iterations to time')
+    opts, args = parser.parse_args(argv)
+
+    app = appathy.Application({}, **{
+        'resource.naive': 'call:%s:NaiveController' % __name__,
+        'resource.builtin': 'call:%s:BuiltinController' % __name__,
+    })
+
+    print("JSON encoder: %s; decoder: %s" %
+          (types.json_dumps.__module__, types.json_loads.__module__))
+    print("%-8s %-12s %12s %12s %8s" %
+          ('payload', 'operation', 'naive', 'builtin', 'speedup'))
+
+    for name, payload in make_payloads(opts.items):
+        results = bench_translators(payload, opts.number)
+        results.append(('request',) + bench_requests(app, payload,
+                                                     opts.number))
+
+        for operation, naive, builtin in results:
+            print("%-8s %-12s %9.1f us %9.1f us %7.2fx" %
+                  (name, operation, naive, builtin, naive / builtin))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""
+Compare the generic JSON and CBOR serializers with serializers
+compiled from a declared result schema.
+"""
+
+import optparse
+import sys
+import timeit
+
+from appathy import schema
+from appathy import types
+
+
+RECORD = schema.Record(
+    ('id', str),
+    ('name', str),
+    ('size', int),
+    ('price', float),
+    ('tags', schema.List(str)),
+    ('owner', schema.Record(('id', int), ('name', str))),
+    ('active', bool),
+)
+
+
+def make_payloads(items):
+    """
+    Build the payloads to serialize, along with their schemas: a
+    single record and a listing of `items` records.
+    """
+
+    record = dict(id='b1946ac9-2d5f-4ee8-a8c4-4c3e8f3ab7d0', name='widget',
+                  size=42, price=19.95, tags=['a', 'b', 'c'],
+                  owner=dict(id=7, name='someone'), active=True)
+
+    return [
+        ('record', RECORD, record),
+        ('listing', schema.List(RECORD),
+         [dict(record, size=i) for i in range(items)]),
+    ]
+
+
+def bench(func, number):
+    """
+    Time `number` calls to `func`.  Returns the mean time per call,
+    in microseconds.
+    """
+
+    elapsed = min(timeit.repeat(func, repeat=5, number=number))
+    return elapsed / number * 1e6
+
+
+def main(argv=sys.argv[1:]):
+    parser = optparse.OptionParser()
+    parser.add_option('-i', '--items', type='int', default=500,
+                      help='Number of records in the listing payload')
+    parser.add_option('-n', '--number', type='int', default=100,
+                      help='Number of iterations to time')
+    opts, args = parser.parse_args(argv)
+
+    print("%-8s %-5s %12s %12s %8s" %
+          ('payload', 'type', 'generic', 'compiled', 'speedup'))
+
+    for name, spec, payload in make_payloads(opts.items):
+        for type_name, cls in (('json', types.JSONSerializer),
+                               ('cbor', types.CBORSerializer)):
+            generic = cls(type_name, 'application/' + type_name)
+            compiled = cls(type_name, 'application/' + type_name)
+            compiled.compile(spec)
+
+            # Don't stream the listing
+            generic.stream_threshold = compiled.stream_threshold = sys.maxint
+
+            generic_time = bench(lambda: generic(payload), opts.number)
+            compiled_time = bench(lambda: compiled(payload), opts.number)
+            print("%-8s %-5s %9.1f us %9.1f us %7.2fx" %
+                  (name, type_name, generic_time, compiled_time,
+                   generic_time / compiled_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""
+Measure the cost of cache operations on a SharedMemoryBackend used
+concurrently by an increasing number of processes, as in a
+pre-forking server.  Each process performs a mix of gets and sets
+(with the ratio given by --writes) on a common set of keys.  The time
+per operation, both elapsed and CPU, is reported along with the CPU
+time per operation of a MemoryBackend in a single process.  When
+there are more processes than CPUs, the elapsed time includes time
+spent waiting for a CPU; the CPU time is then the better measure of
+the cost of sharing.  The number of reads which gave up because a
+slot was being written ("contention") is reported as a measure of
+interference between the processes.
+"""
+
+import optparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from appathy import cache
+from appathy import shmcache
+
+
+def make_entry(size):
+    """
+    Build a cache entry with a body of the given size.
+    """
+
+    return cache.Entry(time.time() + 3600, '200 OK',
+                       (('Content-Type', 'application/json'),
+                        ('Content-Length', str(size))), 'x' * size)
+
+
+def run_ops(backend, keys, entry, ops, writes):
+    """
+    Perform `ops` operations on `backend`.  Returns a tuple of the
+    elapsed time and the CPU time used.
+    """
+
+    rand = random.Random(os.getpid())
+    plan = [(rand.choice(keys), rand.random() < writes)
+            for i in xrange(ops)]
+
+    start = time.time()
+    cpu = sum(os.times()[:2])
+    for key, write in plan:
+        if write:
+            backend.set(key, entry, 3600)
+        else:
+            backend.get(key)
+    return time.time() - start, sum(os.times()[:2]) - cpu
+
+
+def bench_procs(backend, procs, keys, entry, ops, writes):
+    """
+    Run `procs` processes concurrently against `backend`.  Returns a
+    tuple of the mean elapsed and CPU times per operation, in
+    microseconds, and the total contention count.
+    """
+
+    children = []
+    for i in range(procs):
+        rfd, wfd = os.pipe()
+        pid = os.fork()
+        if not pid:
+            # Child: run the operations and report the results
+            os.close(rfd)
+            try:
+                backend.contention = 0
+                elapsed, cpu = run_ops(backend, keys, entry, ops, writes)
+                os.write(wfd, '%r %r %d' % (elapsed, cpu,
+                                            backend.contention))
+            finally:
+                os._exit(0)
+
+        os.close(wfd)
+        children.append((pid, rfd))
+
+    total = total_cpu = 0.0
+    contention = 0
+    for pid, rfd in children:
+        elapsed, cpu, count = os.read(rfd, 128).split()
+        os.close(rfd)
+        os.waitpid(pid, 0)
+        total += float(elapsed)
+        total_cpu += float(cpu)
+        contention += int(count)
+
+    scale = 1e6 / (procs * ops)
+    return total * scale, total_cpu * scale, contention
+
+
+def main(argv=sys.argv[1:]):
+    parser = optparse.OptionParser()
+    parser.add_option('-p', '--procs', default='1,2,4,8,16',
+                      help='Comma-separated numbers of processes')
+    parser.add_option('-n', '--number', type='int', default=50000,
+                      help='Number of operations per process')
+    parser.add_option('-k', '--keys', type='int', default=500,
+                      help='Number of distinct keys')
+    parser.add_option('-s', '--size', type='int', default=2048,
+                      help='Size of the cached response bodies')
+    parser.add_option('-w', '--writes', type='float', default=0.05,
+                      help='Fraction of operations which are sets')
+    opts, args = parser.parse_args(argv)
+
+    keys = ['key%d' % i for i in range(opts.keys)]
+    entry = make_entry(opts.size)
+
+    # Baseline: an in-process cache
+    memory = cache.MemoryBackend(opts.keys)
+    for key in keys:
+        memory.set(key, entry, 3600)
+    base = run_ops(memory, keys, entry, opts.number,
+                   opts.writes)[1] / opts.number * 1e6
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        backend = shmcache.SharedMemoryBackend(
+            os.path.join(tmpdir, 'cache'), slots=opts.keys * 4,
+            slot_size=opts.size + 512)
+        for key in keys:
+            backend.set(key, entry, 3600)
+
+        print("%d keys, %d byte bodies, %d%% writes; memory backend "
+              "%.2f us/op (CPU)" % (opts.keys, opts.size,
+                                    opts.writes * 100, base))
+        print("%8s %12s %12s %12s" %
+              ('procs', 'elapsed', 'CPU', 'contention'))
+
+        for procs in [int(p) for p in opts.procs.split(',')]:
+            elapsed, cpu, contention = bench_procs(
+                backend, procs, keys, entry, opts.number, opts.writes)
+            print("%8d %9.2f us %9.2f us %12d" %
+                  (procs, elapsed, cpu, contention))
+
+        backend.close()
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
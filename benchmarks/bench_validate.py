@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""
+Measure the cost of validating large request bodies with a validator
+compiled from a request schema, compared with a generic validator
+which interprets the schema, and with the cost of decoding the body.
+"""
+
+import optparse
+import sys
+import timeit
+
+from appathy import schema
+from appathy import types
+
+
+RECORD = schema.Record(
+    ('id', str),
+    ('name', unicode),
+    ('size', int),
+    ('price', float),
+    ('tags', schema.List(str)),
+    ('owner', schema.Record(('id', int), ('name', str))),
+    ('parent', schema.Nullable(int)),
+    ('active', bool),
+)
+DOCUMENT = schema.Record(('items', schema.List(RECORD)))
+
+
+def generic_validate(spec, value):
+    """
+    Validate a value by walking the schema.
+    """
+
+    if isinstance(spec, schema.Nullable):
+        if value is not None:
+            generic_validate(spec.spec, value)
+    elif isinstance(spec, schema.Record):
+        if not isinstance(value, dict):
+            raise ValueError('expected an object')
+        names = set()
+        for name, field in spec.fields:
+            names.add(name)
+            if name in value:
+                generic_validate(field, value[name])
+            elif not isinstance(field, schema.Nullable):
+                raise ValueError('%s: required' % name)
+        if not names.issuperset(value):
+            raise ValueError('undeclared keys')
+    elif isinstance(spec, schema.List):
+        if not isinstance(value, (list, tuple)):
+            raise ValueError('expected an array')
+        for item in value:
+            generic_validate(spec.item, item)
+    elif spec in (int, long):
+        if isinstance(value, bool) or not isinstance(value, (int, long)):
+            raise ValueError('expected an integer')
+    elif spec is float:
+        if (isinstance(value, bool) or
+                not isinstance(value, (int, long, float))):
+            raise ValueError('expected a number')
+    elif spec is bool:
+        if not isinstance(value, bool):
+            raise ValueError('expected a boolean')
+    elif spec in (str, unicode, basestring):
+        if not isinstance(value, basestring):
+            raise ValueError('expected a string')
+
+
+def make_document(items):
+    """
+    Build a document containing `items` records.
+    """
+
+    return dict(items=[
+        dict(id='item-%d' % i, name=u'widget %d' % i, size=i,
+             price=i * 1.5, tags=['a', 'b', 'c'],
+             owner=dict(id=i % 7, name='someone'),
+             parent=None if i % 2 else i - 1, active=bool(i % 3))
+        for i in range(items)
+    ])
+
+
+def bench(func, number):
+    """
+    Time `number` calls to `func`.  Returns the mean time per call,
+    in milliseconds.
+    """
+
+    elapsed = min(timeit.repeat(func, repeat=3, number=number))
+    return elapsed / number * 1e3
+
+
+def main(argv=sys.argv[1:]):
+    parser = optparse.OptionParser()
+    parser.add_option('-n', '--number', type='int', default=10,
+                      help='Number of iterations to time')
+    opts, args = parser.parse_args(argv)
+
+    validator = schema.ValidatorCompiler().compile(DOCUMENT)
+
+    print("%8s %12s %12s %12s %8s" %
+          ('items', 'decode', 'generic', 'compiled', 'speedup'))
+
+    for items in (100, 1000, 10000, 100000):
+        document = make_document(items)
+        body = types.json_dumps(document)
+        body_doc = types.json_loads(body)
+
+        # Make sure the validators agree
+        generic_validate(DOCUMENT, body_doc)
+        validator(body_doc)
+
+        number = max(opts.number * 1000 // items, 1)
+        decode_time = bench(lambda: types.json_loads(body), number)
+        generic_time = bench(lambda: generic_validate(DOCUMENT, body_doc),
+                             number)
+        compiled_time = bench(lambda: validator(body_doc), number)
+        print("%8d %9.2f ms %9.2f ms %9.2f ms %7.2fx" %
+              (items, decode_time, generic_time, compiled_time,
+               generic_time / compiled_time))
+
+
+if __name__ == '__main__':
+    main()
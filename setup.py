@@ -51,6 +51,9 @@ setup(
     packages=['appathy'],
     requires=readreq('install-requires'),
     tests_require=readreq('test-requires', True),
+    extras_require={
+        'batch': ['futures'],
+        },
     entry_points={
         'appathy.loader': [
             'call = appathy.utils:import_call',
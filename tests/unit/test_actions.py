@@ -14,13 +14,19 @@
 # along with this program.  If not, see
 # <http://www.gnu.org/licenses/>.
 
+import datetime
+
 import mock
 import webob
 import webob.exc
 
 from appathy import actions
+from appathy import cache
+from appathy import controller
 from appathy import exceptions
 from appathy import response
+from appathy import schema
+from appathy import types
 
 import tests
 
@@ -87,11 +93,29 @@ class ActionMethodTest(tests.TestCase):
                          (['self', 'a', 'b', 'c', 'd', 'e', 'f'], 'args',
                           'kwargs', (4, 5, 6)))
         self.assertEqual(action.argidx, 1)
+        self.assertEqual(action.argnames, None)
         mock_Translators.assert_has_calls([
             mock.call(test.method, '_wsgi_serializers'),
             mock.call(test.method, '_wsgi_deserializers'),
         ])
 
+    @mock.patch('appathy.types.Translators')
+    def test_init_argnames(self, _mock_Translators):
+        class TestClass(object):
+            def method(self, a, b, c=3):
+                pass
+
+        test = TestClass()
+
+        action = actions.ActionMethod(test.method)
+
+        self.assertEqual(action.argnames, (
+            frozenset(['a', 'b', 'c']),
+            frozenset(['b', 'c']),
+            frozenset(['c']),
+            frozenset(),
+        ))
+
     @mock.patch('appathy.types.Translators')
     def test_getattr(self, _mock_Translators):
         def function():
@@ -122,6 +146,28 @@ class ActionMethodTest(tests.TestCase):
 
         self.assertTrue(check['called'])
 
+    @mock.patch('appathy.types.Translators')
+    def test_call_function_nokwarg_exact(self, _mock_Translators):
+        function = mock.Mock(return_value='result')
+        action = actions.ActionMethod(lambda a, b, c: None)
+        action.method = function
+
+        result = action(1, b=2, c=3)
+
+        function.assert_called_once_with(1, b=2, c=3)
+        self.assertEqual(result, 'result')
+
+    @mock.patch('appathy.types.Translators')
+    def test_call_function_nokwarg_extra_positional(self, _mock_Translators):
+        function = mock.Mock(return_value='result')
+        action = actions.ActionMethod(lambda a, b: None)
+        action.method = function
+
+        result = action(1, 2, 3, c=3)
+
+        function.assert_called_once_with(1, 2, 3)
+        self.assertEqual(result, 'result')
+
     @mock.patch('appathy.types.Translators')
     def test_call_function_withkwarg(self, _mock_Translators):
         check = dict(called=False)
@@ -185,16 +231,25 @@ class ActionMethodTest(tests.TestCase):
 
 
 class ActionDescriptorTest(tests.TestCase):
-    @mock.patch.object(actions, 'ActionMethod',
-                       side_effect=['meth', 'ext1', 'ext2', 'ext3'])
+    @mock.patch.object(actions, 'ActionMethod')
     def test_init(self, mock_ActionMethod):
+        meth = mock.Mock(**{'deserializers.translators': {}})
+        exts = [
+            mock.Mock(isgenerator=False),
+            mock.Mock(isgenerator=True),
+            mock.Mock(isgenerator=False),
+        ]
+        mock_ActionMethod.side_effect = [meth] + exts
+
         desc = actions.ActionDescriptor('method', ['extension1', 'extension2',
                                                    'extension3'],
                                         'response_type')
 
-        self.assertEqual(desc.method, 'meth')
-        self.assertEqual(desc.extensions, ['ext1', 'ext2', 'ext3'])
+        self.assertEqual(desc.method, meth)
+        self.assertEqual(desc.extensions, exts)
         self.assertEqual(desc.resp_type, 'response_type')
+        self.assertEqual(desc.deserializable, False)
+        self.assertEqual(desc.process, desc._process_full)
         mock_ActionMethod.assert_has_calls([
             mock.call('method'),
             mock.call('extension1'),
@@ -202,6 +257,673 @@ class ActionDescriptorTest(tests.TestCase):
             mock.call('extension3'),
         ])
 
+    @mock.patch.object(actions, 'ActionMethod')
+    def test_init_bare(self, mock_ActionMethod):
+        meth = mock.Mock(**{'deserializers.translators': dict(json='json')})
+        mock_ActionMethod.side_effect = [meth]
+
+        desc = actions.ActionDescriptor('method', [], 'response_type')
+
+        self.assertEqual(desc.deserializable, True)
+        self.assertEqual(desc.process, desc._process_bare)
+
+    @mock.patch.object(actions, 'ActionMethod')
+    def test_init_regular(self, mock_ActionMethod):
+        meth = mock.Mock()
+        exts = [
+            mock.Mock(isgenerator=False),
+            mock.Mock(isgenerator=False),
+        ]
+        mock_ActionMethod.side_effect = [meth] + exts
+
+        desc = actions.ActionDescriptor('method', ['ext1', 'ext2'],
+                                        'response_type')
+
+        self.assertEqual(desc.post_list, list(reversed(exts)))
+        self.assertEqual(desc.process, desc._process_regular)
+
+    @mock.patch.object(actions, 'ActionMethod')
+    def test_init_conditional(self, mock_ActionMethod):
+        method = mock.Mock(_wsgi_validator='validator', _wsgi_cache=None,
+                           _wsgi_coalesce=None)
+
+        desc = actions.ActionDescriptor(method, [], 'response_type')
+
+        self.assertEqual(desc.conditional, 'validator')
+        self.assertEqual(desc.process_action, desc._process_bare)
+        self.assertEqual(desc.process, desc._process_conditional)
+
+    @mock.patch.object(actions, 'ActionMethod')
+    def test_init_cached(self, mock_ActionMethod):
+        rcache = cache.ResponseCache()
+        method = mock.Mock(_wsgi_validator=None, _wsgi_cache=rcache,
+                           _wsgi_coalesce=None, im_class=None)
+
+        desc = actions.ActionDescriptor(method, [], 'response_type')
+
+        self.assertEqual(desc.cache, rcache)
+        self.assertEqual(desc.process_uncached, desc._process_bare)
+        self.assertEqual(desc.process, desc._process_cached)
+
+    @mock.patch.object(actions, 'ActionMethod')
+    def test_init_cached_ttl(self, mock_ActionMethod):
+        method = mock.Mock(_wsgi_validator='validator', _wsgi_cache=30,
+                           _wsgi_coalesce=None, im_class=None)
+
+        desc = actions.ActionDescriptor(method, [], 'response_type')
+
+        self.assertIsInstance(desc.cache, cache.ResponseCache)
+        self.assertEqual(desc.cache.ttl, 30)
+        self.assertEqual(desc.process_uncached, desc._process_bare)
+        self.assertEqual(desc.process_action, desc._process_cached)
+        self.assertEqual(desc.process, desc._process_conditional)
+
+    def test_method_name(self):
+        class Widgets(object):
+            def show(self):
+                pass
+
+        self.assertEqual(actions._method_name(Widgets().show),
+                         '%s:Widgets.show' % __name__)
+        self.assertEqual(actions._method_name(Widgets.show.im_func), 'show')
+
+    def test_extension_translator(self):
+        class Serializer(types.JSONSerializer):
+            pass
+
+        class Inherited(controller.Controller):
+            wsgi_name = 'inherited'
+
+            def show(self):
+                pass
+
+        class Custom(controller.Controller):
+            wsgi_name = 'custom'
+
+            @types.serializers(json=Serializer)
+            def show(self):
+                pass
+
+        inherited = types.Translators(Inherited().show, '_wsgi_serializers')
+        custom = types.Translators(Custom().show, '_wsgi_serializers')
+
+        self.assertRaises(KeyError, actions._extension_translator,
+                          inherited, 'application/json',
+                          types.default_serializers)
+        self.assertRaises(KeyError, actions._extension_translator,
+                          custom, 'application/cbor',
+                          types.default_serializers)
+        self.assertIsInstance(
+            actions._extension_translator(custom, 'application/json',
+                                          types.default_serializers),
+            Serializer)
+
+    def make_cached(self, content_type='text/plain'):
+        method = mock.Mock(_wsgi_validator=None, _wsgi_cache=10,
+                           _wsgi_coalesce=None, im_class=None)
+        with mock.patch.object(actions, 'ActionMethod'):
+            desc = actions.ActionDescriptor(method, [], 'response_type')
+        desc.cache_name = 'show'
+        desc.serializer = mock.Mock(return_value=(content_type, 'ser'))
+        desc.process_uncached = mock.Mock(side_effect=lambda req, params:
+                                          webob.Response(body='body'))
+        return desc
+
+    @mock.patch.object(actions, 'ActionMethod')
+    def test_init_invalidating(self, mock_ActionMethod):
+        method = mock.Mock(_wsgi_validator=None, _wsgi_cache=None,
+                           _wsgi_coalesce=None)
+
+        desc = actions.ActionDescriptor(method, [], 'response_type',
+                                        ['invalidator'])
+
+        self.assertEqual(desc.invalidators, ['invalidator'])
+        self.assertEqual(desc.process_write, desc._process_bare)
+        self.assertEqual(desc.process, desc._process_invalidating)
+
+    def test_process_invalidating(self):
+        invalidators = [mock.Mock(), mock.Mock()]
+        method = mock.Mock(_wsgi_validator=None, _wsgi_cache=None,
+                           _wsgi_coalesce=None)
+        with mock.patch.object(actions, 'ActionMethod'):
+            desc = actions.ActionDescriptor(method, [], 'response_type',
+                                            invalidators)
+        desc.process_write = mock.Mock(return_value=webob.Response())
+
+        result = desc.process('req', dict(id='1'))
+
+        self.assertEqual(result, desc.process_write.return_value)
+        for invalidator in invalidators:
+            invalidator.assert_called_once_with(dict(id='1'))
+
+    def test_process_invalidating_failed(self):
+        invalidators = [mock.Mock()]
+        method = mock.Mock(_wsgi_validator=None, _wsgi_cache=None,
+                           _wsgi_coalesce=None)
+        with mock.patch.object(actions, 'ActionMethod'):
+            desc = actions.ActionDescriptor(method, [], 'response_type',
+                                            invalidators)
+        desc.process_write = mock.Mock(
+            return_value=webob.Response(status=409))
+
+        desc.process('req', dict(id='1'))
+
+        self.assertFalse(invalidators[0].called)
+
+    def test_process_invalidating_httpexception(self):
+        invalidators = [mock.Mock()]
+        method = mock.Mock(_wsgi_validator=None, _wsgi_cache=None,
+                           _wsgi_coalesce=None)
+        with mock.patch.object(actions, 'ActionMethod'):
+            desc = actions.ActionDescriptor(method, [], 'response_type',
+                                            invalidators)
+        desc.process_write = mock.Mock(
+            side_effect=webob.exc.HTTPNoContent())
+
+        self.assertRaises(webob.exc.HTTPNoContent, desc.process, 'req',
+                          dict(id='1'))
+        invalidators[0].assert_called_once_with(dict(id='1'))
+
+    def test_process_invalidating_httpexception_failed(self):
+        invalidators = [mock.Mock()]
+        method = mock.Mock(_wsgi_validator=None, _wsgi_cache=None,
+                           _wsgi_coalesce=None)
+        with mock.patch.object(actions, 'ActionMethod'):
+            desc = actions.ActionDescriptor(method, [], 'response_type',
+                                            invalidators)
+        desc.process_write = mock.Mock(side_effect=webob.exc.HTTPConflict())
+
+        self.assertRaises(webob.exc.HTTPConflict, desc.process, 'req',
+                          dict(id='1'))
+        self.assertFalse(invalidators[0].called)
+
+    def test_process_invalidating_appathyresponse(self):
+        invalidators = [mock.Mock()]
+        method = mock.Mock(_wsgi_validator=None, _wsgi_cache=None,
+                           _wsgi_coalesce=None)
+        with mock.patch.object(actions, 'ActionMethod'):
+            desc = actions.ActionDescriptor(method, [], 'response_type',
+                                            invalidators)
+        desc.process_write = mock.Mock(side_effect=exceptions.AppathyResponse(
+            webob.Response(status=202)))
+
+        self.assertRaises(exceptions.AppathyResponse, desc.process, 'req',
+                          dict(id='1'))
+        invalidators[0].assert_called_once_with(dict(id='1'))
+
+    def test_uncache(self):
+        desc = self.make_cached()
+        desc.content_types = set(['text/plain', 'text/xml'])
+        for content_type in ('text/plain', 'text/xml', None):
+            for id in ('1', '2'):
+                desc.cache.set(desc.cache_key(content_type, dict(id=id)),
+                               webob.Response(body='body'))
+
+        desc.uncache(dict(id='1'))
+
+        self.assertEqual(len(desc.cache.backend.cache), 3)
+        for content_type in ('text/plain', 'text/xml', None):
+            self.assertNotEqual(desc.cache.backend.get(
+                desc.cache_key(content_type, dict(id='2'))), None)
+
+    def test_cache_key_unicode(self):
+        desc = self.make_cached()
+
+        self.assertEqual(desc.cache_key('text/plain', dict(id='1', fmt='x')),
+                         desc.cache_key('text/plain',
+                                        {u'id': u'1', u'fmt': u'x'}))
+        self.assertNotEqual(desc.cache_key('text/plain', dict(id='1')),
+                            desc.cache_key('text/plain', dict(id=1)))
+
+    @mock.patch.object(actions, 'ActionMethod')
+    def test_uncache_uncached(self, mock_ActionMethod):
+        method = mock.Mock(_wsgi_validator=None, _wsgi_cache=None,
+                           _wsgi_coalesce=None)
+        desc = actions.ActionDescriptor(method, [], 'response_type')
+
+        # Must not fail
+        desc.uncache(dict(id='1'))
+
+    def test_process_cached(self):
+        desc = self.make_cached()
+
+        result1 = desc.process(webob.Request.blank('/'), dict(id='1'))
+        result2 = desc.process(webob.Request.blank('/'), dict(id='1'))
+        result3 = desc.process(webob.Request.blank('/'), dict(id='2'))
+
+        self.assertEqual(desc.process_uncached.call_count, 2)
+        self.assertEqual(result1.body, 'body')
+        self.assertEqual(result2.body, 'body')
+        self.assertEqual(result3.body, 'body')
+        self.assertEqual(desc.cache.stats()['hits'], 1)
+        self.assertEqual(desc.cache.stats()['misses'], 2)
+        self.assertNotEqual(desc.cache.backend.get(
+            repr(('show', 'text/plain', [(u'id', u'1')]))), None)
+
+    def test_process_cached_content_type(self):
+        desc = self.make_cached()
+
+        desc.process(webob.Request.blank('/'), dict(id='1'))
+        desc.serializer.return_value = ('text/xml', 'ser')
+        desc.process(webob.Request.blank('/'), dict(id='1'))
+
+        self.assertEqual(desc.process_uncached.call_count, 2)
+
+    def test_process_cached_not_acceptable(self):
+        desc = self.make_cached()
+        desc.serializer.side_effect = webob.exc.HTTPNotAcceptable()
+
+        desc.process(webob.Request.blank('/'), dict(id='1'))
+        desc.process(webob.Request.blank('/'), dict(id='1'))
+
+        self.assertEqual(desc.process_uncached.call_count, 1)
+
+    @mock.patch('time.time')
+    def test_process_cached_stale(self, mock_time):
+        desc = self.make_cached()
+        desc.cache.grace = 30
+        desc.cache.refresh = mock.Mock()
+        mock_time.return_value = 1000.0
+        desc.process(webob.Request.blank('/'), dict(id='1'))
+        desc.process_uncached.side_effect = lambda req, params: \
+            webob.Response(body='new')
+
+        mock_time.return_value = 1015.0
+        req = webob.Request.blank('/', range='bytes=0-1',
+                                  if_none_match='"abc"')
+        result = desc.process(req, dict(id='1'))
+
+        self.assertEqual(result.body, 'body')
+        self.assertEqual(desc.process_uncached.call_count, 1)
+        self.assertEqual(desc.cache.refresh.call_count, 1)
+        key, func = desc.cache.refresh.call_args[0]
+        self.assertEqual(key, repr(('show', 'text/plain', [(u'id', u'1')])))
+
+        # The refresh processes a copy of the request
+        self.assertEqual(func().body, 'new')
+        refresh_req, refresh_params = desc.process_uncached.call_args[0]
+        self.assertNotEqual(refresh_req, req)
+        self.assertEqual(refresh_req.path, '/')
+        self.assertFalse('Range' in refresh_req.headers)
+        self.assertFalse('If-None-Match' in refresh_req.headers)
+        self.assertEqual(refresh_params, dict(id='1'))
+
+    def test_process_cached_uncacheable(self):
+        desc = self.make_cached()
+
+        for req in (webob.Request.blank('/', method='PUT'),
+                    webob.Request.blank('/?a=b'),
+                    webob.Request.blank('/', body='body')):
+            desc.process(req, dict(id='1'))
+            desc.process(req, dict(id='1'))
+
+        self.assertEqual(desc.process_uncached.call_count, 6)
+        self.assertEqual(desc.cache.stats()['misses'], 0)
+
+    @mock.patch.object(actions, 'ActionMethod')
+    def test_init_coalesced(self, mock_ActionMethod):
+        coalescer = cache.Coalescer()
+        method = mock.Mock(_wsgi_validator=None, _wsgi_cache=10,
+                           _wsgi_coalesce=coalescer, im_class=None)
+
+        desc = actions.ActionDescriptor(method, [], 'response_type')
+
+        self.assertEqual(desc.coalescer, coalescer)
+        self.assertEqual(desc.process_single, desc._process_bare)
+        self.assertEqual(desc.process_uncached, desc._process_coalesced)
+        self.assertEqual(desc.process, desc._process_cached)
+
+    @mock.patch.object(actions, 'ActionMethod')
+    def test_init_coalesced_true(self, mock_ActionMethod):
+        method = mock.Mock(_wsgi_validator=None, _wsgi_cache=None,
+                           _wsgi_coalesce=True, im_class=None)
+
+        desc = actions.ActionDescriptor(method, [], 'response_type')
+
+        self.assertIsInstance(desc.coalescer, cache.Coalescer)
+        self.assertEqual(desc.coalescer.timeout, 10)
+        self.assertEqual(desc.process, desc._process_coalesced)
+
+    @mock.patch.object(actions, 'ActionMethod')
+    def test_init_coalesced_timeout(self, mock_ActionMethod):
+        method = mock.Mock(_wsgi_validator=None, _wsgi_cache=None,
+                           _wsgi_coalesce=2.5, im_class=None)
+
+        desc = actions.ActionDescriptor(method, [], 'response_type')
+
+        self.assertIsInstance(desc.coalescer, cache.Coalescer)
+        self.assertEqual(desc.coalescer.timeout, 2.5)
+
+    @mock.patch.object(actions, 'ActionMethod')
+    def test_init_coalesced_false(self, mock_ActionMethod):
+        method = mock.Mock(_wsgi_validator=None, _wsgi_cache=None,
+                           _wsgi_coalesce=False)
+
+        desc = actions.ActionDescriptor(method, [], 'response_type')
+
+        self.assertEqual(desc.coalescer, None)
+        self.assertEqual(desc.process, desc._process_bare)
+
+    def make_coalesced(self):
+        method = mock.Mock(_wsgi_validator=None, _wsgi_cache=None,
+                           _wsgi_coalesce=True, im_class=None)
+        with mock.patch.object(actions, 'ActionMethod'):
+            desc = actions.ActionDescriptor(method, [], 'response_type')
+        desc.cache_name = 'show'
+        desc.serializer = mock.Mock(return_value=('text/plain', 'ser'))
+        desc.process_single = mock.Mock(return_value='response')
+        desc.coalescer = mock.Mock()
+        return desc
+
+    def test_process_coalesced(self):
+        desc = self.make_coalesced()
+        req = webob.Request.blank('/')
+
+        result = desc.process(req, dict(id='1'))
+
+        self.assertEqual(result, desc.coalescer.run.return_value)
+        key, run_req, func = desc.coalescer.run.call_args[0]
+        self.assertEqual(key, repr(('show', 'text/plain', [(u'id', u'1')])))
+        self.assertEqual(run_req, req)
+        self.assertFalse(desc.process_single.called)
+        self.assertEqual(func(), 'response')
+        desc.process_single.assert_called_once_with(req, dict(id='1'))
+
+    def test_process_coalesced_uncoalesced(self):
+        desc = self.make_coalesced()
+
+        for req in (webob.Request.blank('/', method='PUT'),
+                    webob.Request.blank('/?a=b'),
+                    webob.Request.blank('/', body='body'),
+                    webob.Request.blank('/', range='bytes=0-1')):
+            result = desc.process(req, dict(id='1'))
+
+            self.assertEqual(result, 'response')
+
+        self.assertEqual(desc.process_single.call_count, 4)
+        self.assertFalse(desc.coalescer.run.called)
+
+    def make_conditional(self, stamp, resp=None):
+        validator = mock.Mock(return_value=stamp)
+        method = mock.Mock(_wsgi_validator=validator, _wsgi_cache=None,
+                           _wsgi_coalesce=None)
+        with mock.patch.object(actions, 'ActionMethod'):
+            desc = actions.ActionDescriptor(method, [], 'response_type')
+        desc.process_action = mock.Mock(return_value=resp or webob.Response())
+        return desc, validator
+
+    def test_process_conditional_unsafe(self):
+        desc, validator = self.make_conditional('abc')
+        req = webob.Request.blank('/', method='PUT', if_none_match='"abc"')
+
+        result = desc.process(req, dict(a=1))
+
+        self.assertFalse(validator.called)
+        desc.process_action.assert_called_once_with(req, dict(a=1))
+        self.assertEqual(result, desc.process_action.return_value)
+        self.assertEqual(result.etag, None)
+
+    def test_process_conditional_nostamp(self):
+        desc, validator = self.make_conditional(None)
+        req = webob.Request.blank('/', if_none_match='"abc"')
+
+        result = desc.process(req, dict(a=1))
+
+        validator.assert_called_once_with(req, dict(a=1))
+        self.assertEqual(result, desc.process_action.return_value)
+        self.assertEqual(result.etag, None)
+
+    def test_process_conditional_etag_match(self):
+        desc, validator = self.make_conditional('abc')
+        req = webob.Request.blank('/', if_none_match='"xyz", "abc"')
+
+        result = desc.process(req, dict(a=1))
+
+        self.assertFalse(desc.process_action.called)
+        self.assertEqual(result.status_int, 304)
+        self.assertEqual(result.headerlist, [('ETag', '"abc"')])
+
+    def test_process_conditional_etag_any(self):
+        for stamp in ('abc', datetime.datetime(2012, 1, 1, 12, 0, 0)):
+            desc, validator = self.make_conditional(stamp)
+            req = webob.Request.blank('/', if_none_match='*')
+
+            result = desc.process(req, dict(a=1))
+
+            self.assertFalse(desc.process_action.called)
+            self.assertEqual(result.status_int, 304)
+
+    def test_process_conditional_etag_mismatch(self):
+        desc, validator = self.make_conditional('abc')
+        req = webob.Request.blank('/', if_none_match='"xyz"')
+
+        result = desc.process(req, dict(a=1))
+
+        desc.process_action.assert_called_once_with(req, dict(a=1))
+        self.assertEqual(result.status_int, 200)
+        self.assertEqual(result.etag, 'abc')
+
+    def test_process_conditional_date_match(self):
+        desc, validator = self.make_conditional(
+            datetime.datetime(2012, 1, 1, 12, 0, 0, 500))
+        req = webob.Request.blank(
+            '/', if_modified_since='Sun, 01 Jan 2012 12:00:00 GMT')
+
+        result = desc.process(req, dict(a=1))
+
+        self.assertFalse(desc.process_action.called)
+        self.assertEqual(result.status_int, 304)
+        self.assertEqual(result.headerlist, [
+            ('Last-Modified', 'Sun, 01 Jan 2012 12:00:00 GMT'),
+        ])
+
+    def test_process_conditional_date_modified(self):
+        desc, validator = self.make_conditional(
+            datetime.datetime(2012, 1, 1, 12, 0, 1))
+        req = webob.Request.blank(
+            '/', if_modified_since='Sun, 01 Jan 2012 12:00:00 GMT')
+
+        result = desc.process(req, dict(a=1))
+
+        self.assertEqual(result.status_int, 200)
+        self.assertEqual(result.headers['Last-Modified'],
+                         'Sun, 01 Jan 2012 12:00:01 GMT')
+
+    def test_process_conditional_date_none_match(self):
+        desc, validator = self.make_conditional(
+            datetime.datetime(2012, 1, 1, 12, 0, 0))
+        req = webob.Request.blank(
+            '/', if_none_match='"abc"',
+            if_modified_since='Sun, 01 Jan 2012 12:00:00 GMT')
+
+        result = desc.process(req, dict(a=1))
+
+        self.assertEqual(result.status_int, 200)
+
+    def test_process_conditional_keeps_headers(self):
+        desc, validator = self.make_conditional(
+            'abc', webob.Response(headerlist=[('ETag', '"other"')]))
+        req = webob.Request.blank('/')
+
+        result = desc.process(req, dict(a=1))
+
+        self.assertEqual(result.etag, 'other')
+
+    def test_process_conditional_error(self):
+        desc, validator = self.make_conditional(
+            'abc', webob.Response(status=404))
+        req = webob.Request.blank('/')
+
+        result = desc.process(req, dict(a=1))
+
+        self.assertEqual(result.etag, None)
+
+    def test_process_conditional_if_range_match(self):
+        desc, validator = self.make_conditional('abc')
+        req = webob.Request.blank('/', range='bytes=1-2', if_range='"abc"')
+
+        desc.process(req, dict(a=1))
+
+        self.assertNotEqual(req.range, None)
+        self.assertFalse('If-Range' in req.headers)
+
+    def test_process_conditional_if_range_mismatch(self):
+        desc, validator = self.make_conditional('abc')
+        req = webob.Request.blank('/', range='bytes=1-2', if_range='"xyz"')
+
+        desc.process(req, dict(a=1))
+
+        self.assertEqual(req.range, None)
+
+    @mock.patch.object(actions, 'ActionMethod')
+    @mock.patch.object(actions.ActionDescriptor, '__call__')
+    @mock.patch.object(actions.ActionDescriptor, 'deserialize_request')
+    def test_process_bare_nobody(self, mock_deserialize_request, mock_call,
+                                 _mock_ActionMethod):
+        mock_deserialize_request.return_value = None
+        mock_call.return_value = mock.Mock(**{
+            '_serialize.return_value': 'serialized',
+        })
+        params = {}
+
+        desc = actions.ActionDescriptor('method', [], 'resp_type')
+
+        result = desc._process_bare('req', params)
+
+        mock_deserialize_request.assert_called_once_with('req')
+        mock_call.assert_called_once_with('req', {})
+        mock_call.return_value._serialize.assert_called_once_with()
+        self.assertEqual(result, 'serialized')
+
+    @mock.patch.object(actions, 'ActionMethod')
+    @mock.patch.object(actions.ActionDescriptor, '__call__')
+    @mock.patch.object(actions.ActionDescriptor, 'deserialize_request')
+    def test_process_bare_withbody(self, mock_deserialize_request, mock_call,
+                                   _mock_ActionMethod):
+        mock_deserialize_request.return_value = 'body'
+        mock_call.return_value = mock.Mock(**{
+            '_serialize.return_value': 'serialized',
+        })
+        params = {}
+
+        desc = actions.ActionDescriptor('method', [], 'resp_type')
+
+        result = desc._process_bare('req', params)
+
+        mock_call.assert_called_once_with('req', dict(body='body'))
+        self.assertEqual(result, 'serialized')
+
+    @mock.patch.object(actions, 'ActionMethod')
+    @mock.patch.object(actions.ActionDescriptor, 'wrap')
+    @mock.patch.object(actions.ActionDescriptor, '__call__')
+    @mock.patch.object(actions.ActionDescriptor, 'deserialize_request')
+    def test_process_regular(self, mock_deserialize_request, mock_call,
+                             mock_wrap, mock_ActionMethod):
+        resp1 = mock.Mock()
+        resp2 = mock.Mock(**{'_serialize.return_value': 'serialized'})
+        mock_deserialize_request.return_value = 'body'
+        mock_call.return_value = resp1
+        mock_wrap.return_value = resp2
+        meth = mock.Mock()
+        exts = [
+            mock.Mock(isgenerator=False, return_value=None),
+            mock.Mock(isgenerator=False, return_value='replacement'),
+            mock.Mock(isgenerator=False, return_value=None),
+        ]
+        mock_ActionMethod.side_effect = [meth] + exts
+
+        desc = actions.ActionDescriptor('method', ['ext1', 'ext2', 'ext3'],
+                                        'resp_type')
+
+        result = desc._process_regular('req', dict(a=1))
+
+        mock_call.assert_called_once_with('req', dict(a=1, body='body'))
+        exts[2].assert_called_once_with('req', resp1, a=1, body='body')
+        exts[1].assert_called_once_with('req', resp1, a=1, body='body')
+        exts[0].assert_called_once_with('req', resp2, a=1, body='body')
+        mock_wrap.assert_called_once_with('req', 'replacement')
+        self.assertFalse(resp1._serialize.called)
+        self.assertEqual(result, 'serialized')
+
+    @mock.patch.object(actions, 'ActionMethod')
+    @mock.patch.object(actions.ActionDescriptor, 'post_process')
+    @mock.patch.object(actions.ActionDescriptor, 'pre_process',
+                       return_value=('pre-response', 'post_list'))
+    @mock.patch.object(actions.ActionDescriptor, '__call__')
+    @mock.patch.object(actions.ActionDescriptor, 'deserialize_request',
+                       return_value=None)
+    def test_process_full_nobody_premature(self, mock_deserialize_request,
+                                           mock_call, mock_pre_process,
+                                           mock_post_process,
+                                           _mock_ActionMethod):
+        mock_post_process.return_value = mock.Mock(**{
+            '_serialize.return_value': 'serialized',
+        })
+
+        desc = actions.ActionDescriptor('method', [], 'resp_type')
+
+        result = desc._process_full('req', {})
+
+        mock_deserialize_request.assert_called_once_with('req')
+        mock_pre_process.assert_called_once_with('req', {})
+        self.assertFalse(mock_call.called)
+        mock_post_process.assert_called_once_with('post_list', 'req',
+                                                  'pre-response', {})
+        self.assertEqual(result, 'serialized')
+
+    @mock.patch.object(actions, 'ActionMethod')
+    @mock.patch.object(actions.ActionDescriptor, 'post_process')
+    @mock.patch.object(actions.ActionDescriptor, 'pre_process',
+                       return_value=('pre-response', 'post_list'))
+    @mock.patch.object(actions.ActionDescriptor, '__call__')
+    @mock.patch.object(actions.ActionDescriptor, 'deserialize_request',
+                       return_value='body')
+    def test_process_full_withbody_premature(self, mock_deserialize_request,
+                                             mock_call, mock_pre_process,
+                                             mock_post_process,
+                                             _mock_ActionMethod):
+        mock_post_process.return_value = mock.Mock(**{
+            '_serialize.return_value': 'serialized',
+        })
+
+        desc = actions.ActionDescriptor('method', [], 'resp_type')
+
+        result = desc._process_full('req', {})
+
+        mock_deserialize_request.assert_called_once_with('req')
+        mock_pre_process.assert_called_once_with('req', dict(body='body'))
+        self.assertFalse(mock_call.called)
+        mock_post_process.assert_called_once_with('post_list', 'req',
+                                                  'pre-response',
+                                                  dict(body='body'))
+        self.assertEqual(result, 'serialized')
+
+    @mock.patch.object(actions, 'ActionMethod')
+    @mock.patch.object(actions.ActionDescriptor, 'post_process')
+    @mock.patch.object(actions.ActionDescriptor, 'pre_process',
+                       return_value=(None, 'post_list'))
+    @mock.patch.object(actions.ActionDescriptor, '__call__',
+                       return_value='response')
+    @mock.patch.object(actions.ActionDescriptor, 'deserialize_request',
+                       return_value=None)
+    def test_process_full_nobody(self, mock_deserialize_request, mock_call,
+                                 mock_pre_process, mock_post_process,
+                                 _mock_ActionMethod):
+        mock_post_process.return_value = mock.Mock(**{
+            '_serialize.return_value': 'serialized',
+        })
+
+        desc = actions.ActionDescriptor('method', [], 'resp_type')
+
+        result = desc._process_full('req', {})
+
+        mock_deserialize_request.assert_called_once_with('req')
+        mock_pre_process.assert_called_once_with('req', {})
+        mock_call.assert_called_once_with('req', {})
+        mock_post_process.assert_called_once_with('post_list', 'req',
+                                                  'response', {})
+        self.assertEqual(result, 'serialized')
+
     @mock.patch.object(actions, 'ActionMethod',
                        return_value=mock.Mock(return_value='response'))
     @mock.patch.object(actions.ActionDescriptor, 'wrap', return_value='resp')
@@ -225,6 +947,94 @@ class ActionDescriptorTest(tests.TestCase):
         self.assertEqual(result, None)
         self.assertFalse(mock_ActionMethod.return_value.deserializers.called)
 
+    @mock.patch.object(actions, 'ActionMethod')
+    def test_deserialize_request_unreadable(self, mock_ActionMethod):
+        desc = actions.ActionDescriptor('method', [], 'resp_type')
+
+        result = desc.deserialize_request(mock.Mock(content_length=None,
+                                                    is_body_readable=False))
+
+        self.assertEqual(result, None)
+        self.assertFalse(mock_ActionMethod.return_value.deserializers.called)
+
+    @mock.patch.object(actions, 'ActionMethod')
+    def test_deserialize_request_streaming(self, mock_ActionMethod):
+        deserializer = mock.Mock(spec=['__call__', 'streaming'],
+                                 streaming=True, return_value='body')
+        method = mock.Mock(**{'deserializers.return_value': deserializer})
+        mock_ActionMethod.side_effect = [method]
+        request = mock.Mock(content_length=None,
+                            is_body_readable=True,
+                            content_type='text/plain',
+                            body_file='body file')
+        type(request).body = mock.PropertyMock(side_effect=AssertionError)
+
+        desc = actions.ActionDescriptor('method', [], 'resp')
+
+        result = desc.deserialize_request(request)
+
+        deserializer.assert_called_once_with('body file')
+        self.assertEqual(result, 'body')
+
+    @mock.patch.object(actions, 'ActionMethod')
+    def test_deserialize_request_validated(self, mock_ActionMethod):
+        deserializer = mock.Mock(spec=['__call__'], return_value=dict(a=1))
+        method = mock.Mock(_wsgi_request_schema=schema.Record(('a', int)),
+                           **{'deserializers.return_value': deserializer})
+        mock_ActionMethod.side_effect = [method]
+        request = mock.Mock(content_length=50, content_type='text/plain',
+                            body='body')
+
+        desc = actions.ActionDescriptor('method', [], 'resp')
+
+        result = desc.deserialize_request(request)
+
+        self.assertEqual(result, dict(a=1))
+
+    @mock.patch.object(actions, 'ActionMethod')
+    def test_deserialize_request_invalid(self, mock_ActionMethod):
+        deserializer = mock.Mock(spec=['__call__'], return_value=dict(a=1))
+        method = mock.Mock(_wsgi_request_schema=schema.Record(('a', int)))
+        extensions = [
+            mock.Mock(_wsgi_request_schema=schema.Record(('b', int))),
+        ]
+        method.deserializers.return_value = deserializer
+        mock_ActionMethod.side_effect = [method] + extensions
+        request = mock.Mock(content_length=50, content_type='text/plain',
+                            body='body')
+
+        desc = actions.ActionDescriptor('method', ['ext1'], 'resp')
+
+        with self.assertRaises(webob.exc.HTTPBadRequest) as cm:
+            desc.deserialize_request(request)
+
+        self.assertEqual(cm.exception.detail, 'body.b: required')
+
+    @mock.patch.object(actions, 'ActionMethod')
+    def test_deserialize_request_invalid_nobody(self, mock_ActionMethod):
+        method = mock.Mock(_wsgi_request_schema=schema.Record(('a', int)))
+        mock_ActionMethod.side_effect = [method]
+
+        desc = actions.ActionDescriptor('method', [], 'resp')
+
+        with self.assertRaises(webob.exc.HTTPBadRequest):
+            desc.deserialize_request(mock.Mock(content_length=0))
+
+        self.assertFalse(method.deserializers.called)
+
+    @mock.patch.object(actions, 'ActionMethod', return_value=mock.Mock(**{
+        'deserializers.translators': {},
+    }))
+    def test_deserialize_request_undeserializable(self, mock_ActionMethod):
+        request = mock.Mock(content_length=50, content_type='text/plain')
+
+        desc = actions.ActionDescriptor('method', [], 'resp_type')
+
+        with self.assertRaises(webob.exc.HTTPUnsupportedMediaType):
+            result = desc.deserialize_request(request)
+
+        self.assertFalse(mock_ActionMethod.return_value.deserializers.called)
+
     @mock.patch.object(actions, 'ActionMethod', return_value=mock.Mock(**{
         'deserializers.side_effect': KeyError,
     }))
@@ -262,7 +1072,7 @@ class ActionDescriptorTest(tests.TestCase):
 
     @mock.patch.object(actions, 'ActionMethod')
     def test_deserialize_request_withattacher(self, mock_ActionMethod):
-        deserializer = mock.Mock(return_value='body')
+        deserializer = mock.Mock(streaming=False, return_value='body')
         method = mock.Mock(**{'deserializers.return_value': deserializer})
         extensions = [
             mock.Mock(**{'deserializers.return_value': 'extension1'}),
@@ -290,6 +1100,53 @@ class ActionDescriptorTest(tests.TestCase):
         ])
         self.assertEqual(result, 'body')
 
+    @mock.patch.object(actions, 'ActionMethod')
+    def test_deserialize_request_reusable(self, mock_ActionMethod):
+        deserializer = mock.Mock(reusable=True, streaming=False,
+                                 return_value='body')
+        method = mock.Mock(**{'deserializers.return_value': deserializer})
+        extensions = [
+            mock.Mock(**{'deserializers.return_value': 'extension1'}),
+        ]
+        mock_ActionMethod.side_effect = [method] + extensions
+        request = mock.Mock(content_length=50,
+                            content_type='text/plain',
+                            body='this is the body')
+
+        desc = actions.ActionDescriptor('method', ['ext1'], 'resp')
+
+        result1 = desc.deserialize_request(request)
+        result2 = desc.deserialize_request(request)
+
+        self.assertEqual(result1, 'body')
+        self.assertEqual(result2, 'body')
+        method.deserializers.assert_called_once_with('text/plain')
+        deserializer.attach.assert_called_once_with('extension1')
+        self.assertEqual(deserializer.call_count, 2)
+        self.assertEqual(desc.deserializer_cache,
+                         {'text/plain': deserializer})
+
+    @mock.patch.object(actions, 'ActionMethod')
+    def test_deserialize_request_not_reusable(self, mock_ActionMethod):
+        method = mock.Mock(**{
+            'deserializers.side_effect':
+            lambda ct: mock.Mock(spec=['__call__'], return_value='body'),
+        })
+        mock_ActionMethod.side_effect = [method]
+        request = mock.Mock(content_length=50,
+                            content_type='text/plain',
+                            body='this is the body')
+
+        desc = actions.ActionDescriptor('method', [], 'resp')
+
+        result1 = desc.deserialize_request(request)
+        result2 = desc.deserialize_request(request)
+
+        self.assertEqual(result1, 'body')
+        self.assertEqual(result2, 'body')
+        self.assertEqual(method.deserializers.call_count, 2)
+        self.assertEqual(desc.deserializer_cache, {})
+
     @mock.patch.object(actions, 'ActionMethod')
     def test_serializer_nomatch(self, mock_ActionMethod):
         serializers = mock.Mock(**{
@@ -306,6 +1163,7 @@ class ActionDescriptorTest(tests.TestCase):
 
         serializers.get_types.assert_called_once_with()
         request.accept.best_match.assert_called_once_with(['type1', 'type2'])
+        request.environ.get.assert_called_once_with('HTTP_ACCEPT')
         self.assertFalse(serializers.called)
 
     @mock.patch.object(actions, 'ActionMethod')
@@ -325,6 +1183,7 @@ class ActionDescriptorTest(tests.TestCase):
 
         serializers.get_types.assert_called_once_with()
         request.accept.best_match.assert_called_once_with(['type1', 'type2'])
+        request.environ.get.assert_called_once_with('HTTP_ACCEPT')
         serializers.assert_called_once_with('text/plain')
 
     @mock.patch.object(actions, 'ActionMethod')
@@ -345,6 +1204,7 @@ class ActionDescriptorTest(tests.TestCase):
 
         serializers.get_types.assert_called_once_with()
         request.accept.best_match.assert_called_once_with(['type1', 'type2'])
+        request.environ.get.assert_called_once_with('HTTP_ACCEPT')
         serializers.assert_called_once_with('text/plain')
         self.assertFalse(extensions[0].serializers.called)
         self.assertFalse(extensions[1].serializers.called)
@@ -375,6 +1235,7 @@ class ActionDescriptorTest(tests.TestCase):
 
         serializers.get_types.assert_called_once_with()
         request.accept.best_match.assert_called_once_with(['type1', 'type2'])
+        request.environ.get.assert_called_once_with('HTTP_ACCEPT')
         serializers.assert_called_once_with('text/plain')
         extensions[0].serializers.assert_called_once_with('text/plain')
         extensions[1].serializers.assert_called_once_with('text/plain')
@@ -387,6 +1248,251 @@ class ActionDescriptorTest(tests.TestCase):
         self.assertEqual(result[0], 'text/plain')
         self.assertEqual(id(result[1]), id(serializer))
 
+    @mock.patch.object(actions, 'ActionMethod')
+    def test_serializer_compile(self, mock_ActionMethod):
+        serializer = mock.Mock(reusable=True)
+        serializers = mock.Mock(**{
+            'get_types.return_value': ['type1', 'type2'],
+            'return_value': serializer,
+        })
+        method = mock.Mock(serializers=serializers,
+                           _wsgi_result_schema=schema.Record(('a', int)))
+        extensions = [
+            mock.Mock(**{
+                'serializers.return_value': 'extension1',
+                '_wsgi_result_schema': schema.Record(('b', int)),
+            }),
+        ]
+        mock_ActionMethod.side_effect = [method] + extensions
+        request = mock.Mock(environ=dict(HTTP_ACCEPT='text/plain'), **{
+            'accept.best_match.return_value': 'text/plain',
+        })
+
+        desc = actions.ActionDescriptor('method', ['ext1'], 'resp')
+        desc.serializer(request)
+        desc.serializer(request)
+
+        self.assertEqual(desc.result_schema,
+                         schema.Record(('a', int), ('b', int)))
+        serializer.assert_has_calls([
+            mock.call.attach('extension1'),
+            mock.call.compile(schema.Record(('a', int), ('b', int))),
+        ])
+        self.assertEqual(serializer.compile.call_count, 1)
+
+    @mock.patch.object(actions, 'ActionMethod')
+    def test_serializer_compile_not_reusable(self, mock_ActionMethod):
+        built = []
+
+        def build(ct):
+            built.append(mock.Mock(reusable=False))
+            return built[-1]
+
+        serializers = mock.Mock(**{
+            'get_types.return_value': ['type1', 'type2'],
+            'side_effect': build,
+        })
+        method = mock.Mock(serializers=serializers,
+                           _wsgi_result_schema=schema.Record(('a', int)))
+        mock_ActionMethod.side_effect = [method]
+        request = mock.Mock(environ=dict(HTTP_ACCEPT='text/plain'), **{
+            'accept.best_match.return_value': 'text/plain',
+        })
+
+        desc = actions.ActionDescriptor('method', [], 'resp')
+        desc.serializer(request)
+        desc.serializer(request)
+
+        self.assertEqual(len(built), 2)
+        for serializer in built:
+            self.assertFalse(serializer.compile.called)
+
+    @mock.patch.object(actions, 'ActionMethod')
+    def test_serializer_noschema(self, mock_ActionMethod):
+        serializer = mock.Mock()
+        serializers = mock.Mock(**{
+            'get_types.return_value': ['type1', 'type2'],
+            'return_value': serializer,
+        })
+        method = mock.Mock(serializers=serializers,
+                           _wsgi_result_schema=None)
+        mock_ActionMethod.side_effect = [method]
+        request = mock.Mock(**{'accept.best_match.return_value': 'text/plain'})
+
+        desc = actions.ActionDescriptor('method', [], 'resp')
+        desc.serializer(request)
+
+        self.assertEqual(desc.result_schema, None)
+        self.assertFalse(serializer.compile.called)
+
+    @mock.patch.object(actions, 'ActionMethod')
+    def test_serializer_accept_cached(self, mock_ActionMethod):
+        serializers = mock.Mock(**{
+            'get_types.return_value': ['type1', 'type2'],
+            'side_effect': lambda ct: mock.Mock(spec=[]),
+        })
+        method = mock.Mock(serializers=serializers)
+        mock_ActionMethod.side_effect = [method]
+        requests = [
+            mock.Mock(environ=dict(HTTP_ACCEPT='text/*'), **{
+                'accept.best_match.return_value': 'text/plain',
+            }),
+            mock.Mock(environ=dict(HTTP_ACCEPT='text/*')),
+            mock.Mock(environ=dict(HTTP_ACCEPT='*/*'), **{
+                'accept.best_match.return_value': 'text/html',
+            }),
+        ]
+
+        desc = actions.ActionDescriptor('method', [], 'resp')
+
+        results = [desc.serializer(req) for req in requests]
+
+        self.assertEqual([r[0] for r in results],
+                         ['text/plain', 'text/plain', 'text/html'])
+        self.assertFalse(requests[1].accept.best_match.called)
+        self.assertEqual(serializers.call_count, 3)
+        self.assertEqual(desc.serializer_cache, {})
+        self.assertEqual(len(desc.accept_cache), 2)
+
+    @mock.patch.object(actions, 'ActionMethod')
+    def test_serializer_nomatch_cached(self, mock_ActionMethod):
+        serializers = mock.Mock(**{
+            'get_types.return_value': ['type1', 'type2'],
+        })
+        method = mock.Mock(serializers=serializers)
+        mock_ActionMethod.side_effect = [method]
+        requests = [
+            mock.Mock(environ={}, **{'accept.best_match.return_value': None}),
+            mock.Mock(environ={}),
+        ]
+
+        desc = actions.ActionDescriptor('method', [], 'resp_type')
+
+        for req in requests:
+            with self.assertRaises(webob.exc.HTTPNotAcceptable):
+                dummy = desc.serializer(req)
+
+        requests[0].accept.best_match.assert_called_once_with(
+            ['type1', 'type2'])
+        self.assertFalse(requests[1].accept.best_match.called)
+        self.assertFalse(serializers.called)
+
+    @mock.patch.object(actions, 'ActionMethod')
+    def test_serializer_reusable(self, mock_ActionMethod):
+        serializer = mock.Mock(reusable=True)
+        serializers = mock.Mock(**{
+            'get_types.return_value': ['type1', 'type2'],
+            'return_value': serializer,
+        })
+        method = mock.Mock(serializers=serializers)
+        extensions = [
+            mock.Mock(**{'serializers.return_value': 'extension1'}),
+        ]
+        mock_ActionMethod.side_effect = [method] + extensions
+        request = mock.Mock(environ=dict(HTTP_ACCEPT='text/plain'), **{
+            'accept.best_match.return_value': 'text/plain',
+        })
+
+        desc = actions.ActionDescriptor('method', ['ext1'], 'resp')
+
+        result1 = desc.serializer(request)
+        result2 = desc.serializer(request)
+
+        self.assertEqual(result1, ('text/plain', serializer))
+        self.assertEqual(result2, ('text/plain', serializer))
+        serializers.assert_called_once_with('text/plain')
+        serializer.attach.assert_called_once_with('extension1')
+        self.assertEqual(desc.serializer_cache, {'text/plain': serializer})
+
+    @mock.patch.object(actions, 'ActionMethod')
+    def test_serializer_not_reusable(self, mock_ActionMethod):
+        serializers = mock.Mock(**{
+            'get_types.return_value': ['type1', 'type2'],
+            'side_effect': lambda ct: mock.Mock(reusable=False),
+        })
+        method = mock.Mock(serializers=serializers)
+        mock_ActionMethod.side_effect = [method]
+        request = mock.Mock(environ=dict(HTTP_ACCEPT='text/plain'), **{
+            'accept.best_match.return_value': 'text/plain',
+        })
+
+        desc = actions.ActionDescriptor('method', [], 'resp')
+
+        result1 = desc.serializer(request)
+        result2 = desc.serializer(request)
+
+        self.assertNotEqual(id(result1[1]), id(result2[1]))
+        self.assertEqual(serializers.call_count, 2)
+        self.assertEqual(desc.serializer_cache, {})
+
+    @mock.patch.object(actions, 'ActionMethod')
+    def test_prepare(self, mock_ActionMethod):
+        reusable = {
+            'ser1': mock.Mock(reusable=True),
+            'ser2': mock.Mock(reusable=False),
+            'deser1': mock.Mock(reusable=True),
+            'deser2': mock.Mock(spec=[]),
+        }
+
+        def translator(kind, ct):
+            if ct == 'type3':
+                raise KeyError(ct)
+            return reusable[kind + ct[-1]]
+
+        method = mock.Mock(
+            serializers=mock.Mock(**{
+                'get_types.return_value': ['type1', 'type2', 'type3'],
+                'side_effect': lambda ct: translator('ser', ct),
+            }),
+            deserializers=mock.Mock(**{
+                'get_types.return_value': ['type1', 'type2', 'type3'],
+                'side_effect': lambda ct: translator('deser', ct),
+            }),
+        )
+        mock_ActionMethod.side_effect = [method]
+
+        desc = actions.ActionDescriptor('method', [], 'resp')
+        desc.prepare()
+
+        self.assertEqual(desc.serializer_cache,
+                         {'type1': reusable['ser1']})
+        self.assertEqual(desc.deserializer_cache,
+                         {'type1': reusable['deser1']})
+
+        # Preparing again builds only the translators not cached
+        method.serializers.reset_mock()
+        method.deserializers.reset_mock()
+        desc.prepare()
+
+        method.serializers.assert_has_calls([
+            mock.call('type2'), mock.call('type3')])
+        self.assertEqual(method.serializers.call_count, 2)
+        self.assertEqual(method.deserializers.call_count, 2)
+
+    @mock.patch.object(actions, 'ActionMethod')
+    def test_prepare_request_path(self, mock_ActionMethod):
+        serializer = mock.Mock(reusable=True)
+        serializers = mock.Mock(**{
+            'get_types.return_value': ['text/plain'],
+            'return_value': serializer,
+        })
+        method = mock.Mock(serializers=serializers, **{
+            'deserializers.get_types.return_value': [],
+        })
+        mock_ActionMethod.side_effect = [method]
+        request = mock.Mock(environ=dict(HTTP_ACCEPT='text/plain'), **{
+            'accept.best_match.return_value': 'text/plain',
+        })
+
+        desc = actions.ActionDescriptor('method', [], 'resp')
+        desc.prepare()
+        serializers.reset_mock()
+
+        result = desc.serializer(request)
+
+        self.assertEqual(result, ('text/plain', serializer))
+        self.assertFalse(serializers.called)
+
     @mock.patch.object(actions, 'ActionMethod')
     @mock.patch.object(actions.ActionDescriptor, 'wrap', return_value='resp')
     def test_pre_process_functions(self, mock_wrap, mock_ActionMethod):
@@ -14,7 +14,10 @@
 # along with this program.  If not, see
 # <http://www.gnu.org/licenses/>.
 
+import json
+
 import mock
+import webob
 import webob.exc
 
 from appathy import application
@@ -54,11 +57,11 @@ class RequestTest(tests.TestCase):
 
 
 class ApplicationTest(tests.TestCase):
-    @mock.patch('routes.middleware.RoutesMiddleware.__init__')
+    @mock.patch('appathy.routing.StaticMapper', return_value=mock.Mock())
     @mock.patch('routes.Mapper', return_value=mock.Mock())
     @mock.patch.object(utils, 'import_controller')
     def test_init_noconf(self, mock_import_controller, mock_Mapper,
-                         mock_RoutesMiddleware):
+                         mock_StaticMapper):
         config = {
             'conf1': 1,
             'conf2': 2,
@@ -69,18 +72,18 @@ class ApplicationTest(tests.TestCase):
         app = application.Application('global_conf', **config)
 
         mock_Mapper.assert_called_once_with(register=False)
+        mock_StaticMapper.assert_called_once_with(mock_Mapper.return_value)
+        self.assertEqual(app.match_cache, None)
+        self.assertEqual(app.batch, None)
         self.assertEqual(app.resources, {})
         self.assertFalse(mock_import_controller.called)
-        mock_RoutesMiddleware.assert_called_once_with(
-            mock.ANY, mock_Mapper.return_value, singleton=False)
-        dispatch = mock_RoutesMiddleware.call_args[0][0]
-        self.assertEqual(dispatch.func, app.dispatch.func)
+        self.assertEqual(app.mapper, mock_StaticMapper.return_value)
 
-    @mock.patch('routes.middleware.RoutesMiddleware.__init__')
+    @mock.patch('appathy.routing.StaticMapper', return_value=mock.Mock())
     @mock.patch('routes.Mapper', return_value=mock.Mock())
     @mock.patch.object(utils, 'import_controller')
     def test_init_resources(self, mock_import_controller, mock_Mapper,
-                            mock_RoutesMiddleware):
+                            mock_StaticMapper):
         controllers = dict(
             res1=mock.Mock(return_value='resource 1'),
             res2=mock.Mock(return_value='resource 2'),
@@ -96,6 +99,7 @@ class ApplicationTest(tests.TestCase):
         app = application.Application('global_conf', **config)
 
         mock_Mapper.assert_called_once_with(register=False)
+        mock_StaticMapper.assert_called_once_with(mock_Mapper.return_value)
         self.assertEqual(app.resources, dict(
             resource1='resource 1',
             resource2='resource 2',
@@ -106,19 +110,19 @@ class ApplicationTest(tests.TestCase):
             mock.call('res2'),
             mock.call('res3'),
         ], any_order=True)
-        controllers['res1'].assert_called_once_with(mock_Mapper.return_value)
-        controllers['res2'].assert_called_once_with(mock_Mapper.return_value)
-        controllers['res3'].assert_called_once_with(mock_Mapper.return_value)
-        mock_RoutesMiddleware.assert_called_once_with(
-            mock.ANY, mock_Mapper.return_value, singleton=False)
-        dispatch = mock_RoutesMiddleware.call_args[0][0]
-        self.assertEqual(dispatch.func, app.dispatch.func)
-
-    @mock.patch('routes.middleware.RoutesMiddleware.__init__')
+        controllers['res1'].assert_called_once_with(
+            mock_StaticMapper.return_value)
+        controllers['res2'].assert_called_once_with(
+            mock_StaticMapper.return_value)
+        controllers['res3'].assert_called_once_with(
+            mock_StaticMapper.return_value)
+        self.assertEqual(app.mapper, mock_StaticMapper.return_value)
+
+    @mock.patch('appathy.routing.StaticMapper', return_value=mock.Mock())
     @mock.patch('routes.Mapper', return_value=mock.Mock())
     @mock.patch.object(utils, 'import_controller')
     def test_init_extensions(self, mock_import_controller, mock_Mapper,
-                             mock_RoutesMiddleware):
+                             mock_StaticMapper):
         controllers = dict(
             res1=mock.Mock(return_value=mock.Mock()),
             res2=mock.Mock(return_value=mock.Mock()),
@@ -140,6 +144,7 @@ class ApplicationTest(tests.TestCase):
         app = application.Application('global_conf', **config)
 
         mock_Mapper.assert_called_once_with(register=False)
+        mock_StaticMapper.assert_called_once_with(mock_Mapper.return_value)
         self.assertEqual(app.resources, dict(
             resource1=controllers['res1'].return_value,
             resource2=controllers['res2'].return_value,
@@ -154,9 +159,12 @@ class ApplicationTest(tests.TestCase):
             mock.call('ext13'),
             mock.call('ext21'),
         ], any_order=True)
-        controllers['res1'].assert_called_once_with(mock_Mapper.return_value)
-        controllers['res2'].assert_called_once_with(mock_Mapper.return_value)
-        controllers['res3'].assert_called_once_with(mock_Mapper.return_value)
+        controllers['res1'].assert_called_once_with(
+            mock_StaticMapper.return_value)
+        controllers['res2'].assert_called_once_with(
+            mock_StaticMapper.return_value)
+        controllers['res3'].assert_called_once_with(
+            mock_StaticMapper.return_value)
         controllers['ext11'].assert_called_once_with()
         controllers['ext12'].assert_called_once_with()
         controllers['ext13'].assert_called_once_with()
@@ -170,16 +178,58 @@ class ApplicationTest(tests.TestCase):
             mock.call.wsgi_extend('resource 2 extension 1'),
         ])
         self.assertFalse(controllers['res3'].return_value.wsgi_extend.called)
-        mock_RoutesMiddleware.assert_called_once_with(
-            mock.ANY, mock_Mapper.return_value, singleton=False)
-        dispatch = mock_RoutesMiddleware.call_args[0][0]
-        self.assertEqual(dispatch.func, app.dispatch.func)
+        self.assertEqual(app.mapper, mock_StaticMapper.return_value)
+
+    @mock.patch('appathy.routing.StaticMapper', return_value=mock.Mock())
+    @mock.patch('routes.Mapper', return_value=mock.Mock())
+    @mock.patch.object(utils, 'import_controller')
+    def test_init_lazy_descriptors(self, mock_import_controller, mock_Mapper,
+                                   mock_StaticMapper):
+        controllers = dict(
+            res1=mock.Mock(return_value=mock.Mock()),
+        )
+        mock_import_controller.side_effect = lambda x: controllers[x]
+        config = {
+            'resource.resource1': 'res1',
+        }
+
+        app = application.Application('global_conf', **config)
+
+        self.assertFalse(controllers['res1'].return_value.wsgi_freeze.called)
 
-    @mock.patch('routes.middleware.RoutesMiddleware.__init__')
+    @mock.patch('appathy.routing.StaticMapper', return_value=mock.Mock())
+    @mock.patch('routes.Mapper', return_value=mock.Mock())
+    @mock.patch.object(utils, 'import_controller')
+    def test_init_eager_descriptors(self, mock_import_controller,
+                                    mock_Mapper, mock_StaticMapper):
+        res1 = mock.Mock()
+        res2 = mock.Mock()
+        controllers = dict(
+            res1=mock.Mock(return_value=res1),
+            res2=mock.Mock(return_value=res2),
+            ext11=mock.Mock(return_value='resource 1 extension 1'),
+        )
+        mock_import_controller.side_effect = lambda x: controllers[x]
+        config = {
+            'resource.resource1': 'res1',
+            'resource.resource2': 'res2',
+            'extend.resource1': 'ext11',
+            'eager_descriptors': 'true',
+        }
+
+        app = application.Application('global_conf', **config)
+
+        res1.assert_has_calls([
+            mock.call.wsgi_extend('resource 1 extension 1'),
+            mock.call.wsgi_freeze(),
+        ])
+        res2.wsgi_freeze.assert_called_once_with()
+
+    @mock.patch('appathy.routing.StaticMapper', return_value=mock.Mock())
     @mock.patch('routes.Mapper', return_value=mock.Mock())
     @mock.patch.object(utils, 'import_controller')
     def test_init_extensions_noresource(self, mock_import_controller,
-                                        mock_Mapper, mock_RoutesMiddleware):
+                                        mock_Mapper, mock_StaticMapper):
         controllers = dict(
             ext11=mock.Mock(return_value='resource 1 extension 1'),
         )
@@ -192,8 +242,154 @@ class ApplicationTest(tests.TestCase):
             app = application.Application('global_conf', **config)
 
         mock_Mapper.assert_called_once_with(register=False)
+        mock_StaticMapper.assert_called_once_with(mock_Mapper.return_value)
         self.assertFalse(mock_import_controller.called)
-        self.assertFalse(mock_RoutesMiddleware.called)
+
+    @mock.patch('appathy.routing.StaticMapper', return_value=mock.Mock())
+    @mock.patch('appathy.routing.Router', return_value=mock.Mock())
+    @mock.patch('routes.Mapper', return_value=mock.Mock())
+    @mock.patch.object(utils, 'import_controller')
+    def test_init_trie_router(self, mock_import_controller, mock_Mapper,
+                              mock_Router, mock_StaticMapper):
+        config = {
+            'router': 'trie',
+        }
+
+        app = application.Application('global_conf', **config)
+
+        self.assertFalse(mock_Mapper.called)
+        mock_Router.assert_called_once_with()
+        mock_StaticMapper.assert_called_once_with(mock_Router.return_value)
+        self.assertEqual(app.mapper, mock_StaticMapper.return_value)
+
+    @mock.patch('appathy.routing.StaticMapper', return_value=mock.Mock())
+    @mock.patch('appathy.routing.CachingMapper')
+    @mock.patch('routes.Mapper', return_value=mock.Mock())
+    @mock.patch.object(utils, 'import_controller')
+    def test_init_match_cache(self, mock_import_controller, mock_Mapper,
+                              mock_CachingMapper, mock_StaticMapper):
+        config = {
+            'match_cache': '100',
+        }
+
+        app = application.Application('global_conf', **config)
+
+        mock_CachingMapper.assert_called_once_with(mock_Mapper.return_value,
+                                                   100)
+        mock_StaticMapper.assert_called_once_with(
+            mock_CachingMapper.return_value)
+        self.assertEqual(app.match_cache,
+                         mock_CachingMapper.return_value.cache)
+
+    @mock.patch('appathy.batch.Batch')
+    @mock.patch('appathy.routing.StaticMapper', return_value=mock.Mock())
+    @mock.patch('routes.Mapper', return_value=mock.Mock())
+    @mock.patch.object(utils, 'import_controller')
+    def test_init_batch(self, mock_import_controller, mock_Mapper,
+                        mock_StaticMapper, mock_Batch):
+        config = {
+            'batch': 'batch/',
+            'batch_limit': '20',
+        }
+
+        app = application.Application('global_conf', **config)
+
+        mock_Batch.assert_called_once_with(app, '/batch/', 20, 0, None)
+        self.assertEqual(app.batch, mock_Batch.return_value)
+
+    @mock.patch('appathy.batch.Batch')
+    @mock.patch('appathy.routing.StaticMapper', return_value=mock.Mock())
+    @mock.patch('routes.Mapper', return_value=mock.Mock())
+    @mock.patch.object(utils, 'import_controller')
+    def test_init_batch_workers(self, mock_import_controller, mock_Mapper,
+                                mock_StaticMapper, mock_Batch):
+        config = {
+            'batch': '/batch',
+            'batch_workers': '8',
+            'batch_concurrency': '4',
+        }
+
+        app = application.Application('global_conf', **config)
+
+        mock_Batch.assert_called_once_with(app, '/batch', 50, 8, 4)
+
+    @mock.patch('appathy.routing.StaticMapper', return_value=mock.Mock())
+    @mock.patch('routes.Mapper', return_value=mock.Mock())
+    @mock.patch.object(utils, 'import_controller')
+    def test_init_bad_router(self, mock_import_controller, mock_Mapper,
+                             mock_StaticMapper):
+        config = {
+            'router': 'nosuchrouter',
+        }
+
+        with self.assertRaises(exceptions.NoSuchRouter):
+            app = application.Application('global_conf', **config)
+
+        self.assertFalse(mock_Mapper.called)
+
+    @mock.patch.object(application.Application, '__init__', return_value=None)
+    @mock.patch.object(application.Application, 'dispatch',
+                       return_value='response')
+    def test_call(self, mock_dispatch, _mock_init):
+        app = application.Application()
+        app.mapper = mock.Mock(**{
+            'routematch.return_value': (dict(a=1), 'route'),
+        })
+        environ = {}
+
+        result = app(environ, 'start_response')
+
+        app.mapper.routematch.assert_called_once_with(environ=environ)
+        self.assertEqual(environ, {
+            'wsgiorg.routing_args': ((), dict(a=1)),
+        })
+        mock_dispatch.assert_called_once_with(environ, 'start_response')
+        self.assertEqual(result, 'response')
+
+    @mock.patch.object(application.Application, '__init__', return_value=None)
+    @mock.patch.object(application.Application, 'dispatch')
+    def test_call_batch(self, mock_dispatch, _mock_init):
+        app = application.Application()
+        app.mapper = mock.Mock()
+        app.batch = mock.Mock(path='/batch', return_value='response')
+        environ = dict(PATH_INFO='/batch')
+
+        result = app(environ, 'start_response')
+
+        app.batch.assert_called_once_with(environ, 'start_response')
+        self.assertFalse(app.mapper.routematch.called)
+        self.assertEqual(result, 'response')
+
+    @mock.patch.object(application.Application, '__init__', return_value=None)
+    @mock.patch.object(application.Application, 'dispatch',
+                       return_value='response')
+    def test_call_batch_nested(self, mock_dispatch, _mock_init):
+        app = application.Application()
+        app.mapper = mock.Mock(**{
+            'routematch.return_value': (dict(a=1), 'route'),
+        })
+        app.batch = mock.Mock(path='/batch')
+        environ = {'PATH_INFO': '/batch', 'appathy.batch': True}
+
+        result = app(environ, 'start_response')
+
+        self.assertFalse(app.batch.called)
+        mock_dispatch.assert_called_once_with(environ, 'start_response')
+        self.assertEqual(result, 'response')
+
+    @mock.patch.object(application.Application, '__init__', return_value=None)
+    @mock.patch.object(application.Application, 'dispatch')
+    def test_call_nomatch(self, mock_dispatch, _mock_init):
+        app = application.Application()
+        app.mapper = mock.Mock(**{'routematch.return_value': None})
+        start_response = mock.Mock()
+        environ = dict(REQUEST_METHOD='GET')
+
+        result = app(environ, start_response)
+
+        self.assertFalse(mock_dispatch.called)
+        self.assertFalse('wsgiorg.routing_args' in environ)
+        self.assertEqual(start_response.call_args[0][0], '404 Not Found')
 
     @staticmethod
     def make_request(method, url, controller, remote_addr=None,
@@ -291,3 +487,39 @@ class ApplicationTest(tests.TestCase):
         self.assertIsInstance(result, webob.exc.HTTPInternalServerError)
         self.assertEqual(str(result), 'The server has either erred or is '
                          'incapable of performing the requested operation.')
+
+
+class Formats(controller.Controller):
+    wsgi_name = 'formats'
+    value = 'old'
+
+    @controller.action('/formats/{id}/fmt', 'GET', cache=60, fmt='x')
+    def showfmt(self, req, id, fmt):
+        return dict(id=id, fmt=fmt, value=Formats.value)
+
+    @controller.action('/formats/{id}/fmt', 'PUT', invalidates=['showfmt'])
+    def update(self, req, id, body):
+        Formats.value = body['value']
+        return dict(value=body['value'])
+
+
+class ApplicationInvalidationTest(tests.TestCase):
+    def test_invalidates_keyword_routes(self):
+        for router in ('routes', 'trie'):
+            Formats.value = 'old'
+            with mock.patch.object(utils, 'import_controller',
+                                   return_value=Formats):
+                app = application.Application(
+                    {}, router=router, **{'resource.formats': 'formats'})
+
+            before = webob.Request.blank('/formats/1/fmt').get_response(app)
+            update = webob.Request.blank(
+                '/formats/1/fmt', method='PUT', body='{"value": "new"}',
+                content_type='application/json').get_response(app)
+            after = webob.Request.blank('/formats/1/fmt').get_response(app)
+
+            self.assertEqual(json.loads(before.body)['value'], 'old')
+            self.assertEqual(update.status_int, 200)
+            self.assertEqual(json.loads(after.body),
+                             dict(id='1', fmt='x', value='new'),
+                             'Stale response with router %r' % router)
@@ -0,0 +1,336 @@
+# Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+import json
+import threading
+import time
+
+from concurrent import futures
+import mock
+import webob
+import webob.exc
+
+from appathy import batch
+
+import tests
+
+
+def make_app(*responses):
+    """
+    Build a WSGI application which returns the given responses, in
+    order.  The environments it was called with are saved in its
+    `environs` attribute.
+    """
+
+    responses = list(responses)
+
+    def app(environ, start_response):
+        app.environs.append(environ)
+        return responses.pop(0)(environ, start_response)
+
+    app.environs = []
+    return app
+
+
+class IsJsonTest(tests.TestCase):
+    def test_is_json(self):
+        self.assertTrue(batch._is_json('application/json'))
+        self.assertTrue(batch._is_json('application/json; charset=UTF-8'))
+        self.assertTrue(batch._is_json('application/hal+json'))
+        self.assertFalse(batch._is_json('text/plain'))
+
+
+class BatchTest(tests.TestCase):
+    def make_request(self, subreqs, **kwargs):
+        return webob.Request.blank('/batch', method='POST',
+                                   body=json.dumps(subreqs), **kwargs)
+
+    def test_init(self):
+        handler = batch.Batch('app', '/batch')
+
+        self.assertEqual(handler.app, 'app')
+        self.assertEqual(handler.path, '/batch')
+        self.assertEqual(handler.limit, 50)
+
+    def test_init_workers(self):
+        handler = batch.Batch('app', '/batch', workers=4)
+
+        self.assertIsInstance(handler.pool, futures.ThreadPoolExecutor)
+        self.assertEqual(handler.concurrency, 4)
+        handler.pool.shutdown()
+
+    @mock.patch.object(batch, 'futures')
+    def test_init_concurrency(self, mock_futures):
+        handler = batch.Batch('app', '/batch', workers=4, concurrency=2)
+
+        mock_futures.ThreadPoolExecutor.assert_called_once_with(
+            max_workers=4)
+        self.assertEqual(handler.pool,
+                         mock_futures.ThreadPoolExecutor.return_value)
+        self.assertEqual(handler.concurrency, 2)
+
+    @mock.patch.object(batch, 'futures', None)
+    @mock.patch.object(batch.LOG, 'warning')
+    def test_init_no_futures(self, mock_warning):
+        handler = batch.Batch('app', '/batch', workers=4)
+
+        self.assertEqual(handler.pool, None)
+        self.assertTrue(mock_warning.called)
+
+    def test_call(self):
+        app = make_app(
+            webob.Response(body='{"a": 1}', content_type='application/json'),
+            webob.Response(status=201, body='created',
+                           content_type='text/plain', charset=None),
+        )
+        handler = batch.Batch(app, '/batch')
+        req = self.make_request([
+            dict(path='/widgets/1'),
+            dict(method='post', path='/widgets?a=b', body=dict(name='w')),
+        ])
+
+        resp = req.get_response(handler)
+
+        self.assertEqual(resp.status_int, 200)
+        self.assertEqual(resp.content_type, 'application/json')
+        self.assertEqual(json.loads(resp.body), [
+            dict(status=200, body=dict(a=1), headers=[
+                ['Content-Type', 'application/json; charset=UTF-8'],
+                ['Content-Length', '8'],
+            ]),
+            dict(status=201, body='created', headers=[
+                ['Content-Type', 'text/plain'],
+                ['Content-Length', '7'],
+            ]),
+        ])
+        self.assertEqual(app.environs[0]['REQUEST_METHOD'], 'GET')
+        self.assertEqual(app.environs[0]['PATH_INFO'], '/widgets/1')
+        self.assertEqual(app.environs[1]['REQUEST_METHOD'], 'POST')
+        self.assertEqual(app.environs[1]['PATH_INFO'], '/widgets')
+        self.assertEqual(app.environs[1]['QUERY_STRING'], 'a=b')
+        self.assertEqual(app.environs[1]['wsgi.input'].read(),
+                         '{"name": "w"}')
+
+    def test_call_get(self):
+        handler = batch.Batch(make_app(), '/batch')
+
+        resp = webob.Request.blank('/batch').get_response(handler)
+
+        self.assertEqual(resp.status_int, 405)
+        self.assertEqual(resp.allow, ('POST',))
+
+    def test_call_bad_json(self):
+        handler = batch.Batch(make_app(), '/batch')
+        req = webob.Request.blank('/batch', method='POST', body='[')
+
+        resp = req.get_response(handler)
+
+        self.assertEqual(resp.status_int, 400)
+
+    def test_call_not_list(self):
+        handler = batch.Batch(make_app(), '/batch')
+
+        resp = self.make_request(dict(path='/')).get_response(handler)
+
+        self.assertEqual(resp.status_int, 400)
+
+    def test_call_too_many(self):
+        handler = batch.Batch(make_app(), '/batch', limit=2)
+        req = self.make_request([dict(path='/')] * 3)
+
+        resp = req.get_response(handler)
+
+        self.assertEqual(resp.status_int, 400)
+        self.assertTrue('At most 2 requests' in resp.body)
+
+    def test_call_bad_subrequest(self):
+        app = make_app(webob.Response())
+        handler = batch.Batch(app, '/batch')
+        req = self.make_request([dict(path='/'), dict(method='GET')])
+
+        resp = req.get_response(handler)
+
+        # Nothing is run if any sub-request is invalid
+        self.assertEqual(resp.status_int, 400)
+        self.assertEqual(app.environs, [])
+
+    def test_environ(self):
+        handler = batch.Batch('app', '/batch')
+        base = {
+            'REQUEST_METHOD': 'POST',
+            'PATH_INFO': '/batch',
+            'QUERY_STRING': 'x=y',
+            'SERVER_NAME': 'localhost',
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': '100',
+            'HTTP_ACCEPT': 'application/json',
+            'HTTP_IF_NONE_MATCH': '"abc"',
+            'HTTP_RANGE': 'bytes=0-1',
+            'webob.adhoc_attrs': {},
+            'wsgiorg.routing_args': ((), {}),
+            'appathy.context': 'context',
+        }
+
+        result = handler.environ(base, dict(
+            method='put', path='/widgets/1', body=[1, 2],
+            headers={'If-Match': '"def"', 'Content-Type': 'text/json'}))
+
+        body = result.pop('wsgi.input')
+        self.assertEqual(body.read(), '[1, 2]')
+        self.assertEqual(result, {
+            'REQUEST_METHOD': 'PUT',
+            'PATH_INFO': '/widgets/1',
+            'QUERY_STRING': '',
+            'SERVER_NAME': 'localhost',
+            'CONTENT_TYPE': 'text/json',
+            'CONTENT_LENGTH': '6',
+            'HTTP_ACCEPT': 'application/json',
+            'HTTP_IF_MATCH': '"def"',
+            'appathy.context': 'context',
+            'appathy.batch': True,
+        })
+
+    def test_environ_nobody(self):
+        handler = batch.Batch('app', '/batch')
+
+        result = handler.environ({}, dict(path='/widgets'))
+
+        self.assertEqual(result['REQUEST_METHOD'], 'GET')
+        self.assertEqual(result['CONTENT_LENGTH'], '0')
+        self.assertFalse('CONTENT_TYPE' in result)
+        self.assertEqual(result['wsgi.input'].read(), '')
+
+    def test_environ_quoted(self):
+        handler = batch.Batch('app', '/batch')
+
+        result = handler.environ({}, dict(path=u'/things/a%20b\xe9?q=a%20b'))
+
+        self.assertEqual(result['PATH_INFO'], '/things/a b\xc3\xa9')
+        self.assertEqual(result['QUERY_STRING'], 'q=a%20b')
+
+    def test_environ_invalid(self):
+        handler = batch.Batch('app', '/batch')
+
+        for subreq in ('/path', dict(), dict(path=1),
+                       dict(path='/', method=1), dict(path='/', headers=[])):
+            self.assertRaises(webob.exc.HTTPBadRequest, handler.environ,
+                              {}, subreq)
+
+    def test_run(self):
+        handler = batch.Batch('app', '/batch')
+
+        with mock.patch.object(handler, 'call',
+                               side_effect=lambda e: 'result %s' % e):
+            result = handler.run(['a', 'b'])
+
+        self.assertEqual(result, ['result a', 'result b'])
+
+    def test_environ_context(self):
+        handler = batch.Batch('app', '/batch')
+        context = mock.Mock()
+        base = {'appathy.context': context}
+
+        with mock.patch('copy.copy', side_effect=lambda c: mock.Mock()):
+            result1 = handler.environ(base, dict(path='/a'))
+            result2 = handler.environ(base, dict(path='/b'))
+
+        self.assertNotEqual(result1['appathy.context'], context)
+        self.assertNotEqual(result1['appathy.context'],
+                            result2['appathy.context'])
+
+    def test_run_pool(self):
+        handler = batch.Batch('app', '/batch', workers=4, concurrency=2)
+        lock = threading.Lock()
+        running = [0, 0]
+
+        def call(environ):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            # Finish out of order
+            time.sleep(0.001 * (5 - environ))
+            with lock:
+                running[0] -= 1
+            return 'result %d' % environ
+
+        with mock.patch.object(handler, 'call', side_effect=call):
+            result = handler.run(range(5))
+        handler.pool.shutdown()
+
+        self.assertEqual(result, ['result %d' % i for i in range(5)])
+        self.assertEqual(running[1], 2)
+
+    def test_run_pool_error(self):
+        handler = batch.Batch('app', '/batch', workers=2)
+
+        with mock.patch.object(handler, 'call',
+                               side_effect=[ValueError(), 'result']):
+            self.assertRaises(ValueError, handler.run, ['a', 'b'])
+        handler.pool.shutdown()
+
+    def test_run_pool_single(self):
+        handler = batch.Batch('app', '/batch')
+        handler.pool = mock.Mock()
+
+        with mock.patch.object(handler, 'call', return_value='result'):
+            result = handler.run(['a'])
+
+        self.assertEqual(result, ['result'])
+        self.assertFalse(handler.pool.submit.called)
+
+    def test_call_sub_empty(self):
+        resp = webob.Response(status=204)
+        resp.headerlist = []
+        app = make_app(resp)
+        handler = batch.Batch(app, '/batch')
+
+        result = json.loads(handler.call(dict(REQUEST_METHOD='GET')))
+
+        self.assertEqual(result, dict(status=204, headers=[], body=None))
+
+    def test_call_sub_binary(self):
+        app = make_app(webob.Response(body='\xff\x00',
+                                      content_type='image/png'))
+        handler = batch.Batch(app, '/batch')
+
+        result = json.loads(handler.call(dict(REQUEST_METHOD='GET')))
+
+        self.assertEqual(result['body'], '/wA=')
+        self.assertEqual(result['encoding'], 'base64')
+
+    def test_call_sub_invalid_json(self):
+        app = make_app(webob.Response(body='not json',
+                                      content_type='application/json'))
+        handler = batch.Batch(app, '/batch')
+
+        result = json.loads(handler.call(dict(REQUEST_METHOD='GET')))
+
+        self.assertEqual(result['body'], 'not json')
+
+    def test_call_sub_closes(self):
+        app_iter = mock.MagicMock()
+        app_iter.__iter__.return_value = iter(['a'])
+
+        def app(environ, start_response):
+            start_response('200 OK', [])
+            return app_iter
+
+        handler = batch.Batch(app, '/batch')
+
+        result = json.loads(handler.call(dict(REQUEST_METHOD='GET')))
+
+        self.assertEqual(result['body'], 'a')
+        app_iter.close.assert_called_once_with()
@@ -0,0 +1,443 @@
+# Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+
+import mock
+import webob
+
+from appathy import cache
+
+import tests
+
+
+class BackendTest(tests.TestCase):
+    def test_interface(self):
+        backend = cache.Backend()
+
+        self.assertRaises(NotImplementedError, backend.get, 'key')
+        self.assertRaises(NotImplementedError, backend.set, 'key', 'entry',
+                          10)
+        self.assertRaises(NotImplementedError, backend.delete, 'key')
+        self.assertRaises(NotImplementedError, backend.clear)
+        self.assertEqual(backend.stats(), {})
+
+
+class MemoryBackendTest(tests.TestCase):
+    def test_lru(self):
+        backend = cache.MemoryBackend(2)
+
+        backend.set('a', 'entry_a', 10)
+        backend.set('b', 'entry_b', 10)
+        self.assertEqual(backend.get('a'), 'entry_a')
+        backend.set('c', 'entry_c', 10)
+
+        self.assertEqual(backend.get('a'), 'entry_a')
+        self.assertEqual(backend.get('b'), None)
+        self.assertEqual(backend.get('c'), 'entry_c')
+        self.assertEqual(backend.stats(), dict(size=2, length=2,
+                                               evictions=1))
+
+    def test_delete_clear(self):
+        backend = cache.MemoryBackend(5)
+        backend.set('a', 'entry_a', 10)
+        backend.set('b', 'entry_b', 10)
+
+        backend.delete('a')
+        self.assertEqual(backend.get('a'), None)
+        self.assertEqual(backend.get('b'), 'entry_b')
+
+        backend.clear()
+        self.assertEqual(backend.get('b'), None)
+
+
+class ResponseCacheTest(tests.TestCase):
+    def make_response(self, **kwargs):
+        return webob.Response(body='body', content_type='text/plain',
+                              **kwargs)
+
+    def test_init(self):
+        rcache = cache.ResponseCache()
+
+        self.assertEqual(rcache.ttl, 60)
+        self.assertEqual(rcache.max_size, 1024 * 1024)
+        self.assertIsInstance(rcache.backend, cache.MemoryBackend)
+        self.assertEqual(rcache.backend.cache.size, 1024)
+
+    def test_init_backend(self):
+        rcache = cache.ResponseCache(10, backend='backend')
+
+        self.assertEqual(rcache.ttl, 10)
+        self.assertEqual(rcache.backend, 'backend')
+
+    @mock.patch('time.time', return_value=1000.0)
+    def test_set_get(self, mock_time):
+        rcache = cache.ResponseCache(10)
+        req = webob.Request.blank('/')
+
+        self.assertEqual(rcache.set('key', self.make_response()), True)
+        resp = rcache.get('key', req)
+
+        self.assertEqual(rcache.backend.get('key').expires, 1010.0)
+        self.assertEqual(resp.status_int, 200)
+        self.assertEqual(resp.content_type, 'text/plain')
+        self.assertEqual(resp.body, 'body')
+        self.assertEqual(resp.request, req)
+        self.assertEqual(resp.conditional_response, True)
+        self.assertEqual(rcache.stats(), dict(
+            ttl=10, hits=1, misses=0, stores=1,
+            size=1024, length=1, evictions=0,
+        ))
+
+    def test_get_copies(self):
+        rcache = cache.ResponseCache(10)
+        rcache.set('key', self.make_response())
+
+        resp = rcache.get('key', webob.Request.blank('/'))
+        resp.headers['X-Test'] = 'test'
+        resp = rcache.get('key', webob.Request.blank('/'))
+
+        self.assertFalse('X-Test' in resp.headers)
+
+    def test_get_miss(self):
+        rcache = cache.ResponseCache(10)
+
+        self.assertEqual(rcache.get('key', 'req'), None)
+        self.assertEqual(rcache.misses, 1)
+
+    @mock.patch('time.time')
+    def test_get_expired(self, mock_time):
+        rcache = cache.ResponseCache(10)
+        mock_time.return_value = 1000.0
+        rcache.set('key', self.make_response())
+
+        mock_time.return_value = 1010.0
+        self.assertEqual(rcache.get('key', 'req'), None)
+        self.assertEqual(rcache.hits, 0)
+        self.assertEqual(rcache.misses, 1)
+
+    @mock.patch('time.time')
+    def test_get_grace(self, mock_time):
+        rcache = cache.ResponseCache(10, grace=30)
+        mock_time.return_value = 1000.0
+        rcache.set('key', self.make_response())
+
+        mock_time.return_value = 1015.0
+        self.assertEqual(rcache.get('key', 'req'), None)
+        self.assertEqual(rcache.stale_hits, 0)
+
+    @mock.patch('time.time')
+    def test_lookup(self, mock_time):
+        rcache = cache.ResponseCache(10, grace=30)
+        mock_time.return_value = 1000.0
+        rcache.set('key', self.make_response())
+
+        resp, refresh = rcache.lookup('key', webob.Request.blank('/'))
+
+        self.assertEqual(resp.body, 'body')
+        self.assertEqual(refresh, False)
+        self.assertEqual(rcache.hits, 1)
+
+    @mock.patch('time.time')
+    def test_lookup_stale(self, mock_time):
+        rcache = cache.ResponseCache(10, grace=30)
+        mock_time.return_value = 1000.0
+        rcache.set('key', self.make_response())
+
+        mock_time.return_value = 1015.0
+        resp1, refresh1 = rcache.lookup('key', webob.Request.blank('/'))
+        mock_time.return_value = 1020.0
+        resp2, refresh2 = rcache.lookup('key', webob.Request.blank('/'))
+
+        self.assertEqual(resp1.body, 'body')
+        self.assertEqual(refresh1, True)
+        self.assertEqual(resp2.body, 'body')
+        self.assertEqual(refresh2, False)
+        self.assertEqual(rcache.stats(), dict(
+            ttl=10, hits=0, misses=0, stores=1, grace=30, stale_hits=2,
+            max_stale_age=10.0, refreshes=0, refresh_errors=0,
+            refreshing=1, size=1024, length=1, evictions=0,
+        ))
+
+    @mock.patch('time.time')
+    def test_lookup_expired(self, mock_time):
+        rcache = cache.ResponseCache(10, grace=30)
+        mock_time.return_value = 1000.0
+        rcache.set('key', self.make_response())
+
+        mock_time.return_value = 1040.0
+        self.assertEqual(rcache.lookup('key', 'req'), (None, False))
+        self.assertEqual(rcache.misses, 1)
+
+    def test_set_grace(self):
+        backend = mock.Mock()
+        rcache = cache.ResponseCache(10, backend=backend, grace=30)
+
+        rcache.set('key', self.make_response())
+
+        self.assertEqual(backend.set.call_args[0][2], 40)
+
+    @mock.patch('threading.Thread')
+    def test_refresh(self, mock_Thread):
+        rcache = cache.ResponseCache(10, grace=30)
+
+        rcache.refresh('key', 'func')
+
+        mock_Thread.assert_called_once_with(target=rcache._refresh,
+                                            args=('key', 'func'))
+        self.assertEqual(mock_Thread.return_value.daemon, True)
+        mock_Thread.return_value.start.assert_called_once_with()
+
+    def test_refresh_run(self):
+        rcache = cache.ResponseCache(10, grace=30)
+        rcache._refreshing.add('key')
+
+        rcache.refresh('key', lambda: webob.Response(body='new'))
+        while rcache._refreshing:
+            time.sleep(0.001)
+
+        self.assertEqual(rcache.backend.get('key').body, 'new')
+        self.assertEqual(rcache.refreshes, 1)
+
+    def test_refresh_uncacheable(self):
+        rcache = cache.ResponseCache(10, grace=30)
+        rcache.set('key', self.make_response())
+        rcache._refreshing.add('key')
+
+        rcache._refresh('key', lambda: self.make_response(status=404))
+
+        self.assertEqual(rcache.backend.get('key'), None)
+        self.assertEqual(rcache.refreshes, 1)
+        self.assertEqual(rcache._refreshing, set())
+
+    def test_refresh_uncacheable_closes(self):
+        rcache = cache.ResponseCache(10, grace=30, max_size=1)
+        rcache._refreshing.add('key')
+        app_iter = mock.MagicMock()
+        app_iter.__iter__.return_value = iter(['ab'])
+
+        rcache._refresh('key', lambda: webob.Response(app_iter=app_iter))
+
+        app_iter.close.assert_called_once_with()
+        self.assertEqual(rcache.backend.get('key'), None)
+
+    @mock.patch.object(cache.LOG, 'exception')
+    def test_refresh_error(self, mock_exception):
+        rcache = cache.ResponseCache(10, grace=30)
+        rcache.set('key', self.make_response())
+        rcache._refreshing.add('key')
+        func = mock.Mock(side_effect=ValueError())
+
+        rcache._refresh('key', func)
+
+        self.assertTrue(mock_exception.called)
+        self.assertNotEqual(rcache.backend.get('key'), None)
+        self.assertEqual(rcache.refreshes, 0)
+        self.assertEqual(rcache.refresh_errors, 1)
+        self.assertEqual(rcache._refreshing, set())
+
+    def test_get_range(self):
+        rcache = cache.ResponseCache(10)
+        rcache.set('key', self.make_response(etag='abc'))
+
+        resp = rcache.get('key', webob.Request.blank('/', range='bytes=1-2'))
+        result = webob.Request.blank('/', range='bytes=1-2').get_response(
+            resp)
+
+        self.assertEqual(result.status_int, 206)
+        self.assertEqual(result.body, 'od')
+
+    def test_set_uncacheable(self):
+        rcache = cache.ResponseCache(10)
+
+        self.assertEqual(rcache.set('key', self.make_response(status=404)),
+                         False)
+        self.assertEqual(rcache.set('key', self.make_response(
+            headerlist=[('Set-Cookie', 'a=b')])), False)
+        self.assertEqual(rcache.stores, 0)
+        self.assertEqual(len(rcache.backend.cache), 0)
+
+    def test_set_streamed(self):
+        rcache = cache.ResponseCache(10, max_size=4)
+        app_iter = mock.MagicMock()
+        app_iter.__iter__.return_value = iter(['ab', 'cd'])
+        resp = webob.Response(app_iter=app_iter)
+
+        self.assertEqual(rcache.set('key', resp), True)
+
+        app_iter.close.assert_called_once_with()
+        self.assertEqual(resp.app_iter, ['abcd'])
+        self.assertEqual(resp.content_length, 4)
+        self.assertEqual(rcache.get('key', webob.Request.blank('/')).body,
+                         'abcd')
+
+    def test_set_streamed_too_large(self):
+        rcache = cache.ResponseCache(10, max_size=3)
+        app_iter = mock.MagicMock()
+        app_iter.__iter__.return_value = iter(['ab', 'cd', 'ef'])
+        resp = webob.Response(app_iter=app_iter)
+
+        self.assertEqual(rcache.set('key', resp), False)
+
+        self.assertFalse(app_iter.close.called)
+        self.assertEqual(list(resp.app_iter), ['ab', 'cd', 'ef'])
+        resp.app_iter.close()
+        app_iter.close.assert_called_once_with()
+        self.assertEqual(rcache.stores, 0)
+
+    def test_set_streamed_unbuffered(self):
+        rcache = cache.ResponseCache(10, max_size=0)
+        resp = webob.Response(app_iter=iter(['a', 'b']))
+
+        self.assertEqual(rcache.set('key', resp), False)
+        self.assertEqual(list(resp.app_iter), ['a', 'b'])
+
+    def test_delete_clear(self):
+        rcache = cache.ResponseCache(10)
+        rcache.set('a', self.make_response())
+        rcache.set('b', self.make_response())
+
+        rcache.delete('a')
+        self.assertEqual(rcache.get('a', 'req'), None)
+
+        rcache.clear()
+        self.assertEqual(rcache.get('b', 'req'), None)
+
+
+class CoalescerTest(tests.TestCase):
+    def make_response(self, **kwargs):
+        return webob.Response(body='body', content_type='text/plain',
+                              **kwargs)
+
+    def start_leader(self, coal, func):
+        """
+        Start a leader for 'key' in another thread, which calls `func`
+        once a follower is waiting.  Returns the thread.
+        """
+
+        def wait_follower():
+            while not coal.followers:
+                time.sleep(0.001)
+            return func()
+
+        def leader():
+            try:
+                coal.run('key', webob.Request.blank('/'), wait_follower)
+            except ValueError:
+                pass
+
+        thread = threading.Thread(target=leader)
+        thread.start()
+        while 'key' not in coal._flights:
+            time.sleep(0.001)
+        return thread
+
+    def test_init(self):
+        coal = cache.Coalescer()
+
+        self.assertEqual(coal.timeout, 10)
+        self.assertEqual(coal.max_size, 1024 * 1024)
+        self.assertEqual(coal.stats(), dict(
+            timeout=10, leaders=0, followers=0, timeouts=0, fallbacks=0,
+            in_flight=0,
+        ))
+
+    def test_run(self):
+        coal = cache.Coalescer()
+        resp = self.make_response()
+
+        result = coal.run('key', 'req', lambda: resp)
+
+        self.assertEqual(result, resp)
+        self.assertEqual(coal.leaders, 1)
+        self.assertEqual(coal._flights, {})
+
+    def test_run_error(self):
+        coal = cache.Coalescer()
+        func = mock.Mock(side_effect=ValueError())
+
+        self.assertRaises(ValueError, coal.run, 'key', 'req', func)
+        self.assertEqual(coal._flights, {})
+
+    def test_run_follower(self):
+        coal = cache.Coalescer()
+        thread = self.start_leader(
+            coal, lambda: self.make_response(etag='abc'))
+        func = mock.Mock()
+
+        req = webob.Request.blank('/')
+        result = coal.run('key', req, func)
+        thread.join()
+
+        self.assertFalse(func.called)
+        self.assertEqual(result.body, 'body')
+        self.assertEqual(result.etag, 'abc')
+        self.assertEqual(result.request, req)
+        self.assertEqual(result.conditional_response, True)
+        self.assertEqual(coal.stats(), dict(
+            timeout=10, leaders=1, followers=1, timeouts=0, fallbacks=0,
+            in_flight=0,
+        ))
+
+    def test_run_follower_timeout(self):
+        coal = cache.Coalescer(timeout=0.01)
+        release = threading.Event()
+        thread = self.start_leader(coal, lambda: release.wait() and
+                                   self.make_response())
+
+        result = coal.run('key', 'req', lambda: 'own')
+        release.set()
+        thread.join()
+
+        self.assertEqual(result, 'own')
+        self.assertEqual(coal.timeouts, 1)
+        self.assertEqual(coal.fallbacks, 1)
+
+    def test_run_follower_error(self):
+        coal = cache.Coalescer()
+        thread = self.start_leader(coal, mock.Mock(side_effect=ValueError()))
+
+        result = coal.run('key', 'req', lambda: 'own')
+        thread.join()
+
+        self.assertEqual(result, 'own')
+        self.assertEqual(coal.timeouts, 0)
+        self.assertEqual(coal.fallbacks, 1)
+
+    def test_run_follower_streamed(self):
+        coal = cache.Coalescer()
+        thread = self.start_leader(coal, lambda: webob.Response(
+            app_iter=iter(['a', 'b'])))
+        func = mock.Mock()
+
+        result = coal.run('key', webob.Request.blank('/'), func)
+        thread.join()
+
+        self.assertFalse(func.called)
+        self.assertEqual(result.body, 'ab')
+        self.assertEqual(coal.fallbacks, 0)
+
+    def test_run_follower_unshareable(self):
+        coal = cache.Coalescer(max_size=1)
+        thread = self.start_leader(coal, lambda: webob.Response(
+            app_iter=iter(['a', 'b'])))
+
+        result = coal.run('key', 'req', lambda: 'own')
+        thread.join()
+
+        self.assertEqual(result, 'own')
+        self.assertEqual(coal.fallbacks, 1)
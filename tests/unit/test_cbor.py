@@ -0,0 +1,201 @@
+# Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+import collections
+import math
+
+from appathy import cbor
+
+import tests
+
+
+# Examples from RFC 8949, Appendix A, which both encode and decode
+# exactly
+EXAMPLES = [
+    (0, '00'),
+    (1, '01'),
+    (10, '0a'),
+    (23, '17'),
+    (24, '1818'),
+    (25, '1819'),
+    (100, '1864'),
+    (1000, '1903e8'),
+    (1000000, '1a000f4240'),
+    (1000000000000, '1b000000e8d4a51000'),
+    (18446744073709551615, '1bffffffffffffffff'),
+    (18446744073709551616, 'c249010000000000000000'),
+    (-18446744073709551616, '3bffffffffffffffff'),
+    (-18446744073709551617, 'c349010000000000000000'),
+    (-1, '20'),
+    (-10, '29'),
+    (-100, '3863'),
+    (-1000, '3903e7'),
+    (1.1, 'fb3ff199999999999a'),
+    (1.0e+300, 'fb7e37e43c8800759c'),
+    (-4.1, 'fbc010666666666666'),
+    (False, 'f4'),
+    (True, 'f5'),
+    (None, 'f6'),
+    (u'', '60'),
+    (u'a', '6161'),
+    (u'IETF', '6449455446'),
+    (u'"\\', '62225c'),
+    (u'\xfc', '62c3bc'),
+    (u'\u6c34', '63e6b0b4'),
+    ([], '80'),
+    ([1, 2, 3], '83010203'),
+    ([1, [2, 3], [4, 5]], '8301820203820405'),
+    (range(1, 26), '98190102030405060708090a0b0c0d0e0f101112131415161718'
+     '181819'),
+    ({}, 'a0'),
+    ({1: 2, 3: 4}, 'a201020304'),
+    ([u'a', {u'b': u'c'}], '826161a161626163'),
+]
+
+# Examples from RFC 8949, Appendix A, which only decode
+DECODE_EXAMPLES = [
+    (0.0, 'f90000'),
+    (-0.0, 'f98000'),
+    (1.0, 'f93c00'),
+    (1.5, 'f93e00'),
+    (65504.0, 'f97bff'),
+    (5.960464477539063e-8, 'f90001'),
+    (0.00006103515625, 'f90400'),
+    (-4.0, 'f9c400'),
+    (100000.0, 'fa47c35000'),
+    (3.4028234663852886e+38, 'fa7f7fffff'),
+    (float('inf'), 'f97c00'),
+    (float('-inf'), 'f9fc00'),
+    (None, 'f7'),
+    ('', '40'),
+    ('\x01\x02\x03\x04', '4401020304'),
+    (u'2013-03-21T20:04:00Z',
+     'c074323031332d30332d32315432303a30343a30305a'),
+    (1363896240, 'c11a514b67b0'),
+    ('\x01\x02\x03\x04', 'd74401020304'),
+    ('\x01\x02\x03\x04\x05', '5f42010243030405ff'),
+    (u'streaming', '7f657374726561646d696e67ff'),
+    ([], '9fff'),
+    ([1, [2, 3], [4, 5]], '9f018202039f0405ffff'),
+    ([1, [2, 3], [4, 5]], '83018202039f0405ff'),
+    (range(1, 26), '9f0102030405060708090a0b0c0d0e0f101112131415161718'
+     '181819ff'),
+    ({u'a': 1, u'b': [2, 3]}, 'bf61610161629f0203ffff'),
+    ({u'Fun': True, u'Amt': -2}, 'bf6346756ef563416d7421ff'),
+]
+
+
+class EncodeTest(tests.TestCase):
+    def test_examples(self):
+        for value, expected in EXAMPLES:
+            self.assertEqual(cbor.dumps(value).encode('hex'), expected)
+
+    def test_str(self):
+        self.assertEqual(cbor.dumps('IETF'), 'dIETF')
+        self.assertEqual(cbor.dumps('\xff\x00'), 'B\xff\x00')
+
+    def test_bytes(self):
+        self.assertEqual(cbor.dumps(bytearray('\x01\x02')), 'B\x01\x02')
+        self.assertEqual(cbor.dumps(buffer('\x01\x02')), 'B\x01\x02')
+
+    def test_tuple(self):
+        self.assertEqual(cbor.dumps((1, 2, 3)), '\x83\x01\x02\x03')
+
+    def test_iterator(self):
+        def gen():
+            yield 1
+            yield 2
+
+        self.assertEqual(cbor.dumps(gen()), '\x9f\x01\x02\xff')
+
+    def test_subclasses(self):
+        class MyInt(int):
+            pass
+
+        class MyUnicode(unicode):
+            pass
+
+        value = collections.OrderedDict([(MyUnicode(u'a'), MyInt(1))])
+
+        self.assertEqual(cbor.dumps(value), '\xa1\x61a\x01')
+
+    def test_unserializable(self):
+        self.assertRaises(TypeError, cbor.dumps, object())
+        self.assertRaises(TypeError, cbor.dumps, set([1]))
+
+    def test_header(self):
+        self.assertEqual(cbor.header(4, 5), '\x85')
+        self.assertEqual(cbor.header(4, 500), '\x99\x01\xf4')
+
+
+class DecodeTest(tests.TestCase):
+    def test_examples(self):
+        for expected, data in EXAMPLES:
+            self.assertEqual(cbor.loads(data.decode('hex')), expected)
+
+    def test_decode_examples(self):
+        for expected, data in DECODE_EXAMPLES:
+            result = cbor.loads(data.decode('hex'))
+            self.assertEqual(result, expected)
+            self.assertEqual(type(result), type(expected))
+
+    def test_negative_zero(self):
+        result = cbor.loads('f98000'.decode('hex'))
+
+        self.assertEqual(math.copysign(1.0, result), -1.0)
+
+    def test_nan(self):
+        for data in ('f97e00', 'fa7fc00000', 'fb7ff8000000000000'):
+            self.assertTrue(math.isnan(cbor.loads(data.decode('hex'))))
+
+    def test_bytearray(self):
+        self.assertEqual(cbor.loads(bytearray('\x83\x01\x02\x03')),
+                         [1, 2, 3])
+
+    def test_malformed(self):
+        for data in ('', '18', '1a0000', '62c3', '8301', 'a10102a1',
+                     '9f01', '1c', 'fc', 'ff', '0001', '62c328',
+                     '5f6161ff', 'a1800102', '3f',
+                     '9b8bc0f3d370ac68c5f7a6', 'bbffffffffffffffff'):
+            self.assertRaises(ValueError, cbor.loads, data.decode('hex'))
+
+    def test_nesting(self):
+        depth = cbor.MAX_DEPTH
+
+        self.assertEqual(cbor.loads('\x81' * depth + '\x80'),
+                         reduce(lambda v, i: [v], range(depth), []))
+        for prefix in ('\x81', '\xa1\x00', '\x9f', '\xc6'):
+            self.assertRaises(ValueError, cbor.loads,
+                              prefix * (depth + 1) + '\x80')
+
+
+class RoundTripTest(tests.TestCase):
+    def test_round_trip(self):
+        value = dict(
+            id=1234,
+            name=u'caf\xe9',
+            tags=[u'a', u'b', u'c'],
+            price=19.95,
+            owner=dict(id=7, name=u'someone'),
+            active=True,
+            deleted=False,
+            parent=None,
+            big=-2 ** 100,
+            blob='\x00\xff\xfe',
+            items=[dict(i=i) for i in range(300)],
+        )
+
+        self.assertEqual(cbor.loads(cbor.dumps(value)), value)
@@ -22,6 +22,8 @@ import webob.exc
 from appathy import controller
 from appathy import exceptions
 from appathy import response
+from appathy import types
+from appathy import utils
 
 import tests
 
@@ -177,6 +179,48 @@ class ActionTest(tests.TestCase):
         self.assertEqual(func._wsgi_code, 404)
         self.assertFalse(hasattr(func, '_wsgi_keywords'))
 
+    def test_validator(self):
+        @controller.action(validator='validator')
+        def func():
+            pass
+
+        self.assertEqual(func._wsgi_action, True)
+        self.assertEqual(func._wsgi_validator, 'validator')
+        self.assertFalse(hasattr(func, '_wsgi_keywords'))
+
+    def test_cache(self):
+        @controller.action(cache=30)
+        def func():
+            pass
+
+        self.assertEqual(func._wsgi_action, True)
+        self.assertEqual(func._wsgi_cache, 30)
+        self.assertFalse(hasattr(func, '_wsgi_keywords'))
+
+    def test_coalesce(self):
+        @controller.action(coalesce=5)
+        def func():
+            pass
+
+        self.assertEqual(func._wsgi_action, True)
+        self.assertEqual(func._wsgi_coalesce, 5)
+        self.assertFalse(hasattr(func, '_wsgi_keywords'))
+
+    def test_invalidates(self):
+        @controller.action(invalidates=('show', 'index'))
+        def func():
+            pass
+
+        self.assertEqual(func._wsgi_invalidates, ['show', 'index'])
+        self.assertFalse(hasattr(func, '_wsgi_keywords'))
+
+    def test_invalidates_string(self):
+        @controller.action(invalidates='show')
+        def func():
+            pass
+
+        self.assertEqual(func._wsgi_invalidates, ['show'])
+
     def test_keywords(self):
         @controller.action(action='action', controller='controller',
                            kwarg1='kwarg1', kwarg2='kwarg2')
@@ -380,6 +424,23 @@ class ControllerTest(tests.TestCase):
         with self.assertRaises(exceptions.IncompleteController):
             cont = TestController()
 
+    def test_default_translators(self):
+        class TestController(controller.Controller):
+            wsgi_name = 'name'
+
+        @types.serializers(json='json serializer')
+        class OverrideController(controller.Controller):
+            wsgi_name = 'name'
+
+        self.assertEqual(TestController._wsgi_serializers,
+                         dict(json=types.JSONSerializer))
+        self.assertEqual(TestController._wsgi_deserializers,
+                         dict(json=types.JSONDeserializer))
+        self.assertEqual(OverrideController._wsgi_serializers,
+                         dict(json='json serializer'))
+        self.assertEqual(OverrideController._wsgi_deserializers,
+                         dict(json=types.JSONDeserializer))
+
     @mock.patch.object(controller.Controller, '_route')
     def test_init(self, mock_route):
         class TestController(controller.Controller):
@@ -769,6 +830,61 @@ class ControllerTest(tests.TestCase):
             action4='descriptor 4',
         ))
 
+    @mock.patch.object(controller.Controller, '_route')
+    def test_extend_frozen(self, mock_route):
+        class TestController(controller.Controller):
+            wsgi_name = 'name'
+
+        extensions = mock.Mock(
+            wsgi_actions=dict(action1='action 1'),
+            wsgi_extensions=dict(action1=['ext 1']),
+        )
+
+        cont = TestController()
+        cont.wsgi_descriptors = utils.FrozenDict()
+
+        self.assertRaises(exceptions.FrozenController, cont.wsgi_extend,
+                          extensions)
+        self.assertEqual(cont.wsgi_actions, {})
+        self.assertEqual(cont.wsgi_extensions, {})
+        self.assertFalse(mock_route.called)
+
+    @mock.patch('appathy.actions.ActionDescriptor',
+                side_effect=lambda m, e, r, i: mock.Mock(name=m))
+    def test_freeze(self, mock_ActionDescriptor):
+        class TestController(controller.Controller):
+            wsgi_name = 'name'
+
+        cont = TestController()
+        cont.wsgi_actions.update(action1='action 1', action2='action 2')
+        cont.wsgi_extensions['action2'] = ['ext 2']
+        cont.wsgi_descriptors['action1'] = 'stale'
+
+        cont.wsgi_freeze()
+
+        self.assertTrue(isinstance(cont.wsgi_descriptors, utils.FrozenDict))
+        self.assertEqual(sorted(cont.wsgi_descriptors), ['action1', 'action2'])
+        for descriptor in cont.wsgi_descriptors.values():
+            descriptor.prepare.assert_called_once_with()
+        mock_ActionDescriptor.assert_has_calls([
+            mock.call('action 1', [], response.ResponseObject, []),
+            mock.call('action 2', ['ext 2'], response.ResponseObject, []),
+        ], any_order=True)
+
+    @mock.patch('appathy.actions.ActionDescriptor')
+    def test_get_action_frozen(self, mock_ActionDescriptor):
+        class TestController(controller.Controller):
+            wsgi_name = 'name'
+
+        cont = TestController()
+        cont.wsgi_actions['action1'] = 'action 1'
+        cont.wsgi_descriptors = utils.FrozenDict(action1='frozen')
+
+        result = cont._get_action('action1')
+
+        self.assertEqual(result, 'frozen')
+        self.assertFalse(mock_ActionDescriptor.called)
+
     @mock.patch('appathy.actions.ActionDescriptor')
     def test_get_action_undeclared(self, mock_ActionDescriptor):
         class TestController(controller.Controller):
@@ -807,7 +923,8 @@ class ControllerTest(tests.TestCase):
 
         self.assertEqual(result, 'descriptor')
         mock_ActionDescriptor.assert_called_once_with('action 1', [],
-                                                      response.ResponseObject)
+                                                      response.ResponseObject,
+                                                      [])
 
     @mock.patch('appathy.actions.ActionDescriptor', return_value='descriptor')
     def test_get_action_generate_alt_resp_type(self, mock_ActionDescriptor):
@@ -822,83 +939,100 @@ class ControllerTest(tests.TestCase):
 
         self.assertEqual(result, 'descriptor')
         mock_ActionDescriptor.assert_called_once_with('action 1', [],
-                                                      'response type')
-
-    @mock.patch.object(controller.Controller, '_get_action')
-    def test_call_noaction(self, mock_get_action):
-        mock_get_action.return_value = None
+                                                      'response type', [])
 
+    @mock.patch('appathy.actions.ActionDescriptor', return_value='descriptor')
+    @mock.patch.object(controller.Controller, '_invalidator',
+                       side_effect=lambda a: 'invalidate %s' % a)
+    def test_build_action_invalidators(self, mock_invalidator,
+                                       mock_ActionDescriptor):
         class TestController(controller.Controller):
             wsgi_name = 'name'
 
         cont = TestController()
+        cont.wsgi_actions.update(
+            update=mock.Mock(spec=['_wsgi_path']),
+            show=mock.Mock(spec=['_wsgi_cache'], _wsgi_cache=10),
+            index=mock.Mock(spec=[]),
+        )
 
-        self.assertRaises(webob.exc.HTTPNotFound, cont, 'req',
-                          dict(action='action'))
-        mock_get_action.assert_called_once_with('action')
+        result = cont._build_action('update')
 
-    @mock.patch.object(controller.Controller, '_get_action')
-    def test_call_nobody_premature(self, mock_get_action):
-        mock_response = mock.Mock(**{'_serialize.return_value': 'serialized'})
-        mock_descriptor = mock.Mock(**{
-            'deserialize_request.return_value': None,
-            'pre_process.return_value': ('pre-response', 'post_list'),
-            'post_process.return_value': mock_response,
-        })
-        mock_get_action.return_value = mock_descriptor
+        self.assertEqual(result, 'descriptor')
+        mock_ActionDescriptor.assert_called_once_with(
+            cont.wsgi_actions['update'], [], response.ResponseObject,
+            ['invalidate show'])
 
+    @mock.patch('appathy.actions.ActionDescriptor', return_value='descriptor')
+    @mock.patch.object(controller.Controller, '_invalidator',
+                       side_effect=lambda a: 'invalidate %s' % a)
+    def test_build_action_invalidates(self, mock_invalidator,
+                                      mock_ActionDescriptor):
         class TestController(controller.Controller):
             wsgi_name = 'name'
 
         cont = TestController()
+        cont.wsgi_actions.update(
+            update=mock.Mock(_wsgi_invalidates=['other', 'missing']),
+            show=mock.Mock(spec=['_wsgi_cache'], _wsgi_cache=10),
+            other=mock.Mock(spec=['_wsgi_cache'], _wsgi_cache=10),
+        )
 
-        result = cont('req', dict(action='action'))
+        cont._build_action('update')
 
-        mock_get_action.assert_called_once_with('action')
-        mock_descriptor.assert_has_calls([
-            mock.call.deserialize_request('req'),
-            mock.call.pre_process('req', {}),
-            mock.call.post_process('post_list', 'req', 'pre-response', {}),
-        ])
-        mock_response._serialize.assert_called_once_with()
-        self.assertEqual(result, 'serialized')
+        mock_ActionDescriptor.assert_called_once_with(
+            cont.wsgi_actions['update'], [], response.ResponseObject,
+            ['invalidate other'])
 
     @mock.patch.object(controller.Controller, '_get_action')
-    def test_call_withbody_premature(self, mock_get_action):
-        mock_response = mock.Mock(**{'_serialize.return_value': 'serialized'})
-        mock_descriptor = mock.Mock(**{
-            'deserialize_request.return_value': 'body',
-            'pre_process.return_value': ('pre-response', 'post_list'),
-            'post_process.return_value': mock_response,
-        })
-        mock_get_action.return_value = mock_descriptor
+    def test_invalidator(self, mock_get_action):
+        class TestController(controller.Controller):
+            wsgi_name = 'name'
+            wsgi_path_prefix = '/tenant/{tenant_id}'
 
+        cont = TestController()
+        cont.wsgi_actions['show'] = mock.Mock(
+            __name__='show', _wsgi_path=None, _wsgi_keywords=dict(a=1))
+
+        invalidator = cont._invalidator('show')
+        invalidator(dict(tenant_id='t', id='5', body='body'))
+
+        mock_get_action.assert_called_once_with('show')
+        mock_get_action.return_value.uncache.assert_called_once_with(
+            dict(tenant_id='t', id='5', a=1))
+
+    def test_route_path(self):
         class TestController(controller.Controller):
             wsgi_name = 'name'
+            wsgi_path_prefix = '/prefix'
 
         cont = TestController()
 
-        result = cont('req', dict(action='action'))
+        self.assertEqual(cont._route_path(mock.Mock(_wsgi_path='/path')),
+                         ('/prefix/path', None))
+        self.assertEqual(cont._route_path(mock.Mock(__name__='show',
+                                                    _wsgi_path=None)),
+                         ('/prefix/name/{id}', ['GET']))
+        self.assertEqual(cont._route_path(mock.Mock(__name__='other',
+                                                    _wsgi_path=None)),
+                         (None, None))
 
+    @mock.patch.object(controller.Controller, '_get_action')
+    def test_call_noaction(self, mock_get_action):
+        mock_get_action.return_value = None
+
+        class TestController(controller.Controller):
+            wsgi_name = 'name'
+
+        cont = TestController()
+
+        self.assertRaises(webob.exc.HTTPNotFound, cont, 'req',
+                          dict(action='action'))
         mock_get_action.assert_called_once_with('action')
-        mock_descriptor.assert_has_calls([
-            mock.call.deserialize_request('req'),
-            mock.call.pre_process('req', dict(body='body')),
-            mock.call.post_process('post_list', 'req', 'pre-response',
-                                   dict(body='body')),
-        ])
-        mock_response._serialize.assert_called_once_with()
-        self.assertEqual(result, 'serialized')
 
     @mock.patch.object(controller.Controller, '_get_action')
-    def test_call_nobody(self, mock_get_action):
-        mock_response = mock.Mock(**{'_serialize.return_value': 'serialized'})
-        mock_descriptor = mock.Mock(**{
-            'deserialize_request.return_value': None,
-            'pre_process.return_value': (None, 'post_list'),
-            'return_value': 'response',
-            'post_process.return_value': mock_response,
-        })
+    def test_call(self, mock_get_action):
+        mock_descriptor = mock.Mock(**{'process.return_value': 'serialized'})
         mock_get_action.return_value = mock_descriptor
 
         class TestController(controller.Controller):
@@ -906,14 +1040,8 @@ class ControllerTest(tests.TestCase):
 
         cont = TestController()
 
-        result = cont('req', dict(action='action'))
+        result = cont('req', dict(action='action', a=1))
 
         mock_get_action.assert_called_once_with('action')
-        mock_descriptor.assert_has_calls([
-            mock.call.deserialize_request('req'),
-            mock.call.pre_process('req', {}),
-            mock.call('req', {}),
-            mock.call.post_process('post_list', 'req', 'response', {}),
-        ])
-        mock_response._serialize.assert_called_once_with()
+        mock_descriptor.process.assert_called_once_with('req', dict(a=1))
         self.assertEqual(result, 'serialized')
@@ -14,7 +14,14 @@
 # along with this program.  If not, see
 # <http://www.gnu.org/licenses/>.
 
+import io
+import mmap
+import os
+import tempfile
+
 import mock
+import webob
+import webob.exc
 
 from appathy import exceptions
 from appathy import response
@@ -237,6 +244,27 @@ class ResponseObject(tests.TestCase):
         self.assertEqual(robj.content_type, 'text/xml')
         self.assertEqual(robj.serializer, 'request')
 
+    def test_bind_raw(self):
+        desc = mock.Mock(method=TestMethod())
+        robj = response.ResponseObject('request', result=bytearray('data'))
+        robj._bind(desc)
+
+        self.assertEqual(robj._defcode, 200)
+        self.assertEqual(robj.content_type, None)
+        self.assertEqual(robj.serializer, None)
+        self.assertEqual(robj._descriptor, desc)
+        self.assertFalse(desc.serializer.called)
+
+    def test_bind_text_stream(self):
+        desc = mock.Mock(method=TestMethod(), **{
+            'serializer.return_value': ('text/xml', 'serializer'),
+        })
+        robj = response.ResponseObject('request', result=io.StringIO(u'a'))
+        robj._bind(desc)
+
+        self.assertEqual(robj.content_type, 'text/xml')
+        self.assertEqual(robj.serializer, 'serializer')
+
     def test_serialize_unbound(self):
         robj = response.ResponseObject('request')
         with self.assertRaises(exceptions.UnboundResponse):
@@ -304,20 +332,322 @@ class ResponseObject(tests.TestCase):
         def serializer(body):
             return 'serialized(%s)' % body
 
+        req = webob.Request.blank('/')
         desc = TestDescriptor('text/xml')
-        robj = response.ResponseObject('request', result='result',
+        robj = response.ResponseObject(req, result='result',
                                        _descriptor=desc)
         robj.response_class = TestResponse
         robj.serializer = serializer
         resp = robj._serialize()
 
         self.assertIsInstance(resp, TestResponse)
-        self.assertEqual(resp.request, 'request')
+        self.assertEqual(resp.request, req)
         self.assertEqual(resp.status, 200)
         self.assertEqual(resp.headerlist, [])
         self.assertEqual(resp.content_type, 'text/xml')
+        self.assertEqual(resp.accept_ranges, 'bytes')
         self.assertEqual(resp.body, 'serialized(result)')
 
+    def test_serialize_chunks_list(self):
+        def serializer(body):
+            return ['serialized(', body, ')']
+
+        desc = TestDescriptor('text/xml')
+        robj = response.ResponseObject('request', result='result',
+                                       _descriptor=desc)
+        robj.response_class = TestResponse
+        robj.serializer = serializer
+        resp = robj._serialize()
+
+        self.assertEqual(resp.content_type, 'text/xml')
+        self.assertEqual(resp.app_iter, ['serialized(', 'result', ')'])
+        self.assertEqual(resp.content_length, 18)
+        self.assertFalse(hasattr(resp, 'body'))
+
+    def test_serialize_chunks_generator(self):
+        def serializer(body):
+            for item in body:
+                yield 'serialized(%s)' % item
+
+        def result():
+            yield 'a'
+            yield 'b'
+
+        desc = TestDescriptor('text/xml')
+        robj = response.ResponseObject('request', result=result(),
+                                       _descriptor=desc)
+        robj.response_class = TestResponse
+        robj.serializer = serializer
+        resp = robj._serialize()
+
+        self.assertEqual(resp.content_type, 'text/xml')
+        self.assertFalse(hasattr(resp, 'content_length'))
+        self.assertFalse(hasattr(resp, 'body'))
+        self.assertEqual(list(resp.app_iter),
+                         ['serialized(a)', 'serialized(b)'])
+
+    def test_serialize_chunks_webob(self):
+        def serializer(body):
+            return iter(['serialized(', body, ')'])
+
+        desc = TestDescriptor('text/xml')
+        robj = response.ResponseObject('request', result='result',
+                                       _descriptor=desc)
+        robj.serializer = serializer
+        resp = robj._serialize()
+
+        self.assertIsInstance(resp, webob.Response)
+        self.assertEqual(resp.content_length, None)
+        self.assertEqual(resp.body, 'serialized(result)')
+
+    def test_serialize_raw_replaced(self):
+        serializer = mock.Mock(return_value='serialized')
+        desc = mock.Mock(method=TestMethod(), **{
+            'serializer.return_value': ('text/xml', serializer),
+        })
+        req = webob.Request.blank('/')
+        robj = response.ResponseObject(req, result=bytearray('data'),
+                                       _descriptor=desc)
+        robj.response_class = TestResponse
+        robj.result = 'result'
+        resp = robj._serialize()
+
+        desc.serializer.assert_called_once_with(req)
+        serializer.assert_called_once_with('result')
+        self.assertEqual(resp.content_type, 'text/xml')
+        self.assertEqual(resp.body, 'serialized')
+
+    def test_serialize_buffer(self):
+        robj = response.ResponseObject(webob.Request.blank('/'),
+                                       result=bytearray('0123456789'),
+                                       _descriptor=TestDescriptor('text/xml'))
+        robj.response_class = TestResponse
+        robj.raw_block_size = 4
+        resp = robj._serialize()
+
+        self.assertEqual(resp.content_type, 'application/octet-stream')
+        self.assertEqual(resp.charset, None)
+        self.assertEqual(resp.content_length, 10)
+        self.assertEqual(list(resp.app_iter), ['0123', '4567', '89'])
+        self.assertFalse(hasattr(resp, 'body'))
+
+    def test_serialize_raw_no_charset(self):
+        robj = response.ResponseObject(webob.Request.blank('/'),
+                                       result=bytearray('data'),
+                                       _descriptor=TestDescriptor('text/xml'))
+        resp = robj._serialize()
+
+        self.assertEqual(resp.headers['Content-Type'],
+                         'application/octet-stream')
+
+    def test_serialize_memoryview(self):
+        robj = response.ResponseObject(webob.Request.blank('/'),
+                                       result=memoryview('0123456789')[2:],
+                                       _descriptor=TestDescriptor('text/xml'),
+                                       headers={'Content-Type': 'image/png'})
+        robj.response_class = TestResponse
+        resp = robj._serialize()
+
+        self.assertFalse(hasattr(resp, 'content_type'))
+        self.assertEqual(resp.headerlist, [('content-type', 'image/png')])
+        self.assertEqual(resp.content_length, 8)
+        self.assertEqual(list(resp.app_iter), ['23456789'])
+
+    def test_serialize_file_wrapper(self):
+        file_wrapper = mock.Mock(return_value=['wrapped'])
+        req = webob.Request.blank('/', environ={
+            'wsgi.file_wrapper': file_wrapper,
+        })
+        with tempfile.TemporaryFile() as fileobj:
+            fileobj.write('0123456789')
+            fileobj.seek(3)
+            robj = response.ResponseObject(
+                req, result=fileobj, _descriptor=TestDescriptor('text/xml'))
+            robj.response_class = TestResponse
+            resp = robj._serialize()
+
+        file_wrapper.assert_called_once_with(fileobj, 64 * 1024)
+        self.assertEqual(resp.content_type, 'application/octet-stream')
+        self.assertEqual(resp.content_length, 7)
+        self.assertEqual(resp.app_iter, ['wrapped'])
+
+    def test_serialize_file(self):
+        with tempfile.TemporaryFile() as fileobj:
+            fileobj.write('0123456789')
+            fileobj.seek(0)
+            robj = response.ResponseObject(
+                webob.Request.blank('/'), result=fileobj,
+                _descriptor=TestDescriptor('text/xml'))
+            resp = robj._serialize()
+
+            self.assertIsInstance(resp, webob.Response)
+            self.assertEqual(resp.content_length, 10)
+            self.assertEqual(resp.body, '0123456789')
+
+    def test_serialize_pipe(self):
+        read_fd, write_fd = os.pipe()
+        os.write(write_fd, 'data')
+        os.close(write_fd)
+
+        with os.fdopen(read_fd) as fileobj:
+            robj = response.ResponseObject(
+                webob.Request.blank('/'), result=fileobj,
+                _descriptor=TestDescriptor('text/xml'))
+            robj.response_class = TestResponse
+            resp = robj._serialize()
+
+            self.assertFalse(hasattr(resp, 'content_length'))
+            self.assertEqual(list(resp.app_iter), ['data'])
+
+    def test_serialize_mmap(self):
+        buf = mmap.mmap(-1, 10)
+        buf.write('0123456789')
+        buf.seek(6)
+        robj = response.ResponseObject(webob.Request.blank('/'), result=buf,
+                                       _descriptor=TestDescriptor('text/xml'))
+        resp = robj._serialize()
+
+        self.assertEqual(resp.content_length, 4)
+        self.assertEqual(resp.body, '6789')
+
+    def make_ranged(self, result, headers=None, **kwargs):
+        req = webob.Request.blank('/', **kwargs)
+        serializer = mock.Mock(side_effect=lambda x: x)
+        desc = mock.Mock(method=TestMethod(), **{
+            'serializer.return_value': ('text/plain', serializer),
+        })
+        robj = response.ResponseObject(req, result=result, headers=headers,
+                                       _descriptor=desc)
+        return robj
+
+    def test_serialize_range(self):
+        robj = self.make_ranged('0123456789', range='bytes=2-5')
+        resp = robj._serialize()
+
+        self.assertEqual(resp.status_int, 206)
+        self.assertEqual(str(resp.content_range), 'bytes 2-5/10')
+        self.assertEqual(resp.content_length, 4)
+        self.assertEqual(resp.accept_ranges, 'bytes')
+        self.assertEqual(resp.body, '2345')
+
+    def test_serialize_range_suffix(self):
+        robj = self.make_ranged('0123456789', range='bytes=-3')
+        resp = robj._serialize()
+
+        self.assertEqual(resp.status_int, 206)
+        self.assertEqual(str(resp.content_range), 'bytes 7-9/10')
+        self.assertEqual(resp.body, '789')
+
+    def test_serialize_range_unsatisfiable(self):
+        robj = self.make_ranged('0123456789', range='bytes=20-30')
+
+        with self.assertRaises(webob.exc.HTTPRequestRangeNotSatisfiable) as cm:
+            robj._serialize()
+
+        self.assertEqual(cm.exception.headers['Content-Range'], 'bytes */10')
+
+    def test_serialize_range_post(self):
+        robj = self.make_ranged('0123456789', range='bytes=2-5',
+                                method='POST')
+        resp = robj._serialize()
+
+        self.assertEqual(resp.status_int, 200)
+        self.assertEqual(resp.body, '0123456789')
+
+    def test_serialize_range_code(self):
+        robj = self.make_ranged('0123456789', range='bytes=2-5')
+        robj.code = 201
+        resp = robj._serialize()
+
+        self.assertEqual(resp.status_int, 201)
+        self.assertEqual(resp.body, '0123456789')
+
+    def test_serialize_if_range_match(self):
+        robj = self.make_ranged('0123456789', headers={'ETag': '"abc"'},
+                                range='bytes=2-5', if_range='"abc"')
+        resp = robj._serialize()
+
+        self.assertEqual(resp.status_int, 206)
+        self.assertEqual(resp.body, '2345')
+
+    def test_serialize_if_range_mismatch(self):
+        robj = self.make_ranged('0123456789', headers={'ETag': '"abc"'},
+                                range='bytes=2-5', if_range='"xyz"')
+        resp = robj._serialize()
+
+        self.assertEqual(resp.status_int, 200)
+        self.assertEqual(resp.body, '0123456789')
+
+    def test_serialize_range_streamed(self):
+        robj = self.make_ranged(iter(['0123', '456789']), range='bytes=2-5')
+        resp = robj._serialize()
+
+        self.assertEqual(resp.status_int, 200)
+        self.assertEqual(resp.body, '0123456789')
+
+    def test_serialize_range_buffer(self):
+        robj = self.make_ranged(bytearray('0123456789'), range='bytes=2-8')
+        robj.raw_block_size = 4
+        resp = robj._serialize()
+
+        self.assertEqual(resp.status_int, 206)
+        self.assertEqual(resp.content_length, 7)
+        self.assertEqual(list(resp.app_iter), ['2345', '678'])
+
+    def test_serialize_range_file(self):
+        file_wrapper = mock.Mock()
+        with tempfile.TemporaryFile() as fileobj:
+            fileobj.write('0123456789')
+            fileobj.seek(1)
+            robj = self.make_ranged(fileobj, range='bytes=2-5', environ={
+                'wsgi.file_wrapper': file_wrapper,
+            })
+            robj.raw_block_size = 3
+            resp = robj._serialize()
+
+            self.assertEqual(resp.status_int, 206)
+            self.assertEqual(str(resp.content_range), 'bytes 2-5/9')
+            self.assertEqual(resp.content_length, 4)
+            self.assertIsInstance(resp.app_iter, response._FileSlice)
+            self.assertEqual(list(resp.app_iter), ['345', '6'])
+            self.assertFalse(file_wrapper.called)
+
+    def test_serialize_range_file_tail(self):
+        file_wrapper = mock.Mock(return_value=['wrapped'])
+        with tempfile.TemporaryFile() as fileobj:
+            fileobj.write('0123456789')
+            fileobj.seek(0)
+            robj = self.make_ranged(fileobj, range='bytes=6-', environ={
+                'wsgi.file_wrapper': file_wrapper,
+            })
+            resp = robj._serialize()
+
+            self.assertEqual(resp.status_int, 206)
+            self.assertEqual(str(resp.content_range), 'bytes 6-9/10')
+            self.assertEqual(resp.content_length, 4)
+            self.assertEqual(fileobj.tell(), 6)
+            file_wrapper.assert_called_once_with(fileobj, 64 * 1024)
+
+    def test_serialize_range_file_unsatisfiable(self):
+        for fileobj in (tempfile.TemporaryFile(), mmap.mmap(-1, 10)):
+            fileobj.write('0123456789')
+            fileobj.seek(0)
+            robj = self.make_ranged(fileobj, range='bytes=20-30')
+
+            self.assertRaises(webob.exc.HTTPRequestRangeNotSatisfiable,
+                              robj._serialize)
+            self.assertRaises(ValueError, fileobj.read, 1)
+
+    def test_serialize_range_mmap(self):
+        buf = mmap.mmap(-1, 10)
+        buf.write('0123456789')
+        buf.seek(0)
+        robj = self.make_ranged(buf, range='bytes=0-0')
+        resp = robj._serialize()
+
+        self.assertEqual(resp.status_int, 206)
+        self.assertEqual(resp.body, '0')
+
     def test_code_set(self):
         desc = TestDescriptor('text/xml', 204)
         robj = response.ResponseObject('request', _descriptor=desc)
@@ -344,3 +674,29 @@ class ResponseObject(tests.TestCase):
         self.assertEqual(robj._defcode, 204)
         self.assertEqual(robj._code, None)
         self.assertEqual(robj.code, 204)
+
+
+class FileSliceTest(tests.TestCase):
+    def test_iter(self):
+        fileobj = mock.Mock(**{'read.side_effect': ['abc', 'de', '']})
+        file_slice = response._FileSlice(fileobj, None, 3)
+
+        self.assertEqual(list(file_slice), ['abc', 'de'])
+        fileobj.read.assert_has_calls([mock.call(3)] * 3)
+
+    def test_iter_length(self):
+        fileobj = mock.Mock(**{'read.side_effect': ['ab', 'cd', 'e']})
+        file_slice = response._FileSlice(fileobj, 5, 3)
+
+        self.assertEqual(list(file_slice), ['ab', 'cd', 'e'])
+        fileobj.read.assert_has_calls([
+            mock.call(3), mock.call(3), mock.call(1),
+        ])
+
+    def test_close(self):
+        fileobj = mock.Mock()
+        file_slice = response._FileSlice(fileobj, 5, 3)
+
+        file_slice.close()
+
+        fileobj.close.assert_called_once_with()
@@ -0,0 +1,486 @@
+# Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+import mock
+import routes
+
+from appathy import routing
+
+import tests
+
+
+def environ(path, method='GET'):
+    return dict(PATH_INFO=path, REQUEST_METHOD=method)
+
+
+class TemplateRegexTest(tests.TestCase):
+    def test_static(self):
+        regex = routing._template_regex('/spam.json')
+
+        self.assertTrue(regex.match('/spam.json'))
+        self.assertFalse(regex.match('/spamxjson'))
+
+    def test_variables(self):
+        regex = routing._template_regex(r'/{a}/:b/{c:\d{2}}/*d')
+
+        match = regex.match('/1/2/34/5/6')
+
+        self.assertEqual(match.groupdict(), dict(a='1', b='2', c='34',
+                                                 d='5/6'))
+        self.assertFalse(regex.match('/1/2/345/5/6'))
+
+    def test_matches_routes_mapper(self):
+        templates = ['/img/{name}.{fmt}', '/img/{name}.{fmt}.gz',
+                     '/a/{x}-{y}/b', '/a/v{x},{y}', r'/a/{x:\d+}.{y}',
+                     '/a/*x.{y}', '/a/:x.json', '/a/*x']
+        paths = ['/img/a.b.png', '/img/a.png', '/img/a.b.png.gz',
+                 '/a/1-2-3/b', '/a/v1,2,3', '/a/12.3.4', '/a/b.c/d.e',
+                 '/a/b.json', '/a/b.c.json', '/a/', '/a/b/']
+
+        for template in templates:
+            mapper = routes.Mapper(register=False)
+            mapper.connect(template)
+            regex = routing._template_regex(template)
+
+            for path in paths:
+                expected = mapper.match(path)
+                match = regex.match(path)
+                self.assertEqual(match and match.groupdict(), expected,
+                                 '%r matching %r' % (template, path))
+
+
+class RouteTest(tests.TestCase):
+    def test_init(self):
+        route = routing.Route(3, 'name', '/path', None, dict(a=1))
+
+        self.assertEqual(route.index, 3)
+        self.assertEqual(route.name, 'name')
+        self.assertEqual(route.routepath, '/path')
+        self.assertEqual(route.conditions, {})
+        self.assertEqual(route.defaults, dict(a=1))
+        self.assertEqual(route.methods, None)
+        self.assertEqual(route.function, None)
+        self.assertEqual(route.redirect, False)
+        self.assertEqual(route.priority, (-5, 3))
+
+    def test_init_priority(self):
+        route = routing.Route(3, 'name', '/path/{id}', None, {})
+
+        self.assertEqual(route.priority, (-5, 3))
+
+    def test_check_method(self):
+        route = routing.Route(0, 'name', '/path', dict(method=['GET']),
+                              dict(a=1))
+
+        self.assertEqual(route.check(environ('/path'), ()), dict(a=1))
+        self.assertEqual(route.check(environ('/path', 'PUT'), ()), None)
+
+    def test_check_values(self):
+        route = routing.Route(0, 'name', '/path', None, dict(a=1))
+
+        result = route.check(environ('/path'), (('b', 'x\xc3\xa9'),))
+
+        self.assertEqual(result, dict(a=1, b=u'x\xe9'))
+        self.assertIsInstance(result['b'], unicode)
+
+    def test_check_values_baddecode(self):
+        route = routing.Route(0, 'name', '/path', None, dict(a=1))
+
+        self.assertEqual(route.check(environ('/path'), (('b', '\xff'),)),
+                         None)
+
+    def test_check_function(self):
+        function = mock.Mock(return_value=False)
+        route = routing.Route(0, 'name', '/path', dict(function=function),
+                              dict(a=1))
+        env = environ('/path')
+
+        self.assertEqual(route.check(env, (('b', '2'),)), None)
+        function.assert_called_once_with(env, dict(a=1, b=u'2'))
+
+        function.return_value = True
+
+        self.assertEqual(route.check(env, (('b', '2'),)), dict(a=1, b=u'2'))
+
+
+PATHS = [
+    ('index', '/servers', ['GET']),
+    ('create', '/servers', ['POST']),
+    ('show', '/servers/{id}', ['GET']),
+    ('update', '/servers/{id}', ['PUT']),
+    ('detail', '/servers/detail', ['GET']),
+    ('action', '/servers/{id}/action', None),
+    ('fmt', '/formats/{id}.json', None),
+    ('file', '/files/{path:.*}', ['GET']),
+    ('num', r'/nums/{num:\d+}', None),
+    ('root', '/', None),
+]
+
+REQUESTS = [
+    ('GET', '/servers'),
+    ('POST', '/servers'),
+    ('DELETE', '/servers'),
+    ('GET', '/servers/'),
+    ('GET', '/servers/abc'),
+    ('PUT', '/servers/abc'),
+    ('GET', '/servers/detail'),
+    ('PUT', '/servers/detail'),
+    ('GET', '/servers/a%20b'),
+    ('GET', '/servers/\xc3\xa9'),
+    ('POST', '/servers/abc/action'),
+    ('POST', '/servers/abc/action/'),
+    ('GET', '/formats/5.json'),
+    ('GET', '/formats/5.xml'),
+    ('GET', '/files'),
+    ('GET', '/files/'),
+    ('GET', '/files/a/b/c'),
+    ('GET', '/nums/123'),
+    ('GET', '/nums/12a'),
+    ('GET', '/'),
+    ('GET', '/nonexistent'),
+    ('GET', ''),
+]
+
+
+def connect_all(mapper):
+    for name, path, methods in PATHS:
+        conditions = {}
+        if methods:
+            conditions['method'] = methods
+        mapper.connect(name, path, controller='cont', action=name,
+                       conditions=conditions)
+
+
+class RouterTest(tests.TestCase):
+    def test_connect(self):
+        router = routing.Router()
+
+        route = router.connect('name', '/path', controller='cont',
+                               action='act', conditions=dict(method=['GET']),
+                               a=1)
+
+        self.assertEqual(router.matchlist, [route])
+        self.assertEqual(route.index, 0)
+        self.assertEqual(route.name, 'name')
+        self.assertEqual(route.routepath, '/path')
+        self.assertEqual(route.conditions, dict(method=['GET']))
+        self.assertEqual(route.defaults, dict(controller='cont', action='act',
+                                              a=1))
+        self.assertEqual(router.root.static['path'].routes, [route])
+
+    def test_connect_tail(self):
+        router = routing.Router()
+
+        route = router.connect('name', '/files/{path:.*}')
+
+        node = router.root.static['files']
+        self.assertEqual(len(node.tails), 1)
+        self.assertEqual(node.tails[0][1], route)
+
+    def test_shared_nodes(self):
+        router = routing.Router()
+
+        router.connect('show', '/servers/{id}')
+        router.connect('update', '/servers/{id}')
+        router.connect('action', '/servers/{id}/action')
+
+        node = router.root.static['servers']
+        self.assertEqual(len(node.dynamic), 1)
+        self.assertEqual(len(node.dynamic[0][3].routes), 2)
+
+    def test_matches_routes_mapper(self):
+        mapper = routes.Mapper(register=False)
+        connect_all(mapper)
+        router = routing.Router()
+        connect_all(router)
+
+        for method, path in REQUESTS:
+            expected = mapper.routematch(environ=environ(path, method))
+            result = router.routematch(environ=environ(path, method))
+
+            if expected is None:
+                self.assertEqual(result, None,
+                                 'Unexpected match for %s %r' %
+                                 (method, path))
+            else:
+                self.assertNotEqual(result, None,
+                                    'Expected match for %s %r' %
+                                    (method, path))
+                self.assertEqual(result[0], expected[0])
+                self.assertEqual(result[1].name, expected[1].name)
+
+    def test_longest_prefix_wins(self):
+        router = routing.Router()
+        router.connect('show', '/servers/{id}', action='show')
+        router.connect('detail', '/servers/detail', action='detail')
+
+        result = router.routematch(environ=environ('/servers/detail'))
+
+        self.assertEqual(result[0], dict(action='detail'))
+
+    def test_first_connected_wins(self):
+        router = routing.Router()
+        router.connect('show', '/servers/{id}', action='show')
+        router.connect('other', '/servers/{name}', action='other')
+
+        result = router.routematch(environ=environ('/servers/detail'))
+
+        self.assertEqual(result[0], dict(action='show', id=u'detail'))
+
+    def test_routematch_url(self):
+        router = routing.Router()
+        router.connect('show', '/servers/{id}', action='show')
+
+        result = router.routematch('/servers/5')
+
+        self.assertEqual(result[0], dict(action='show', id=u'5'))
+
+    def test_routematch_function(self):
+        router = routing.Router()
+        router.connect('first', '/servers/{id}', action='first',
+                       conditions=dict(function=lambda env, match: False))
+        router.connect('second', '/servers/{id}', action='second')
+
+        result = router.routematch(environ=environ('/servers/5'))
+
+        self.assertEqual(result[0], dict(action='second', id=u'5'))
+
+    def test_match(self):
+        router = routing.Router()
+        router.connect('show', '/servers/{id}', action='show')
+
+        self.assertEqual(router.match('/servers/5'),
+                         dict(action='show', id=u'5'))
+        self.assertEqual(router.match('/spam/5'), None)
+
+
+class StaticMapperTest(tests.TestCase):
+    def test_init(self):
+        mapper = routing.StaticMapper('mapper')
+
+        self.assertEqual(mapper.mapper, 'mapper')
+        self.assertEqual(mapper.static, {})
+        self.assertEqual(mapper.dynamic, [])
+
+    def test_getattr(self):
+        mapper = routing.StaticMapper(mock.Mock(spam='spam'))
+
+        self.assertEqual(mapper.spam, 'spam')
+
+    def test_connect_static(self):
+        mapper = routing.StaticMapper(routing.Router())
+
+        mapper.connect('index', '/servers', controller='cont',
+                       action='index', conditions=dict(method=['GET']))
+
+        route = mapper.mapper.matchlist[0]
+        self.assertEqual(mapper.static, {
+            '/servers': [
+                (['GET'], dict(controller='cont', action='index'), route),
+            ],
+        })
+        self.assertEqual(mapper.dynamic, [])
+
+    def test_connect_dynamic(self):
+        mapper = routing.StaticMapper(routing.Router())
+
+        mapper.connect('show', '/servers/{id}', controller='cont',
+                       action='show', conditions=dict(method=['GET']))
+
+        self.assertEqual(mapper.static, {})
+        self.assertEqual(len(mapper.dynamic), 1)
+        self.assertEqual(mapper.dynamic[0][1], ['GET'])
+
+    def test_connect_function(self):
+        mapper = routing.StaticMapper(routing.Router())
+
+        mapper.connect('index', '/servers', controller='cont',
+                       action='index', conditions=dict(function='func'))
+
+        self.assertEqual(mapper.static, {})
+        self.assertEqual(len(mapper.dynamic), 1)
+        self.assertEqual(mapper.dynamic[0][1], None)
+
+    def test_connect_shadowed(self):
+        mapper = routing.StaticMapper(routing.Router())
+
+        mapper.connect('other', '/servers{ext:.*}', action='other')
+        mapper.connect('index', '/servers', action='index')
+
+        self.assertEqual(mapper.static, {})
+        self.assertEqual(len(mapper.dynamic), 2)
+
+    def test_connect_shadowed_other_method(self):
+        mapper = routing.StaticMapper(routing.Router())
+
+        mapper.connect('other', '/servers{ext:.*}', action='other',
+                       conditions=dict(method=['POST']))
+        mapper.connect('index', '/servers', action='index',
+                       conditions=dict(method=['GET']))
+
+        self.assertEqual(mapper.static.keys(), ['/servers'])
+        self.assertEqual(len(mapper.dynamic), 1)
+
+    def test_routematch_static(self):
+        wrapped = mock.Mock()
+        mapper = routing.StaticMapper(wrapped)
+        mapper.static['/servers'] = [
+            (['GET'], dict(action='index'), 'index route'),
+            (['POST'], dict(action='create'), 'create route'),
+        ]
+
+        result = mapper.routematch(environ=environ('/servers', 'POST'))
+
+        self.assertEqual(result, (dict(action='create'), 'create route'))
+        self.assertFalse(wrapped.routematch.called)
+
+    def test_routematch_static_copy(self):
+        mapper = routing.StaticMapper(mock.Mock())
+        mapper.static['/servers'] = [
+            (None, dict(action='index'), 'index route'),
+        ]
+
+        result = mapper.routematch(environ=environ('/servers'))
+        result[0]['spam'] = 'spam'
+
+        self.assertEqual(mapper.static['/servers'][0][1],
+                         dict(action='index'))
+
+    def test_routematch_fallback(self):
+        wrapped = mock.Mock(**{'routematch.return_value': 'match'})
+        mapper = routing.StaticMapper(wrapped)
+        mapper.static['/servers'] = [
+            (['GET'], dict(action='index'), 'index route'),
+        ]
+        env = environ('/servers', 'PUT')
+
+        result = mapper.routematch(environ=env)
+
+        self.assertEqual(result, 'match')
+        wrapped.routematch.assert_called_once_with('/servers', env)
+
+    def test_match(self):
+        mapper = routing.StaticMapper(routing.Router())
+        mapper.connect('index', '/servers', action='index')
+
+        self.assertEqual(mapper.match('/servers'), dict(action='index'))
+        self.assertEqual(mapper.match('/spam'), None)
+
+    def test_matches_routes_mapper(self):
+        expected_mapper = routes.Mapper(register=False)
+        connect_all(expected_mapper)
+
+        for wrapped in (routes.Mapper(register=False), routing.Router()):
+            mapper = routing.StaticMapper(wrapped)
+            connect_all(mapper)
+
+            for method, path in REQUESTS:
+                env = environ(path, method)
+                expected = expected_mapper.routematch(environ=env)
+                result = mapper.routematch(environ=env)
+
+                if expected is None:
+                    self.assertEqual(result, None)
+                else:
+                    self.assertEqual(result[0], expected[0])
+                    self.assertEqual(result[1].name, expected[1].name)
+
+
+class CachingMapperTest(tests.TestCase):
+    def test_init(self):
+        mapper = routing.CachingMapper('mapper', 5)
+
+        self.assertEqual(mapper.mapper, 'mapper')
+        self.assertEqual(mapper.cache.size, 5)
+        self.assertEqual(mapper.conditional, [])
+
+    def test_getattr(self):
+        mapper = routing.CachingMapper(mock.Mock(spam='spam'), 5)
+
+        self.assertEqual(mapper.spam, 'spam')
+
+    def test_connect(self):
+        wrapped = mock.Mock()
+        mapper = routing.CachingMapper(wrapped, 5)
+
+        mapper.connect('show', '/servers/{id}', action='show',
+                       conditions=dict(method=['GET']))
+        mapper.connect('other', '/other/{id}', action='other',
+                       conditions=dict(function='func'))
+
+        wrapped.connect.assert_has_calls([
+            mock.call('show', '/servers/{id}', action='show',
+                      conditions=dict(method=['GET'])),
+            mock.call('other', '/other/{id}', action='other',
+                      conditions=dict(function='func')),
+        ])
+        self.assertEqual(len(mapper.conditional), 1)
+        self.assertTrue(mapper.conditional[0].match('/other/5'))
+
+    def test_routematch_cached(self):
+        wrapped = mock.Mock(**{
+            'routematch.return_value': (dict(action='show'), 'route'),
+        })
+        mapper = routing.CachingMapper(wrapped, 5)
+        env = environ('/servers/5')
+
+        result1 = mapper.routematch(environ=env)
+        result1[0]['spam'] = 'spam'
+        result2 = mapper.routematch(environ=env)
+
+        wrapped.routematch.assert_called_once_with('/servers/5', env)
+        self.assertEqual(result2, (dict(action='show'), 'route'))
+        self.assertEqual(mapper.cache.hits, 1)
+        self.assertEqual(mapper.cache.misses, 1)
+
+    def test_routematch_method(self):
+        wrapped = mock.Mock(**{
+            'routematch.return_value': (dict(action='show'), 'route'),
+        })
+        mapper = routing.CachingMapper(wrapped, 5)
+
+        mapper.routematch(environ=environ('/servers/5', 'GET'))
+        mapper.routematch(environ=environ('/servers/5', 'PUT'))
+
+        self.assertEqual(wrapped.routematch.call_count, 2)
+
+    def test_routematch_nomatch(self):
+        wrapped = mock.Mock(**{'routematch.return_value': None})
+        mapper = routing.CachingMapper(wrapped, 5)
+
+        result = mapper.routematch(environ=environ('/servers/5'))
+
+        self.assertEqual(result, None)
+        self.assertEqual(len(mapper.cache), 0)
+
+    def test_routematch_conditional(self):
+        router = routing.Router()
+        mapper = routing.CachingMapper(router, 5)
+        state = dict(result=False)
+        mapper.connect('first', '/servers/{id}', action='first',
+                       conditions=dict(function=lambda e, m: state['result']))
+        mapper.connect('second', '/servers/{id}', action='second')
+        mapper.connect('third', '/other/{id}', action='third')
+        env = environ('/servers/5')
+
+        self.assertEqual(mapper.match(environ=env),
+                         dict(action='second', id=u'5'))
+        state['result'] = True
+        self.assertEqual(mapper.match(environ=env),
+                         dict(action='first', id=u'5'))
+        self.assertEqual(mapper.match(environ=environ('/other/5')),
+                         dict(action='third', id=u'5'))
+        self.assertEqual(len(mapper.cache), 1)
@@ -0,0 +1,368 @@
+# Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+import json
+
+import mock
+
+from appathy import cbor
+from appathy import schema
+
+import tests
+
+
+WIDGET = schema.Record(
+    ('id', int),
+    ('name', unicode),
+    ('price', float),
+    ('active', bool),
+    ('tags', schema.List(str)),
+    ('owner', schema.Nullable(schema.Record(('id', int)))),
+    ('extra%', object),
+)
+
+WIDGETS = [
+    {
+        'id': 1,
+        'name': u'caf\xe9',
+        'price': 1.5,
+        'active': True,
+        'tags': ['a', 'b'],
+        'owner': None,
+        'extra%': [1, dict(a=2)],
+    },
+    {
+        'id': -2,
+        'name': 'b',
+        'price': 2.0,
+        'active': False,
+        'tags': [],
+        'owner': dict(id=3),
+        'extra%': None,
+    },
+]
+
+
+class SpecTest(tests.TestCase):
+    def test_record(self):
+        rec = schema.Record(('a', int), ('b', schema.List(str)))
+
+        self.assertEqual(rec.fields, [('a', int), ('b', schema.List(str))])
+        self.assertEqual(rec, schema.Record(('a', int),
+                                            ('b', schema.List(str))))
+        self.assertNotEqual(rec, schema.Record(('b', schema.List(str)),
+                                               ('a', int)))
+        self.assertEqual(repr(rec),
+                         "Record(('a', <type 'int'>), "
+                         "('b', List(<type 'str'>)))")
+
+    def test_list(self):
+        lst = schema.List(schema.Nullable(int))
+
+        self.assertEqual(lst.item, schema.Nullable(int))
+        self.assertEqual(lst, schema.List(schema.Nullable(int)))
+        self.assertNotEqual(lst, schema.List(int))
+        self.assertEqual(repr(lst), "List(Nullable(<type 'int'>))")
+
+    def test_invalid(self):
+        self.assertRaises(TypeError, schema.Record, ('a', dict))
+        self.assertRaises(TypeError, schema.List, [int])
+        self.assertRaises(TypeError, schema.Nullable, 'int')
+
+
+class ResultSchemaTest(tests.TestCase):
+    def test_fields(self):
+        @schema.result_schema(('a', int), ('b', str))
+        def func():
+            pass
+
+        self.assertEqual(func._wsgi_result_schema,
+                         schema.Record(('a', int), ('b', str)))
+
+    def test_spec(self):
+        @schema.result_schema(schema.List(schema.Record(('a', int))))
+        def func():
+            pass
+
+        self.assertEqual(func._wsgi_result_schema,
+                         schema.List(schema.Record(('a', int))))
+
+
+class RequestSchemaTest(tests.TestCase):
+    def test_fields(self):
+        @schema.request_schema(('a', int), ('b', str))
+        def func():
+            pass
+
+        self.assertEqual(func._wsgi_request_schema,
+                         schema.Record(('a', int), ('b', str)))
+
+    def test_spec(self):
+        @schema.request_schema(schema.List(int))
+        def func():
+            pass
+
+        self.assertEqual(func._wsgi_request_schema, schema.List(int))
+
+
+class MergeTest(tests.TestCase):
+    def test_records(self):
+        result = schema.merge(schema.Record(('a', int), ('b', int)),
+                              schema.Record(('b', str), ('c', int)))
+
+        self.assertEqual(result, schema.Record(('a', int), ('b', str),
+                                               ('c', int)))
+
+    def test_lists(self):
+        result = schema.merge(schema.List(schema.Record(('a', int))),
+                              schema.List(schema.Record(('b', int))))
+
+        self.assertEqual(result, schema.List(schema.Record(('a', int),
+                                                           ('b', int))))
+
+    def test_equal(self):
+        self.assertEqual(schema.merge(int, int), int)
+
+    def test_conflict(self):
+        self.assertEqual(schema.merge(schema.List(int),
+                                      schema.Record(('a', int))), None)
+        self.assertEqual(schema.merge(schema.List(int),
+                                      schema.List(str)), None)
+
+    def test_schema_for(self):
+        methods = [
+            mock.Mock(_wsgi_result_schema=schema.Record(('a', int))),
+            mock.Mock(spec=[]),
+            mock.Mock(_wsgi_result_schema=schema.Record(('b', int))),
+        ]
+
+        self.assertEqual(schema.schema_for(methods),
+                         schema.Record(('a', int), ('b', int)))
+
+    def test_schema_for_undeclared(self):
+        methods = [
+            mock.Mock(spec=[]),
+            mock.Mock(_wsgi_result_schema=schema.Record(('b', int))),
+        ]
+
+        self.assertEqual(schema.schema_for(methods), None)
+
+    def test_schema_for_conflict(self):
+        methods = [
+            mock.Mock(_wsgi_result_schema=schema.Record(('a', int))),
+            mock.Mock(_wsgi_result_schema=schema.List(int)),
+            mock.Mock(_wsgi_result_schema=schema.Record(('b', int))),
+        ]
+
+        self.assertEqual(schema.schema_for(methods), None)
+
+    def test_schema_for_attr(self):
+        methods = [
+            mock.Mock(_wsgi_request_schema=schema.Record(('a', int)),
+                      _wsgi_result_schema=schema.List(int)),
+            mock.Mock(_wsgi_request_schema=schema.Record(('b', int))),
+        ]
+
+        self.assertEqual(schema.schema_for(methods, '_wsgi_request_schema'),
+                         schema.Record(('a', int), ('b', int)))
+
+
+class JSONCompilerTest(tests.TestCase):
+    def compile(self, spec, generic_lists=False):
+        compiler = schema.JSONCompiler(json.dumps)
+        compiler.generic_lists = generic_lists
+        return compiler.compile(spec)
+
+    def test_record(self):
+        encoder = self.compile(WIDGET)
+
+        result = encoder(WIDGETS[0])
+
+        self.assertEqual(result, '{"id":1,"name":"caf\\u00e9","price":1.5,'
+                         '"active":true,"tags":["a","b"],"owner":null,'
+                         '"extra%":[1, {"a": 2}]}')
+
+    def test_list(self):
+        encoder = self.compile(schema.List(WIDGET))
+
+        result = encoder(WIDGETS)
+
+        self.assertEqual(json.loads(result), WIDGETS)
+
+    def test_list_generic(self):
+        encoder = self.compile(schema.List(WIDGET), True)
+
+        self.assertEqual(encoder, json.dumps)
+
+    def test_nested_list_generic(self):
+        encoder = self.compile(WIDGET, True)
+
+        result = encoder(WIDGETS[0])
+
+        self.assertEqual(json.loads(result), WIDGETS[0])
+
+    def test_empty(self):
+        self.assertEqual(self.compile(schema.Record())({}), '{}')
+        self.assertEqual(self.compile(schema.List(int))([]), '[]')
+
+    def test_scalar(self):
+        self.assertEqual(self.compile(int)(5), '5')
+
+    def test_undeclared_keys(self):
+        encoder = self.compile(schema.Record(('a', int)))
+
+        self.assertRaises(ValueError, encoder, dict(a=1, b=2))
+
+    def test_missing_keys(self):
+        encoder = self.compile(schema.Record(('a', int), ('b', int)))
+
+        self.assertRaises(KeyError, encoder, dict(a=1, c=2))
+
+    def test_nonfinite(self):
+        encoder = self.compile(float)
+
+        self.assertRaises(ValueError, encoder, float('inf'))
+        self.assertRaises(ValueError, encoder, float('nan'))
+
+    def test_mismatch(self):
+        encoder = self.compile(schema.Record(('size', int), ('ok', bool),
+                                             ('price', float)))
+
+        self.assertEqual(encoder(dict(size=1L, ok=False, price=1.5)),
+                         '{"size":1,"ok":false,"price":1.5}')
+        for value in (dict(size=1.75, ok=True, price=1.5),
+                      dict(size=True, ok=True, price=1.5),
+                      dict(size=1, ok='no', price=1.5),
+                      dict(size=1, ok=1, price=1.5),
+                      dict(size=1, ok=True, price=2)):
+            self.assertRaises(TypeError, encoder, value)
+
+
+class CBORCompilerTest(tests.TestCase):
+    def compile(self, spec):
+        return schema.CBORCompiler(cbor.dumps).compile(spec)
+
+    def test_record(self):
+        encoder = self.compile(WIDGET)
+
+        result = encoder(WIDGETS[0])
+
+        self.assertEqual(cbor.loads(result), WIDGETS[0])
+        self.assertTrue(result.startswith('\xa7\x62id\x01\x64name'))
+
+    def test_list(self):
+        encoder = self.compile(schema.List(WIDGET))
+
+        result = encoder(WIDGETS)
+
+        self.assertEqual(cbor.loads(result), WIDGETS)
+
+    def test_matches_generic(self):
+        encoder = self.compile(schema.Record(('a', int), ('b', int),
+                                             ('c', float), ('d', unicode)))
+        value = dict(a=1000, b=-70000, c=1.1, d=u'\u6c34')
+
+        self.assertEqual(cbor.loads(encoder(value)), value)
+        self.assertEqual(len(encoder(value)), len(cbor.dumps(value)))
+
+    def test_undeclared_keys(self):
+        encoder = self.compile(schema.Record(('a', int)))
+
+        self.assertRaises(ValueError, encoder, dict(a=1, b=2))
+
+    def test_mismatch(self):
+        encoder = self.compile(schema.Record(('size', int), ('ok', bool),
+                                             ('price', float), ('name', str)))
+
+        self.assertEqual(
+            cbor.loads(encoder(dict(size=1L, ok=False, price=1.5,
+                                    name='a'))),
+            dict(size=1, ok=False, price=1.5, name=u'a'))
+        for value in (dict(size=1.75, ok=True, price=1.5, name='a'),
+                      dict(size=True, ok=True, price=1.5, name='a'),
+                      dict(size=1, ok='no', price=1.5, name='a'),
+                      dict(size=1, ok=1, price=1.5, name='a'),
+                      dict(size=1, ok=True, price=True, name='a'),
+                      dict(size=1, ok=True, price=1.5, name=1)):
+            self.assertRaises(TypeError, encoder, value)
+        self.assertRaises(ValueError, encoder,
+                          dict(size=1, ok=True, price=1.5, name='\xff'))
+
+
+class ValidatorCompilerTest(tests.TestCase):
+    def assertInvalid(self, validator, value, message):
+        with self.assertRaises(ValueError) as cm:
+            validator(value)
+
+        self.assertEqual(str(cm.exception), message)
+
+    def test_scalars(self):
+        validator = schema.ValidatorCompiler().compile(schema.List(
+            schema.Record(('i', int), ('f', float), ('b', bool),
+                          ('s', basestring), ('o', object))))
+
+        self.assertEqual(validator([
+            dict(i=1, f=1.5, b=True, s='a', o=None),
+            dict(i=2L, f=1, b=False, s=u'\u00e9', o=[1]),
+        ]), None)
+        self.assertInvalid(validator, [dict(i=True, f=1.5, b=True, s='a',
+                                            o=None)],
+                           'body[].i: expected an integer')
+        self.assertInvalid(validator, [dict(i=1, f='1', b=True, s='a',
+                                            o=None)],
+                           'body[].f: expected a number')
+        self.assertInvalid(validator, [dict(i=1, f=1.5, b=1, s='a',
+                                            o=None)],
+                           'body[].b: expected a boolean')
+        self.assertInvalid(validator, [dict(i=1, f=1.5, b=True, s=1,
+                                            o=None)],
+                           'body[].s: expected a string')
+
+    def test_containers(self):
+        validator = schema.ValidatorCompiler('doc').compile(schema.Record(
+            ('tags', schema.List(str)),
+            ('owner', schema.Record(('id', int))),
+        ))
+
+        self.assertEqual(validator(dict(tags=['a'], owner=dict(id=1))), None)
+        self.assertInvalid(validator, [], 'doc: expected an object')
+        self.assertInvalid(validator, dict(tags='a', owner=dict(id=1)),
+                           'doc.tags: expected an array')
+        self.assertInvalid(validator, dict(tags=[1], owner=dict(id=1)),
+                           'doc.tags[]: expected a string')
+        self.assertInvalid(validator, dict(tags=[], owner=None),
+                           'doc.owner: expected an object')
+
+    def test_keys(self):
+        validator = schema.ValidatorCompiler().compile(
+            schema.Record(('a', int), ('b', schema.Nullable(int))))
+
+        self.assertEqual(validator(dict(a=1)), None)
+        self.assertEqual(validator(dict(a=1, b=None)), None)
+        self.assertEqual(validator(dict(a=1, b=2)), None)
+        self.assertInvalid(validator, dict(b=2), 'body.a: required')
+        self.assertInvalid(validator, dict(a=1, b='2'),
+                           'body.b: expected an integer')
+        self.assertInvalid(validator, dict(a=1, d=3, c=4),
+                           "body: undeclared keys 'c', 'd'")
+
+    def test_nullable(self):
+        validator = schema.ValidatorCompiler().compile(
+            schema.Nullable(schema.List(object)))
+
+        self.assertEqual(validator(None), None)
+        self.assertEqual(validator([1, 'a']), None)
+        self.assertInvalid(validator, 'a', 'body: expected an array')
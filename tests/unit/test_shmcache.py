@@ -0,0 +1,217 @@
+# Copyright (C) 2012 by Kevin L. Mitchell <klmitch@mit.edu>
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+
+import mock
+
+from appathy import cache
+from appathy import exceptions
+from appathy import shmcache
+
+import tests
+
+
+def make_entry(body='body'):
+    return cache.Entry(1000.0, '200 OK',
+                       (('Content-Type', 'text/plain'),), body)
+
+
+class SharedMemoryBackendTest(tests.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'cache')
+        self.backends = []
+
+    def tearDown(self):
+        for backend in self.backends:
+            backend.close()
+        shutil.rmtree(self.tmpdir)
+
+    def make_backend(self, **kwargs):
+        kwargs.setdefault('slots', 8)
+        kwargs.setdefault('slot_size', 256)
+        backend = shmcache.SharedMemoryBackend(self.path, **kwargs)
+        self.backends.append(backend)
+        return backend
+
+    def test_init(self):
+        backend = self.make_backend()
+
+        self.assertEqual(backend.buckets, 2)
+        self.assertEqual(os.path.getsize(self.path), 64 + 8 * 256)
+        self.assertEqual(backend.stats(), dict(
+            size=8, length=0, evictions=0, oversize=0, contention=0,
+        ))
+
+    def test_init_bad_layout(self):
+        self.assertRaises(ValueError, shmcache.SharedMemoryBackend,
+                          self.path, slots=6, ways=4)
+        self.assertRaises(ValueError, shmcache.SharedMemoryBackend,
+                          self.path, slot_size=16)
+
+    def test_init_existing(self):
+        backend1 = self.make_backend()
+        backend1.set('key', make_entry(), 10)
+
+        backend2 = self.make_backend()
+
+        self.assertEqual(backend2.get('key'), make_entry())
+
+    def test_init_incompatible(self):
+        self.make_backend()
+
+        self.assertRaises(exceptions.IncompatibleCache, self.make_backend,
+                          slots=16)
+
+    def test_set_get(self):
+        backend = self.make_backend()
+
+        backend.set('key', make_entry(), 10)
+        result = backend.get('key')
+
+        self.assertEqual(result, make_entry())
+        self.assertIsInstance(result, cache.Entry)
+        self.assertEqual(backend.get('other'), None)
+        self.assertEqual(backend.stats()['length'], 1)
+
+    def test_set_replace(self):
+        backend = self.make_backend()
+
+        backend.set('key', make_entry('a'), 10)
+        backend.set('key', make_entry('b'), 10)
+
+        self.assertEqual(backend.get('key').body, 'b')
+        self.assertEqual(backend.stats()['length'], 1)
+
+    @mock.patch('time.time')
+    def test_get_expired(self, mock_time):
+        backend = self.make_backend()
+        mock_time.return_value = 1000.0
+        backend.set('key', make_entry(), 10)
+
+        mock_time.return_value = 1010.0
+        self.assertEqual(backend.get('key'), None)
+
+    @mock.patch.object(shmcache, '_hash', return_value=5)
+    def test_get_collision(self, mock_hash):
+        backend = self.make_backend()
+        backend.set('key', make_entry(), 10)
+
+        self.assertEqual(backend.get('other'), None)
+
+    def test_set_oversize(self):
+        backend = self.make_backend()
+
+        backend.set('key', make_entry('x' * 256), 10)
+
+        self.assertEqual(backend.get('key'), None)
+        self.assertEqual(backend.oversize, 1)
+
+    @mock.patch('time.time')
+    def test_set_evicts_lru(self, mock_time):
+        backend = self.make_backend(slots=2, ways=2)
+        mock_time.return_value = 1000.0
+        backend.set('a', make_entry('a'), 100)
+        mock_time.return_value = 1001.0
+        backend.set('b', make_entry('b'), 100)
+        mock_time.return_value = 1002.0
+        backend.get('a')
+
+        mock_time.return_value = 1003.0
+        backend.set('c', make_entry('c'), 100)
+
+        self.assertEqual(backend.get('a').body, 'a')
+        self.assertEqual(backend.get('b'), None)
+        self.assertEqual(backend.get('c').body, 'c')
+        self.assertEqual(backend.evictions, 1)
+
+    @mock.patch('time.time')
+    def test_set_reuses_expired(self, mock_time):
+        backend = self.make_backend(slots=2, ways=2)
+        mock_time.return_value = 1000.0
+        backend.set('a', make_entry('a'), 100)
+        backend.set('b', make_entry('b'), 10)
+
+        mock_time.return_value = 1020.0
+        backend.set('c', make_entry('c'), 100)
+
+        self.assertEqual(backend.get('a').body, 'a')
+        self.assertEqual(backend.get('c').body, 'c')
+        self.assertEqual(backend.evictions, 0)
+
+    def test_get_contention(self):
+        backend = self.make_backend()
+        backend.set('key', make_entry(), 10)
+        start, length = backend._bucket(shmcache._hash('key'))
+
+        # Leave the slots of the bucket looking like they're being
+        # written
+        for offset in range(start, start + length, backend.slot_size):
+            seq = shmcache._seq.unpack_from(backend._mmap, offset)[0]
+            shmcache._seq.pack_into(backend._mmap, offset, seq + 1)
+
+        self.assertEqual(backend.get('key'), None)
+        self.assertEqual(backend.contention, 4)
+
+    def test_delete(self):
+        backend = self.make_backend()
+        backend.set('a', make_entry(), 10)
+        backend.set('b', make_entry(), 10)
+
+        backend.delete('a')
+        backend.delete('missing')
+
+        self.assertEqual(backend.get('a'), None)
+        self.assertNotEqual(backend.get('b'), None)
+
+    def test_clear(self):
+        backend = self.make_backend()
+        for key in 'abcdef':
+            backend.set(key, make_entry(), 10)
+
+        backend.clear()
+
+        self.assertEqual(backend.stats()['length'], 0)
+        self.assertEqual(backend.get('a'), None)
+
+    def test_shared_between_processes(self):
+        backend = self.make_backend()
+
+        pid = os.fork()
+        if not pid:
+            try:
+                backend.set('key', make_entry('child'), 10)
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+
+        self.assertEqual(backend.get('key').body, 'child')
+
+    def test_response_cache(self):
+        backend = self.make_backend(slot_size=1024)
+        rcache = cache.ResponseCache(10, backend=backend)
+        resp = mock.Mock(status_int=200, status='200 OK', headers={},
+                         headerlist=[('Content-Type', 'text/plain')],
+                         app_iter=['bo', 'dy'])
+
+        rcache.set('key', resp)
+        result = rcache.get('key', None)
+
+        self.assertEqual(result.body, 'body')
+        self.assertEqual(result.content_type, 'text/plain')
@@ -15,9 +15,13 @@
 # <http://www.gnu.org/licenses/>.
 
 import functools
+import json
 
 import mock
+import webob.exc
 
+from appathy import cbor
+from appathy import schema
 from appathy import types
 
 import tests
@@ -243,3 +247,315 @@ class TranslatorsClass(tests.TestCase):
         self.assertEqual(converter.func, translator)
         self.assertEqual(converter.args, ('xml', 'text/xml'))
         self.assertEqual(converter.keywords, None)
+        self.assertFalse(hasattr(converter, 'reusable'))
+
+    def test_call_function_reusable(self):
+        def translator(type_name, content_type, body):
+            return body
+
+        translator.reusable = True
+
+        class TestClass(object):
+            @types._translators('_translators', dict(xml=translator))
+            def foobar(self):
+                pass
+
+        obj = TestClass()
+        xlator = types.Translators(obj.foobar, '_translators')
+        converter = xlator('text/xml')
+
+        self.assertIsInstance(converter, functools.partial)
+        self.assertEqual(converter.func, translator)
+        self.assertEqual(converter.reusable, True)
+        self.assertFalse(hasattr(converter, 'streaming'))
+
+    def test_call_function_streaming(self):
+        def translator(type_name, content_type, body_file):
+            return body_file.read()
+
+        translator.streaming = True
+
+        class TestClass(object):
+            @types._translators('_translators', dict(xml=translator))
+            def foobar(self):
+                pass
+
+        obj = TestClass()
+        xlator = types.Translators(obj.foobar, '_translators')
+        converter = xlator('text/xml')
+
+        self.assertEqual(converter.streaming, True)
+        self.assertFalse(hasattr(converter, 'reusable'))
+
+
+class TransformTranslatorTest(tests.TestCase):
+    def test_init(self):
+        xlator = types.TransformTranslator('json', 'application/json')
+
+        self.assertEqual(xlator.type_name, 'json')
+        self.assertEqual(xlator.content_type, 'application/json')
+        self.assertEqual(xlator.transforms, [xlator.transform])
+        self.assertEqual(xlator.reusable, True)
+
+    def test_attach(self):
+        xlator = types.TransformTranslator('json', 'application/json')
+        ext1 = mock.Mock(spec=['transform'])
+        ext2 = mock.Mock(spec=['__call__'])
+
+        xlator.attach(ext1)
+        xlator.attach(ext2)
+
+        self.assertEqual(xlator.transforms, [xlator.transform,
+                                             ext1.transform])
+
+    def test_transform(self):
+        class Xlator(types.TransformTranslator):
+            def transform(self, obj):
+                return obj + ['xlator']
+
+        class Ext(types.TransformTranslator):
+            def transform(self, obj):
+                return obj + ['ext']
+
+        xlator = Xlator('json', 'application/json')
+        xlator.attach(Ext('json', 'application/json'))
+
+        self.assertEqual(xlator._transform([]), ['xlator', 'ext'])
+
+
+class JSONSerializerTest(tests.TestCase):
+    def test_call(self):
+        ser = types.JSONSerializer('json', 'application/json')
+
+        result = ser(dict(a=[1, 2, 3]))
+
+        self.assertEqual(json.loads(result), dict(a=[1, 2, 3]))
+
+    @mock.patch.object(types.JSONSerializer, 'transform',
+                       return_value=dict(b=2))
+    def test_call_transform(self, mock_transform):
+        ser = types.JSONSerializer('json', 'application/json')
+
+        result = ser(dict(a=1))
+
+        mock_transform.assert_called_once_with(dict(a=1))
+        self.assertEqual(json.loads(result), dict(b=2))
+
+    def test_call_small_list(self):
+        ser = types.JSONSerializer('json', 'application/json')
+        ser.stream_threshold = 5
+
+        result = ser(range(5))
+
+        self.assertIsInstance(result, str)
+        self.assertEqual(json.loads(result), range(5))
+
+    def test_call_large_list(self):
+        ser = types.JSONSerializer('json', 'application/json')
+        ser.stream_threshold = 5
+        ser.chunk_items = 2
+
+        result = ser(range(6))
+
+        chunks = list(result)
+        self.assertEqual(len(chunks), 5)
+        self.assertEqual(json.loads(''.join(chunks)), range(6))
+
+    def test_call_generator(self):
+        def gen():
+            for i in range(5):
+                yield dict(i=i)
+
+        ser = types.JSONSerializer('json', 'application/json')
+        ser.chunk_items = 2
+
+        result = ser(gen())
+
+        chunks = list(result)
+        self.assertEqual(len(chunks), 5)
+        self.assertEqual(json.loads(''.join(chunks)),
+                         [dict(i=i) for i in range(5)])
+
+    def test_call_empty_generator(self):
+        ser = types.JSONSerializer('json', 'application/json')
+
+        result = ser(iter([]))
+
+        self.assertEqual(''.join(result), '[]')
+
+
+class StreamingSerializerTest(tests.TestCase):
+    def test_compile(self):
+        ser = types.JSONSerializer('json', 'application/json')
+
+        ser.compile(schema.Record(('b', int), ('a', int)))
+
+        self.assertEqual(ser(dict(a=1, b=2)), '{"b":2,"a":1}')
+
+    @mock.patch.object(types.JSONSerializer, 'transform',
+                       return_value=dict(a=1, b=2))
+    def test_compile_transform(self, mock_transform):
+        ser = types.JSONSerializer('json', 'application/json')
+        ser.compile(schema.Record(('b', int), ('a', int)))
+
+        result = ser(dict(a=5))
+
+        mock_transform.assert_called_once_with(dict(a=5))
+        self.assertEqual(result, '{"b":2,"a":1}')
+
+    def test_compile_mismatch(self):
+        ser = types.JSONSerializer('json', 'application/json')
+        ser.compile(schema.Record(('b', int), ('a', int)))
+
+        result = ser(dict(a=1, b=2, c=3))
+
+        self.assertEqual(json.loads(result), dict(a=1, b=2, c=3))
+
+    def test_compile_mismatched_types(self):
+        ser = types.JSONSerializer('json', 'application/json')
+        ser.compile(schema.Record(('size', int), ('ok', bool)))
+
+        result = ser(dict(size=1.75, ok='no'))
+
+        self.assertEqual(json.loads(result), dict(size=1.75, ok='no'))
+
+    def test_compile_streamed(self):
+        ser = types.JSONSerializer('json', 'application/json')
+        ser.stream_threshold = 1
+        ser.compile(schema.List(int))
+        ser.compiled = mock.Mock()
+
+        result = ser([1, 2])
+
+        self.assertEqual(''.join(result), '[1, 2]')
+        self.assertFalse(ser.compiled.called)
+
+    def test_compile_nocompiler(self):
+        ser = types.StreamingSerializer('json', 'application/json')
+
+        ser.compile(schema.List(int))
+
+        self.assertEqual(ser.compiled, None)
+
+    def test_compile_cbor(self):
+        ser = types.CBORSerializer('cbor', 'application/cbor')
+
+        ser.compile(schema.Record(('b', int), ('a', int)))
+
+        self.assertEqual(ser(dict(a=1, b=2)), '\xa2\x61b\x02\x61a\x01')
+
+
+class JSONDeserializerTest(tests.TestCase):
+    def test_call(self):
+        deser = types.JSONDeserializer('json', 'application/json')
+
+        result = deser('{"a": [1, 2, 3]}')
+
+        self.assertEqual(result, dict(a=[1, 2, 3]))
+
+    @mock.patch.object(types.JSONDeserializer, 'transform',
+                       return_value=dict(b=2))
+    def test_call_transform(self, mock_transform):
+        deser = types.JSONDeserializer('json', 'application/json')
+
+        result = deser('{"a": 1}')
+
+        mock_transform.assert_called_once_with(dict(a=1))
+        self.assertEqual(result, dict(b=2))
+
+    def test_call_invalid(self):
+        deser = types.JSONDeserializer('json', 'application/json')
+
+        self.assertRaises(webob.exc.HTTPBadRequest, deser, '{bad')
+
+    def test_registered(self):
+        self.assertEqual(types.media_types['application/json'], 'json')
+
+
+class CBORSerializerTest(tests.TestCase):
+    def test_call(self):
+        ser = types.CBORSerializer('cbor', 'application/cbor')
+
+        result = ser(dict(a=[1, 2, 3]))
+
+        self.assertEqual(result, '\xa1\x61a\x83\x01\x02\x03')
+
+    @mock.patch.object(types.CBORSerializer, 'transform',
+                       return_value=dict(b=2))
+    def test_call_transform(self, mock_transform):
+        ser = types.CBORSerializer('cbor', 'application/cbor')
+
+        result = ser(dict(a=1))
+
+        mock_transform.assert_called_once_with(dict(a=1))
+        self.assertEqual(result, '\xa1\x61b\x02')
+
+    def test_call_large_list(self):
+        ser = types.CBORSerializer('cbor', 'application/cbor')
+        ser.stream_threshold = 5
+        ser.chunk_items = 2
+
+        result = ser(range(6))
+
+        chunks = list(result)
+        self.assertEqual(chunks, ['\x86', '\x00\x01', '\x02\x03',
+                                  '\x04\x05'])
+        self.assertEqual(cbor.loads(''.join(chunks)), range(6))
+
+    def test_call_generator(self):
+        def gen():
+            for i in range(3):
+                yield i
+
+        ser = types.CBORSerializer('cbor', 'application/cbor')
+        ser.chunk_items = 2
+
+        result = ser(gen())
+
+        chunks = list(result)
+        self.assertEqual(chunks, ['\x9f', '\x00\x01', '\x02', '\xff'])
+        self.assertEqual(cbor.loads(''.join(chunks)), range(3))
+
+
+class CBORDeserializerTest(tests.TestCase):
+    def test_call(self):
+        deser = types.CBORDeserializer('cbor', 'application/cbor')
+
+        result = deser('\xa1\x61a\x83\x01\x02\x03')
+
+        self.assertEqual(result, dict(a=[1, 2, 3]))
+
+    @mock.patch.object(types.CBORDeserializer, 'transform',
+                       return_value=dict(b=2))
+    def test_call_transform(self, mock_transform):
+        deser = types.CBORDeserializer('cbor', 'application/cbor')
+
+        result = deser('\xa1\x61a\x01')
+
+        mock_transform.assert_called_once_with(dict(a=1))
+        self.assertEqual(result, dict(b=2))
+
+    def test_call_invalid(self):
+        deser = types.CBORDeserializer('cbor', 'application/cbor')
+
+        self.assertRaises(webob.exc.HTTPBadRequest, deser, '\x83\x01')
+        self.assertRaises(webob.exc.HTTPBadRequest, deser, '\x81' * 100000)
+        self.assertRaises(webob.exc.HTTPBadRequest, deser,
+                          '\x9b\x8b\xc0\xf3\xd3p\xach\xc5\xf7\xa6')
+
+    @mock.patch('appathy.cbor.loads', side_effect=RuntimeError)
+    def test_call_recursion(self, mock_loads):
+        deser = types.CBORDeserializer('cbor', 'application/cbor')
+
+        self.assertRaises(webob.exc.HTTPBadRequest, deser, '\x80')
+
+    def test_registered(self):
+        self.assertEqual(types.media_types['application/cbor'], 'cbor')
+
+    def test_round_trip(self):
+        ser = types.CBORSerializer('cbor', 'application/cbor')
+        deser = types.CBORDeserializer('cbor', 'application/cbor')
+        obj = dict(id=1234, name=u'caf\xe9', tags=['a', 'b'], price=19.95,
+                   owner=None, active=True, big=2 ** 70)
+
+        self.assertEqual(deser(ser(obj)), obj)
@@ -135,3 +135,135 @@ class ImportController(tests.TestCase):
             utils.import_controller('foobar')
 
         self.assertFalse(mock_iter_entry_points.called)
+
+
+class FrozenDictTest(tests.TestCase):
+    def test_mapping(self):
+        fd = utils.FrozenDict(dict(a=1), b=2)
+
+        self.assertEqual(fd['a'], 1)
+        self.assertEqual(fd.get('b'), 2)
+        self.assertEqual(fd.get('c'), None)
+        self.assertEqual(len(fd), 2)
+        self.assertEqual(sorted(fd), ['a', 'b'])
+        self.assertEqual(fd, dict(a=1, b=2))
+        self.assertEqual(repr(fd), 'FrozenDict(%r)' % dict(a=1, b=2))
+
+    def test_immutable(self):
+        fd = utils.FrozenDict(a=1)
+
+        with self.assertRaises(TypeError):
+            fd['b'] = 2
+        with self.assertRaises(TypeError):
+            del fd['a']
+        self.assertFalse(hasattr(fd, 'setdefault'))
+        self.assertFalse(hasattr(fd, 'pop'))
+
+
+class LRUCacheTest(tests.TestCase):
+    def test_init(self):
+        cache = utils.LRUCache(5)
+
+        self.assertEqual(cache.size, 5)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.stats(), dict(size=5, length=0, hits=0,
+                                             misses=0, evictions=0))
+
+    def test_get_set(self):
+        cache = utils.LRUCache(5)
+
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(cache.get('a', 'default'), 'default')
+        cache.set('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+
+        self.assertEqual(cache.stats(), dict(size=5, length=1, hits=1,
+                                             misses=2, evictions=0))
+
+    def test_eviction(self):
+        cache = utils.LRUCache(2)
+
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_set_existing(self):
+        cache = utils.LRUCache(2)
+
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.set('a', 3)
+        cache.set('c', 4)
+
+        self.assertEqual(cache.get('a'), 3)
+        self.assertEqual(cache.get('b'), None)
+
+    def test_delete(self):
+        cache = utils.LRUCache(2)
+        cache.set('a', 1)
+
+        cache.delete('a')
+        cache.delete('b')
+
+        self.assertEqual(len(cache), 0)
+
+    def test_clear(self):
+        cache = utils.LRUCache(2)
+        cache.set('a', 1)
+        cache.get('a')
+
+        cache.clear()
+
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.hits, 1)
+
+
+class ReadMostlyCacheTest(tests.TestCase):
+    def test_init(self):
+        cache = utils.ReadMostlyCache(5)
+
+        self.assertEqual(cache.size, 5)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.stats(), dict(size=5, length=0,
+                                             evictions=0))
+
+    def test_get_set(self):
+        cache = utils.ReadMostlyCache(5)
+
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(cache.get('a', 'default'), 'default')
+
+        cache.set('a', 1)
+        cache.set('a', 2)
+
+        self.assertEqual(cache.get('a'), 2)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.evictions, 0)
+
+    def test_get_unlocked(self):
+        cache = utils.ReadMostlyCache(5)
+        cache.set('a', 1)
+        cache._lock = mock.Mock()
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertFalse(cache._lock.method_calls)
+
+    def test_set_full(self):
+        cache = utils.ReadMostlyCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+
+        cache.set('c', 3)
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.evictions, 1)
+        self.assertEqual(cache.stats(), dict(size=2, length=2,
+                                             evictions=1))